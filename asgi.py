@@ -0,0 +1,520 @@
+'''Async serving mode: `uvicorn --factory asgi:create_asgi_app`.
+
+The read routes most clients hit (post listings, a post by slug, batch-get, a user's
+posts) are answered on the event loop through SQLAlchemy's asyncio engine. Every other
+request, and the cases those handlers leave alone (search, cursors, a missing or invalid
+token), goes to the Flask app from main.create_app() on a bounded thread pool, so both
+modes serve the same routes with the same JSON. Bodies are read and responses written on
+the loop, so a slow client costs a coroutine, not a thread.
+
+Not native yet: writes, login/register and uploads run as Flask views, so at most
+ASYNC_WSGI_THREADS of them (bcrypt, file writes, commits) are in progress at once and
+the rest wait for a thread. Size it like a threaded WSGI server's pool; only the reads
+above scale with open connections.
+'''
+import asyncio
+import hashlib
+import importlib.util
+import io
+import json
+import random
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qsl
+
+from flask_jwt_extended import decode_token
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.datastructures import MultiDict
+
+import main
+from cache import CacheEntry, MemoryBackend, response_cache
+from compress import response_compression
+from counters import post_counters
+from identity import token_versions
+from models import Posts, User
+from pagination import InvalidFilter, cursor_requested, filter_posts, listing_options, total_pages
+from replicas import engine_options
+from serializers import LISTING_FIELDS, POST_DETAIL_FIELDS, USER_LISTING_FIELDS, post_schema
+
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'mysql': 'aiomysql', 'mariadb': 'aiomysql', 'postgresql': 'asyncpg'}
+SPOOL_SIZE = 64 * 1024    # request bodies larger than this go to a temporary file
+STREAM_CHUNK = 64 * 1024  # response bytes collected per trip to the thread pool
+
+
+def async_url(url):
+    '''The same database through an asyncio driver, e.g. sqlite:///blog.db -> sqlite+aiosqlite:///blog.db'''
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver known for '{backend}', set ASYNC_DATABASE_URI")
+    driver = ASYNC_DRIVERS[backend]
+    # Fail at startup, not on the first request
+    if importlib.util.find_spec(driver) is None:
+        raise ValueError(f"The async mode needs {driver} for '{backend}' databases: pip install {driver}")
+    return url.set(drivername=f"{backend}+{driver}")
+
+
+def _int_arg(args, name, default):
+    # request.args.get(name, default, type=int)
+    try:
+        return int(args[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def _page_args(page, per_page):
+    # What Pagination makes of them with error_out=False
+    return max(1, page), per_page if per_page and per_page >= 1 else 20
+
+
+class AsyncRequest:
+    '''method path args headers body - what the native handlers read from an ASGI request'''
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.args = MultiDict(parse_qsl(scope['query_string'].decode('utf-8', 'replace'), keep_blank_values=True))
+        self.headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in scope['headers']}
+        self.body = body
+
+    def get_json(self):
+        # request.get_json(silent=True): None unless the body is JSON
+        mimetype = self.headers.get('content-type', '').split(';')[0].strip().lower()
+        if not (mimetype == 'application/json' or (mimetype.startswith('application/') and mimetype.endswith('+json'))):
+            return None
+        self.body.seek(0)
+        try:
+            return json.loads(self.body.read())
+        except ValueError:
+            return None
+
+    def cookie(self, name):
+        morsel = SimpleCookie(self.headers.get('cookie', '')).get(name)
+        return morsel.value if morsel else None
+
+
+class AsyncResponse:
+    def __init__(self, status, body, content_type, headers=()):
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+        self.headers = list(headers)
+
+
+class AsyncBlog:
+    '''The ASGI application. ASYNC_DATABASE_URI defaults to SQLALCHEMY_DATABASE_URI on its
+    asyncio driver; ASYNC_WSGI_THREADS bounds the threads running Flask views.'''
+    def __init__(self, flask_app):
+        config = flask_app.config
+        config.setdefault('ASYNC_DATABASE_URI', None)
+        config.setdefault('ASYNC_WSGI_THREADS', 32)
+        self.flask_app = flask_app
+        self.executor = ThreadPoolExecutor(max_workers=config['ASYNC_WSGI_THREADS'], thread_name_prefix='wsgi')
+
+        pool_options = config['DB_POOL_OPTIONS']
+        url = config['ASYNC_DATABASE_URI'] or async_url(config['SQLALCHEMY_DATABASE_URI'])
+        self.engine = create_async_engine(url, **engine_options(url, pool_options))
+        self.replicas = [create_async_engine(async_url(replica), **engine_options(replica, pool_options))
+                         for replica in config['SQLALCHEMY_REPLICA_URIS']]
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+
+        self.routes = [
+            ('GET', re.compile(r'/post'), '/post', self.get_posts),
+            ('GET', re.compile(r'/post/(?P<post_slug>[^/]+)'), '/post/<string:post_slug>', self.post_slug),
+            ('POST', re.compile(r'/posts/batch-get'), '/posts/batch-get', self.batch_get_posts),
+            ('GET', re.compile(r'/user/posts'), '/user/posts', self.user_posts),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+
+        started = time.perf_counter()
+        body = await self._read_body(receive)
+        if body is None:
+            return  # the client went away
+
+        try:
+            for method, pattern, rule, handler in self.routes:
+                match = pattern.fullmatch(scope['path']) if scope['method'] == method else None
+                if match:
+                    request = AsyncRequest(scope, body)
+                    response = await handler(request, **match.groupdict())
+                    if response is not None:
+                        await self._compress(request, response)
+                        await self._send(send, request, response)
+                        self._observe(request, rule, response, started)
+                        return
+                    body.seek(0)
+                    break
+            await self._delegate(scope, body, send)
+        finally:
+            body.close()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in [self.engine] + self.replicas:
+                    await engine.dispose()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        loop = asyncio.get_running_loop()
+        body = io.BytesIO()
+        spilled = False
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunk = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if not spilled and body.tell() + len(chunk) > SPOOL_SIZE:
+                # Large uploads are written to disk from the pool, not from the event loop
+                spool = await loop.run_in_executor(self.executor, tempfile.TemporaryFile)
+                await loop.run_in_executor(self.executor, spool.write, body.getvalue())
+                body, spilled = spool, True
+            if spilled:
+                await loop.run_in_executor(self.executor, body.write, chunk)
+            else:
+                body.write(chunk)
+        body.seek(0)
+        return body
+
+    # --- everything else: the Flask app on the thread pool
+
+    def _environ(self, scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        if scope.get('client'):
+            environ['REMOTE_ADDR'] = scope['client'][0]
+        for name, value in scope['headers']:
+            name = name.decode('latin-1')
+            key = {'content-type': 'CONTENT_TYPE', 'content-length': 'CONTENT_LENGTH'}.get(name)
+            key = key or 'HTTP_' + name.upper().replace('-', '_')
+            value = value.decode('latin-1')
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    @staticmethod
+    def _pull(chunks):
+        # One trip to the pool collects up to STREAM_CHUNK bytes, so a buffered response needs a single trip
+        collected, size = [], 0
+        for chunk in chunks:
+            collected.append(chunk)
+            size += len(chunk)
+            if size >= STREAM_CHUNK:
+                return b''.join(collected), False
+        return b''.join(collected), True
+
+    async def _delegate(self, scope, body, send):
+        loop = asyncio.get_running_loop()
+        environ = self._environ(scope, body)
+        status = []
+
+        def start_response(status_line, headers, exc_info=None):
+            status[:] = [int(status_line.split(' ', 1)[0]),
+                         [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]]
+
+        def first_chunk():
+            iterable = self.flask_app(environ, start_response)
+            chunks = iter(iterable)
+            return iterable, chunks, self._pull(chunks)
+
+        iterable, chunks, (chunk, done) = await loop.run_in_executor(self.executor, first_chunk)
+        try:
+            await send({'type': 'http.response.start', 'status': status[0], 'headers': status[1]})
+            while not done:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk, done = await loop.run_in_executor(self.executor, self._pull, chunks)
+            await send({'type': 'http.response.body', 'body': chunk})
+        finally:
+            if hasattr(iterable, 'close'):
+                await loop.run_in_executor(self.executor, iterable.close)
+
+    # --- native handlers; returning None hands the request to Flask
+
+    def _session(self, request):
+        # Reads follow ReplicaRouter: a replica, unless this client just wrote
+        if self.replicas and request.method in ('GET', 'HEAD'):
+            try:
+                sticky = float(request.cookie(self.flask_app.config['REPLICA_STICKY_COOKIE']) or 0) > time.time()
+            except ValueError:
+                sticky = False
+            if not sticky:
+                return self.sessions(bind=random.choice(self.replicas))
+        return self.sessions()
+
+    def _json(self, payload, status=200):
+        response = self.flask_app.json.response(payload)
+        return AsyncResponse(status, response.get_data(), response.headers['Content-Type'])
+
+    async def _backend(self, fn, *args):
+        # The memory backend answers at once; anything else (redis) is network I/O
+        if isinstance(response_cache.backend, MemoryBackend):
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def _cached(self, request, build):
+        '''ResponseCache.cached for a native handler; build(tags) returns a response or None'''
+        config = self.flask_app.config
+        if not config['RESPONSE_CACHE_ENABLED']:
+            return await build(set())
+
+        backend = response_cache.backend
+        key = response_cache.cache_key(request.path, request.args)
+        encoding = response_compression.negotiate(request.headers.get('accept-encoding'))
+        entry = await self._backend(backend.get, key, encoding)
+        if entry is not None:
+            response = AsyncResponse(200, entry.body, self._content_type(entry.mimetype), [('X-Cache', 'HIT')])
+        else:
+            epoch = await self._backend(backend.epoch)
+            tags = set()
+            response = await build(tags)
+            if response is None or response.status != 200:
+                return response
+            entry = CacheEntry(response.body, response.content_type.split(';')[0], hashlib.sha256(response.body).hexdigest())
+            await self._backend(backend.set, key, entry, config['RESPONSE_CACHE_TTL'], tags, epoch)
+            response.headers.append(('X-Cache', 'MISS'))
+
+        etag = entry.etag
+        if response_compression.compressible(entry.mimetype, len(entry.body)):
+            response.headers.append(('Vary', 'Accept-Encoding'))
+            if encoding is not None:
+                if encoding in entry.variants:
+                    response.body = entry.variants[encoding]
+                else:
+                    response.body = await self._offload(response_cache.variant, key, entry, encoding)
+                response.headers.append(('Content-Encoding', encoding))
+                etag = f"{etag}-{encoding}"
+        response.headers += [('ETag', f'"{etag}"'), ('Cache-Control', 'public, no-cache')]
+        if_none_match = request.headers.get('if-none-match', '')
+        if if_none_match and (if_none_match.strip() == '*' or etag in
+                              [tag.strip().removeprefix('W/').strip('"') for tag in if_none_match.split(',')]):
+            response.status, response.body = 304, b''
+        return response
+
+    async def _offload(self, fn, *args):
+        # Compressing a large body would stall every other request on the loop
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def _content_type(self, mimetype):
+        return f"{mimetype}; charset=utf-8" if mimetype.startswith('text/') else mimetype
+
+    async def _identity(self, request):
+        '''User id of a valid, unrevoked access token. None lets Flask answer, with the
+        exact 401/422 flask_jwt_extended would give.'''
+        authorization = request.headers.get('authorization', '')
+        if not authorization.startswith('Bearer '):
+            return None
+        try:
+            with self.flask_app.app_context():
+                payload = decode_token(authorization[len('Bearer '):])
+            user_id = int(payload['sub'])
+        except Exception:
+            return None
+        if payload.get('type') != 'access':
+            return None
+        # Never the request's replica session: a lagging replica may not have the revoke yet
+        async with self.sessions() as primary:
+            version = await token_versions.current_async(user_id, primary)
+        return user_id if token_versions.is_current(payload, version) else None
+
+    async def _page(self, session, request, fields, tags, user_id=None):
+        '''(rows, total, pages) of an offset-paginated listing, built the way main.get_posts/user_posts build it'''
+        args = request.args
+        sort, since, until = listing_options(args)
+        statement = select(*post_schema.columns(fields, extra=(Posts.created_at,) if sort else ()))
+        if user_id is not None:
+            statement = statement.where(Posts.user_id == user_id)
+        statement = filter_posts(statement, sort, since, until)
+
+        page, per_page = _page_args(_int_arg(args, "page", 1), _int_arg(args, "per_page", 2 if user_id is None else 20))
+        if since is None and until is None:
+            total = await post_counters.total_async(session, user_id)
+        else:
+            total = (await session.execute(select(func.count()).select_from(statement.order_by(None).subquery()))).scalar()
+        rows = (await session.execute(statement.limit(per_page).offset((page - 1) * per_page))).all()
+        tags.update(("listing", *(f"post:{row.sno}" for row in rows)))
+        return rows, total, total_pages(total, per_page)
+
+    async def _authors(self, session, rows, fields):
+        user_ids = {row.user_id for row in rows} if "author" in fields else set()
+        if not user_ids:
+            return {}
+        return dict((await session.execute(select(User.id, User.name).where(User.id.in_(user_ids)))).all())
+
+    async def get_posts(self, request):
+        '''main.get_posts without search or cursors'''
+        if request.args.get("search", "").strip() or cursor_requested(request.args):
+            return None
+
+        async def build(tags):
+            try:
+                fields = post_schema.requested(request.args, LISTING_FIELDS)
+                async with self._session(request) as session:
+                    rows, total, pages = await self._page(session, request, fields, tags)
+                    if not rows:
+                        return self._json({"message": "No posts found", "posts": [], "status": "true"})
+                    authors = await self._authors(session, rows, fields)
+                return self._json({
+                    "message": "Posts fetched successfully!",
+                    "status": True,
+                    "search_query": "",
+                    "current_page": _int_arg(request.args, "page", 1),
+                    "per_page": _int_arg(request.args, "per_page", 2),
+                    "total_pages": pages,
+                    "total_posts": total,
+                    "posts": post_schema.dump_many(rows, fields, authors)
+                })
+            except InvalidFilter as e:
+                return self._json({"error": str(e), "status": False}, 400)
+            except Exception as e:
+                return self._json({"error": f"An error occurred: {str(e)}", "status": False}, 500)
+
+        return await self._cached(request, build)
+
+    async def post_slug(self, request, post_slug):
+        '''main.post_slug'''
+        async def build(tags):
+            async with self._session(request) as session:
+                statement = select(*post_schema.columns(POST_DETAIL_FIELDS)).where(Posts.slug == post_slug)
+                row = (await session.execute(statement)).first()
+            tags.add(f"slug:{post_slug}")
+            if row is None:
+                return self._json({"message": "No posts found", "posts": [], "status": "true"})
+            tags.add(f"post:{row.sno}")
+            post_data = post_schema.dump_many([row], POST_DETAIL_FIELDS)
+            return self._json({"message": "Post fetched successfully!", "status": True, "post": post_data})
+
+        return await self._cached(request, build)
+
+    async def batch_get_posts(self, request):
+        '''main.batch_get_posts'''
+        try:
+            with self.flask_app.app_context():
+                kind, keys = main.batch_keys(request.get_json(), ("ids", "slugs"))
+            fields = post_schema.requested(request.args, POST_DETAIL_FIELDS)
+        except (ValueError, InvalidFilter) as e:
+            return self._json({"error": str(e), "status": False}, 400)
+
+        column = Posts.sno if kind == "ids" else Posts.slug
+        async with self._session(request) as session:
+            statement = select(*post_schema.columns(fields, extra=(Posts.slug,))).where(column.in_(keys))
+            rows = (await session.execute(statement)).all()
+            authors = await self._authors(session, rows, fields)
+        found = {getattr(row, column.key): post for row, post in zip(rows, post_schema.dump_many(rows, fields, authors))}
+
+        key_name = "id" if kind == "ids" else "slug"
+        results = [
+            {key_name: key, "status": "found", "post": found[key]} if key in found
+            else {key_name: key, "status": "not_found", "error": "Post not found!"}
+            for key in keys
+        ]
+        return self._json({"message": f"{len(found)} of {len(keys)} posts found", "status": True, "results": results})
+
+    async def user_posts(self, request):
+        '''main.user_posts without search or cursors'''
+        if request.args.get("search", "").strip() or cursor_requested(request.args):
+            return None
+        async with self._session(request) as session:
+            user_id = await self._identity(request)
+            if user_id is None:
+                return None
+            try:
+                fields = post_schema.requested(request.args, USER_LISTING_FIELDS)
+                rows, total, pages = await self._page(session, request, fields, set(), user_id)
+                if not rows:
+                    return self._json({"status": True, "message": "No posts found", "posts": []})
+                authors = await self._authors(session, rows, fields)
+                return self._json({
+                    "status": True,
+                    "message": "User posts fetched successfully!",
+                    "current_page": max(1, _int_arg(request.args, "page", 1)),
+                    "per_page": _int_arg(request.args, "per_page", None),
+                    "total_pages": pages,
+                    "total_posts": total,
+                    "posts": post_schema.dump_many(rows, fields, authors)
+                })
+            except InvalidFilter as e:
+                return self._json({"error": str(e), "status": False}, 400)
+            except Exception as e:
+                return self._json({"error": f"An error occurred: {str(e)}", "status": False}, 500)
+
+    # --- responses
+
+    async def _compress(self, request, response):
+        '''ResponseCompression's after_request for a native response'''
+        mimetype = response.content_type.split(';')[0]
+        if (response.status in (204, 206, 304) or any(name == 'Content-Encoding' for name, _ in response.headers)
+                or not response_compression.compressible(mimetype)):
+            return
+        response.headers.append(('Vary', 'Accept-Encoding'))
+        encoding = response_compression.negotiate(request.headers.get('accept-encoding'))
+        if encoding is None or not response_compression.compressible(mimetype, len(response.body)):
+            return
+        if len(response.body) > STREAM_CHUNK:
+            compressed = await self._offload(response_compression.compress, response.body, encoding)
+        else:
+            compressed = response_compression.compress(response.body, encoding)
+        if len(compressed) < len(response.body):
+            response.body = compressed
+            response.headers.append(('Content-Encoding', encoding))
+
+    async def _send(self, send, request, response):
+        headers = [(b'content-type', response.content_type.encode('latin-1'))]
+        if response.status != 304:
+            headers.append((b'content-length', str(len(response.body)).encode()))
+        # What flask_cors adds with its defaults
+        origin = request.headers.get('origin')
+        vary = [value for name, value in response.headers if name == 'Vary'] + (['Origin'] if origin else [])
+        cors = [('Access-Control-Allow-Origin', origin or '*')] + ([('Vary', ', '.join(dict.fromkeys(vary)))] if vary else [])
+        headers += [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in [header for header in response.headers if header[0] != 'Vary'] + cors]
+        await send({'type': 'http.response.start', 'status': response.status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': response.body})
+
+    def _observe(self, request, rule, response, started):
+        metrics = self.flask_app.extensions.get('metrics')
+        if metrics is None or not self.flask_app.config['METRICS_ENABLED']:
+            return
+        labels = {'method': request.method, 'route': rule, 'status': response.status}
+        metrics.request_duration.observe(time.perf_counter() - started, **labels)
+        metrics.request_bytes.inc(int(request.headers.get('content-length') or 0), **labels)
+        metrics.response_bytes.inc(len(response.body), **labels)
+
+
+def create_asgi_app(config=None):
+    return AsyncBlog(main.create_app(config))
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(create_asgi_app(), port=5000)
@@ -0,0 +1,765 @@
+import argparse
+import http.client
+import io
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+DEFAULT_PASSWORD = 'Passw0rd!'
+OTHER_PASSWORD = 'Passw0rd!2'
+LATENCY_METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'mean_ms')
+_uploads = itertools.count(1)
+
+
+# --- server side: runs in its own process so the client threads do not share its GIL
+
+def _serve(settings, ready, stop):
+    '''Boot main.create_app() on a fresh SQLite database with a stub mailer, seed it and serve it,
+    threaded with werkzeug (sync) or with uvicorn through asgi.AsyncBlog (async)'''
+    from smtp_stub import SMTPStub
+
+    # A process group of its own, so run() can take down whatever this process started
+    if hasattr(os, 'setpgid'):
+        os.setpgid(0, 0)
+    smtp = SMTPStub().start()
+    folder = settings['folder']
+    os.environ.update({
+        'SECRET_KEY': 'benchmark', 'JWT_SECRET_KEY': 'benchmark-' + 'x' * 32,
+        'LOCAL_SERVER': 'True', 'LOCAL_URL': f"sqlite:///{os.path.join(folder, 'blog.db')}",
+        'UPLOAD_FOLDER': os.path.join(folder, 'uploads'),
+        'MAIL_SERVER': '127.0.0.1', 'MAIL_PORT': str(smtp.port), 'MAIL_USE_TLS': 'false', 'MAIL_USE_SSL': 'false',
+        'GMAIL_USER': 'admin@example.test', 'NO_OF_POSTS': '5', 'BLOG_NAME': 'Benchmark',
+        'BCRYPT_LOG_ROUNDS': str(settings['bcrypt_rounds']),
+    })
+
+    from werkzeug.serving import make_server
+    import main
+    from hashing import password_hasher
+    from images import image_pipeline
+    from models import Posts, User, db
+    from outbox import outbox
+    from search import search_engine
+    from seed import seed
+
+    # Rate limits would turn most timed requests into 429s; load shedding stays on
+    app = main.create_app({'RATELIMIT_ENABLED': False})
+    # Per-request access logs would dominate the output and the timings
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    with app.app_context():
+        db.create_all()
+        search_engine.setup()
+        seed(users=settings['users'], posts=settings['posts'], seed_value=settings['seed'],
+             password_hash=password_hasher.hash(settings['password']), log=lambda message: None)
+        accounts = db.session.query(User.id, User.email).order_by(User.id).limit(settings['accounts']).all()
+        slugs = [slug for (slug,) in db.session.query(Posts.slug).order_by(Posts.sno).limit(1000)]
+        titles = [title for (title,) in db.session.query(Posts.title).limit(200)]
+        db.session.remove()
+
+    words = sorted({word.strip('.').lower() for title in titles for word in title.split() if len(word) > 4})
+    if settings['server'] == 'async':
+        import socket
+        import uvicorn
+        from asgi import AsyncBlog
+
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        server = uvicorn.Server(uvicorn.Config(AsyncBlog(app), log_level='warning', backlog=4096))
+        thread = threading.Thread(target=server.run, kwargs={'sockets': [listener]}, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+        port = listener.getsockname()[1]
+    else:
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_port
+    ready.put({
+        'port': port,
+        'database': os.path.join(folder, 'blog.db'),
+        'accounts': [{'id': user_id, 'email': email} for user_id, email in accounts],
+        'slugs': slugs,
+        'words': words or ['lorem'],
+    })
+    stop.wait()
+    if settings['server'] == 'async':
+        server.should_exit = True
+        thread.join(10)
+    else:
+        server.shutdown()
+    # Spawned image workers inherit our stdout; left running they keep `benchmark.py run | tail` waiting
+    image_pipeline.shutdown()
+    outbox.stop(5)
+    smtp.shutdown()
+
+
+# --- client side
+
+def multipart(fields, files=None):
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data, content_type) in (files or {}).items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                   f'Content-Type: {content_type}\r\n\r\n'.encode())
+        body.write(data + b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode())
+    return body.getvalue(), {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+
+
+def png_upload():
+    # A distinct image per upload so content-addressed storage does not turn every save into a dedupe
+    from PIL import Image
+    n = next(_uploads)
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (n & 255, (n >> 8) & 255, (n >> 16) & 255)).save(buffer, 'PNG')
+    return ('bench.png', buffer.getvalue(), 'image/png')
+
+
+class Client:
+    '''One keep-alive connection per benchmark worker'''
+    def __init__(self, port):
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+
+    def request(self, method, path, body=None, headers=None, token=None):
+        headers = dict(headers or {})
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            self.connection.close()
+            raise
+
+
+class SlowClients:
+    '''Connections that send their request headers one line every `interval` seconds and
+    never finish, like clients on a bad network; each one occupies the server for the whole run'''
+    def __init__(self, port, count, interval=1.0):
+        self.sockets = []
+        self.interval = interval
+        self._stop = threading.Event()
+        for _ in range(count):
+            connection = socket.create_connection(('127.0.0.1', port))
+            connection.sendall(b'GET /post HTTP/1.1\r\nHost: 127.0.0.1\r\n')
+            self.sockets.append(connection)
+        self._thread = threading.Thread(target=self._trickle, daemon=True)
+        self._thread.start()
+
+    def _trickle(self):
+        while not self._stop.wait(self.interval):
+            for connection in self.sockets:
+                try:
+                    connection.sendall(b'X-Slow: 1\r\n')
+                except OSError:
+                    pass
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        for connection in self.sockets:
+            connection.close()
+
+
+class Worker:
+    '''A benchmark worker: its own connection and its own account, so password
+    changes and deletes never race with another worker'''
+    def __init__(self, port, account, fixtures, password, seed):
+        self.client = Client(port)
+        self.account = account
+        self.fixtures = fixtures
+        self.password = password
+        self.token = None
+        self.own_posts = []
+        self.rng = random.Random(f"{seed}:{account['id']}")
+        self.samples = None
+
+    def call(self, method, path, body=None, headers=None, auth=False):
+        '''Timed request; the result is recorded against the current route'''
+        started = time.perf_counter()
+        try:
+            status, data = self.client.request(method, path, body, headers, self.token if auth else None)
+        except (http.client.HTTPException, OSError) as e:
+            self.samples.append((time.perf_counter() - started, type(e).__name__))
+            return None, b''
+        self.samples.append((time.perf_counter() - started, status))
+        return status, data
+
+    def untimed(self, method, path, body=None, headers=None, auth=False):
+        status, data = self.client.request(method, path, body, headers, self.token if auth else None)
+        if status >= 400:
+            raise RuntimeError(f"Setup request {method} {path} failed with {status}: {data[:200]!r}")
+        return json.loads(data) if data else {}
+
+    def login(self):
+        data = self.untimed('POST', '/login', {'email': self.account['email'], 'password': self.password})
+        self.token = data['access_token']
+
+    def create_post(self):
+        body, headers = multipart(self.post_fields(), {'img_file': png_upload()})
+        data = self.untimed('POST', '/add', body, headers, auth=True)
+        self.own_posts.append(data['post']['id'])
+        return data['post']['id']
+
+    def own_post(self):
+        return self.own_posts[-1] if self.own_posts else self.create_post()
+
+    def post_fields(self):
+        words = self.fixtures['words']
+        return {
+            'title': ' '.join(self.rng.choices(words, k=5)).capitalize()[:100],
+            'content': ' '.join(self.rng.choices(words, k=80)).capitalize() + '.',
+        }
+
+    def next_password(self):
+        return OTHER_PASSWORD if self.password != OTHER_PASSWORD else DEFAULT_PASSWORD
+
+
+def _get_post_page(w):
+    w.call('GET', f"/post?page={w.rng.randint(1, 50)}&per_page=10")
+
+
+def _get_post_search(w):
+    w.call('GET', f"/post?search={w.rng.choice(w.fixtures['words'])}&per_page=10")
+
+
+def _get_post_cursor(w):
+    w.call('GET', '/post?limit=20')
+
+
+def _get_post_slug(w):
+    w.call('GET', f"/post/{w.rng.choice(w.fixtures['slugs'])}")
+
+
+def _register(w):
+    name = 'Bench ' + ''.join(w.rng.choices('abcdefghijklmnopqrstuvwxyz', k=8))
+    body, headers = multipart({
+        'name': name, 'dob': '1990-01-01', 'place': 'Benchville', 'address': '1 Bench Street',
+        'email': f"bench-{uuid.uuid4().hex}@example.test", 'password': DEFAULT_PASSWORD,
+    }, {'image': png_upload()})
+    w.call('POST', '/register', body, headers)
+
+
+def _login(w):
+    status, data = w.call('POST', '/login', {'email': w.account['email'], 'password': w.password})
+    if status == 200:
+        w.token = json.loads(data)['access_token']
+
+
+def _forgot_password(w):
+    w.call('POST', '/forgot-password', {'email': w.account['email']})
+
+
+def _reset_password(w):
+    w.untimed('POST', '/forgot-password', {'email': w.account['email']})
+    with sqlite3.connect(w.fixtures['database']) as conn:
+        (token,) = conn.execute('SELECT reset_token FROM user WHERE id = ?', (w.account['id'],)).fetchone()
+    new_password = w.next_password()
+    status, _ = w.call('POST', f"/reset-password/{token}", {'new_password': new_password, 'confirm_password': new_password})
+    if status == 200:
+        w.password = new_password
+        w.login()
+
+
+def _change_password(w):
+    new_password = w.next_password()
+    status, _ = w.call('POST', '/change-password', {
+        'current_password': w.password, 'new_password': new_password, 'confirm_password': new_password,
+    }, auth=True)
+    if status == 200:
+        w.password = new_password
+        w.login()
+
+
+def _random_post(w):
+    w.call('POST', f"/random_post/{w.account['id']}")
+
+
+def _add_post(w):
+    body, headers = multipart(w.post_fields(), {'img_file': png_upload()})
+    status, data = w.call('POST', '/add', body, headers, auth=True)
+    if status == 201:
+        w.own_posts.append(json.loads(data)['post']['id'])
+
+
+def _get_edit(w):
+    w.call('GET', f"/edit/{w.own_post()}", auth=True)
+
+
+def _put_edit(w):
+    body, headers = multipart(w.post_fields(), {'img_file': png_upload()})
+    w.call('PUT', f"/edit/{w.own_post()}", body, headers, auth=True)
+
+
+def _delete_post(w):
+    sno = w.create_post()
+    status, _ = w.call('DELETE', f"/delete/{sno}", auth=True)
+    if status == 200:
+        w.own_posts.remove(sno)
+
+
+def _contact(w):
+    w.call('POST', '/contact', {
+        'name': 'Bench Contact', 'email': w.account['email'], 'phone': '0123456789',
+        'message': 'Benchmark contact form message.',
+    })
+
+
+def _user_posts(w):
+    w.call('GET', '/user/posts?per_page=10', auth=True)
+
+
+def _export(w):
+    w.call('GET', '/posts/export', auth=True)
+
+
+def _import(w):
+    lines = ''.join(json.dumps(w.post_fields()) + '\n' for _ in range(10))
+    w.call('POST', '/posts/import', lines.encode(), {'Content-Type': 'application/x-ndjson'}, auth=True)
+
+
+def _profile(w):
+    w.call('GET', '/profile', auth=True)
+
+
+# Reads first, then writes, then the routes that change credentials
+ROUTES = {
+    'GET /post': _get_post_page,
+    'GET /post?search': _get_post_search,
+    'GET /post?cursor': _get_post_cursor,
+    'GET /post/<slug>': _get_post_slug,
+    'GET /profile': _profile,
+    'GET /user/posts': _user_posts,
+    'GET /posts/export': _export,
+    'GET /edit/<sno>': _get_edit,
+    'POST /add': _add_post,
+    'PUT /edit/<sno>': _put_edit,
+    'DELETE /delete/<sno>': _delete_post,
+    'POST /random_post/<user_id>': _random_post,
+    'POST /posts/import': _import,
+    'POST /contact': _contact,
+    'POST /register': _register,
+    'POST /login': _login,
+    'POST /forgot-password': _forgot_password,
+    'POST /reset-password/<token>': _reset_password,
+    'POST /change-password': _change_password,
+}
+
+
+def percentile(ordered, fraction):
+    # Nearest-rank percentile over an already sorted list
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(duration * 1000 for duration, _ in samples)
+    statuses = {}
+    for _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(count for status, count in statuses.items() if not (status.isdigit() and int(status) < 400))
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0,
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0,
+        'p50_ms': round(percentile(latencies, 0.50), 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95), 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99), 3) if latencies else None,
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else None,
+        'max_ms': round(latencies[-1], 3) if latencies else None,
+        'status_codes': statuses,
+    }
+
+
+def run_route(workers, scenario, requests, warmup):
+    '''Drive one route with every worker until `requests` timed requests have completed'''
+    tickets = itertools.count()
+    start = threading.Barrier(len(workers) + 1)
+    failures = []
+
+    def loop(worker):
+        worker.samples = []
+        try:
+            for _ in range(warmup):
+                scenario(worker)
+            worker.samples = []
+            start.wait()
+            while next(tickets) < requests:
+                scenario(worker)
+        except Exception as e:
+            failures.append(e)
+            start.abort()
+
+    threads = [threading.Thread(target=loop, args=(worker,), daemon=True) for worker in workers]
+    for thread in threads:
+        thread.start()
+    try:
+        start.wait()
+    except threading.BrokenBarrierError:
+        pass
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if failures:
+        raise failures[0]
+    return summarize([sample for worker in workers for sample in worker.samples], elapsed)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    routes = list(ROUTES) if not args.routes else [name.strip() for name in args.routes.split(',')]
+    unknown = [name for name in routes if name not in ROUTES]
+    if unknown:
+        raise SystemExit(f"Unknown routes: {', '.join(unknown)} (see --list)")
+    if args.users < args.concurrency:
+        raise SystemExit("--users must be at least --concurrency: every worker needs its own account")
+
+    folder = tempfile.mkdtemp(prefix='blog-bench-')
+    context = multiprocessing.get_context('spawn')
+    ready, stop = context.Queue(), context.Event()
+    settings = {
+        'folder': folder, 'users': args.users, 'posts': args.posts, 'seed': args.seed,
+        'password': DEFAULT_PASSWORD, 'bcrypt_rounds': args.bcrypt_rounds, 'accounts': args.concurrency,
+        'server': args.server,
+    }
+    server = context.Process(target=_serve, args=(settings, ready, stop), name='benchmark-server')
+    server.start()
+    results = {}
+    slow_clients = None
+    try:
+        print(f"Seeding {args.users} users / {args.posts} posts and starting the {args.server} app...", file=sys.stderr)
+        fixtures = ready.get(timeout=args.startup_timeout)
+        workers = [Worker(fixtures['port'], account, fixtures, DEFAULT_PASSWORD, args.seed)
+                   for account in fixtures['accounts']]
+        for worker in workers:
+            worker.login()
+        if args.slow_clients:
+            slow_clients = SlowClients(fixtures['port'], args.slow_clients)
+
+        print(f"{'route':<30} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}", file=sys.stderr)
+        for name in routes:
+            result = run_route(workers, ROUTES[name], args.requests, args.warmup)
+            results[name] = result
+            print(f"{name:<30} {result['throughput_rps']:>9.1f} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+                  f"{result['p99_ms']:>9.2f} {result['errors']:>7}", file=sys.stderr)
+    finally:
+        if slow_clients is not None:
+            slow_clients.close()
+        stop.set()
+        server.join(30)
+        if server.is_alive():
+            server.terminate()
+            server.join(5)
+        if hasattr(os, 'killpg'):
+            # Anything the server left behind: its image workers, or everything if it hung
+            try:
+                os.killpg(server.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        if not args.keep:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'users': args.users,
+            'posts': args.posts,
+            'seed': args.seed,
+            'bcrypt_rounds': args.bcrypt_rounds,
+            'server': args.server,
+            'slow_clients': args.slow_clients,
+        },
+        'routes': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+def compare(args):
+    '''Compare two result files; exit 1 if any route regressed by more than the threshold'''
+    with open(args.baseline) as f:
+        baseline = json.load(f)['routes']
+    with open(args.current) as f:
+        current = json.load(f)['routes']
+
+    threshold = args.threshold / 100
+    regressions = []
+    print(f"{'route':<30} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name in list(baseline) + [name for name in current if name not in baseline]:
+        if name not in baseline or name not in current:
+            print(f"{name:<30} {'only in ' + ('baseline' if name in baseline else 'current'):>30}")
+            continue
+        before, after = baseline[name][args.metric], current[name][args.metric]
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        if args.metric == 'throughput_rps':
+            regressed = change < -threshold
+        else:
+            # Below the noise floor a large relative change on a tiny latency is not a regression
+            regressed = change > threshold and after - before >= args.min_delta_ms
+        if current[name]['error_rate'] > baseline[name]['error_rate'] + 0.01:
+            regressed = True
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<30} {before:>10.2f} {after:>10.2f} {change:>+7.1%}{'  REGRESSION' if regressed else ''}")
+
+    if regressions:
+        print(f"\n{len(regressions)} route(s) regressed more than {args.threshold:g}% on {args.metric}: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\nNo regressions above {args.threshold:g}% on {args.metric}")
+
+
+def _median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+def serialize(args):
+    '''Time one large listing response both ways: ORM entities, hand-built dicts and the
+    stdlib encoder against column rows, the post schema and the orjson provider'''
+    from flask import Flask
+    from flask.json.provider import DefaultJSONProvider
+
+    from images import image_pipeline
+    from json_provider import FastJSONProvider, orjson
+    from models import Posts, User, db
+    from search import search_engine
+    from seed import seed
+    from serializers import post_schema
+    from storage import upload_store
+
+    fields = tuple(name.strip() for name in args.fields.split(','))
+    folder = tempfile.mkdtemp(prefix='blog-bench-')
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(folder, 'blog.db')}",
+                      UPLOAD_FOLDER=os.path.join(folder, 'uploads'))
+    db.init_app(app)
+    search_engine.init_app(app)
+    upload_store.init_app(app)
+    image_pipeline.init_app(app)
+    stdlib_json, fast_json = DefaultJSONProvider(app), FastJSONProvider(app)
+    try:
+        with app.app_context():
+            db.create_all()
+            search_engine.setup()
+            seed(users=args.users, posts=args.posts, seed_value=args.seed, workers=1, log=lambda message: None)
+
+            def authors_of(posts):
+                user_ids = {post.user_id for post in posts}
+                return dict(db.session.query(User.id, User.name).filter(User.id.in_(user_ids)).all())
+
+            def build_orm():
+                # A fresh session each time so the identity map is really populated
+                db.session.remove()
+                posts = Posts.query.order_by(Posts.sno).limit(args.posts).all()
+                authors = authors_of(posts)
+                return [post_schema.dump(post, fields, authors) for post in posts]
+
+            def build_rows():
+                db.session.remove()
+                rows = post_schema.select(Posts.query, fields).order_by(Posts.sno).limit(args.posts).all()
+                return post_schema.dump_many(rows, fields, authors_of(rows) if 'author' in fields else {})
+
+            payload = {'status': True, 'posts': build_rows()}
+            with app.test_request_context():
+                results = {
+                    'build_orm_ms': _median_ms(build_orm, args.repeat),
+                    'build_rows_ms': _median_ms(build_rows, args.repeat),
+                    'encode_stdlib_ms': _median_ms(lambda: stdlib_json.response(payload), args.repeat),
+                    'encode_fast_ms': _median_ms(lambda: fast_json.response(payload), args.repeat),
+                }
+            results['response_bytes'] = len(fast_json.response(payload).get_data())
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    before = results['build_orm_ms'] + results['encode_stdlib_ms']
+    after = results['build_rows_ms'] + results['encode_fast_ms']
+    results.update({
+        'total_before_ms': before,
+        'total_after_ms': after,
+        'encode_speedup': results['encode_stdlib_ms'] / results['encode_fast_ms'],
+        'total_speedup': before / after,
+    })
+    print(f"{args.posts} posts, fields={','.join(fields)}, {results['response_bytes']} bytes, "
+          f"median of {args.repeat}{'' if orjson else ' (orjson not installed: stdlib fallback)'}", file=sys.stderr)
+    print(f"{'':<8} {'before ms':>10} {'after ms':>10} {'speedup':>8}", file=sys.stderr)
+    for label, before_key, after_key in (('build', 'build_orm_ms', 'build_rows_ms'),
+                                         ('encode', 'encode_stdlib_ms', 'encode_fast_ms'),
+                                         ('total', 'total_before_ms', 'total_after_ms')):
+        print(f"{label:<8} {results[before_key]:>10.2f} {results[after_key]:>10.2f} "
+              f"{results[before_key] / results[after_key]:>7.1f}x", file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({key: round(value, 3) for key, value in results.items()}, f, indent=2)
+
+
+# Runs in a fresh interpreter per repetition; prints its timings as JSON
+STARTUP_PROBE = '''
+import json, os, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+app = main.create_app()
+created = time.perf_counter()
+result = {"import_ms": (imported - started) * 1000, "create_app_ms": (created - imported) * 1000}
+if hasattr(os, "fork"):
+    # A worker forked from an already built app, as with gunicorn --preload
+    read_end, write_end = os.pipe()
+    forked = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        app.test_client().get("/post?per_page=1")
+        os.write(write_end, str((time.perf_counter() - forked) * 1000).encode())
+        os._exit(0)
+    os.waitpid(pid, 0)
+    result["forked_first_request_ms"] = float(os.read(read_end, 64))
+requested = time.perf_counter()
+app.test_client().get("/post?per_page=1")
+result["first_request_ms"] = (time.perf_counter() - requested) * 1000
+result["not_imported"] = [name for name in sys.argv[1:] if name not in sys.modules]
+print(json.dumps(result))
+'''
+DEFERRED_MODULES = ('faker', 'flask_mail', 'flask_migrate', 'alembic', 'slugify', 'PIL')
+
+
+def startup(args):
+    '''Time importing main, create_app() and the first request, each in a fresh interpreter'''
+    folder = tempfile.mkdtemp(prefix='blog-bench-')
+    here = os.path.dirname(os.path.abspath(__file__))
+    # MAIL_* and the blog settings are left unset on purpose: startup must not need them
+    env = dict(os.environ, SECRET_KEY='benchmark', JWT_SECRET_KEY='benchmark-' + 'x' * 32, LOCAL_SERVER='True',
+               LOCAL_URL=f"sqlite:///{os.path.join(folder, 'blog.db')}", UPLOAD_FOLDER=os.path.join(folder, 'uploads'))
+    runs = []
+    try:
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'main', 'init-db'], env=env, cwd=here,
+                       check=True, capture_output=True)
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, '-c', 'pass'], check=True)
+            interpreter_ms = (time.perf_counter() - started) * 1000
+            started = time.perf_counter()
+            probe = subprocess.run([sys.executable, '-c', STARTUP_PROBE, *DEFERRED_MODULES], env=env, cwd=here,
+                                   check=True, capture_output=True, text=True)
+            run = json.loads(probe.stdout.strip().splitlines()[-1])
+            run.update(interpreter_ms=interpreter_ms, process_ms=(time.perf_counter() - started) * 1000)
+            runs.append(run)
+    except subprocess.CalledProcessError as e:
+        raise SystemExit(f"Startup probe failed:\n{e.stderr}")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    metrics = ('interpreter_ms', 'import_ms', 'create_app_ms', 'first_request_ms', 'forked_first_request_ms', 'process_ms')
+    results = {name: sorted(run[name] for run in runs)[len(runs) // 2] for name in metrics if name in runs[0]}
+    results['not_imported'] = runs[0]['not_imported']
+    print(f"median of {args.repeat} fresh interpreters", file=sys.stderr)
+    for name in metrics:
+        if name in results:
+            print(f"{name:<26} {results[name]:>9.1f}", file=sys.stderr)
+    print(f"{'not imported':<26} {', '.join(results['not_imported']) or '-'}", file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="HTTP load test of every route in main.py against a seeded local SQLite app.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Boot the app, drive each route and report latency percentiles.')
+    run_parser.add_argument('-c', '--concurrency', type=int, default=4, help='Concurrent workers (default 4).')
+    run_parser.add_argument('-n', '--requests', type=int, default=100, help='Timed requests per route (default 100).')
+    run_parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per worker before each route (default 2).')
+    run_parser.add_argument('--routes', help='Comma separated route names to run (default all, see --list).')
+    run_parser.add_argument('--list', action='store_true', help='List the route names and exit.')
+    run_parser.add_argument('--users', type=int, default=100, help='Seeded users (default 100).')
+    run_parser.add_argument('--posts', type=int, default=5000, help='Seeded posts (default 5000).')
+    run_parser.add_argument('--seed', type=int, default=0, help='Seed for the data and the request mix (default 0).')
+    run_parser.add_argument('--server', choices=('sync', 'async'), default='sync',
+                            help='sync: threaded werkzeug (default); async: uvicorn with asgi.AsyncBlog.')
+    run_parser.add_argument('--slow-clients', type=int, default=0,
+                            help='Extra connections that trickle their headers for the whole run (default 0).')
+    run_parser.add_argument('--bcrypt-rounds', type=int, default=12, help='BCRYPT_LOG_ROUNDS for the app (default 12).')
+    run_parser.add_argument('--startup-timeout', type=float, default=600, help='Seconds to wait for seeding (default 600).')
+    run_parser.add_argument('--keep', action='store_true', help='Keep the temporary database and uploads.')
+    run_parser.add_argument('-o', '--output', help='Write the JSON results here instead of stdout.')
+
+    compare_parser = commands.add_parser('compare', help='Compare two result files and flag regressions.')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--metric', default='p95_ms', choices=LATENCY_METRICS + ('throughput_rps',))
+    compare_parser.add_argument('--threshold', type=float, default=10, help='Allowed change in percent (default 10).')
+    compare_parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                                help='Ignore latency increases smaller than this many ms (default 1).')
+
+    serialize_parser = commands.add_parser('serialize', help='Micro-benchmark building and encoding one large listing.')
+    serialize_parser.add_argument('--posts', type=int, default=2000, help='Posts in the listing (default 2000).')
+    serialize_parser.add_argument('--users', type=int, default=50, help='Seeded users (default 50).')
+    serialize_parser.add_argument('--fields', default='id,title,content,slug,img_file,images,author,date,created_at',
+                                  help='Listing fields (default: the full post, content included).')
+    serialize_parser.add_argument('--repeat', type=int, default=15, help='Timed repetitions, the median is reported (default 15).')
+    serialize_parser.add_argument('--seed', type=int, default=0, help='Seed for the data (default 0).')
+    serialize_parser.add_argument('-o', '--output', help='Also write the timings as JSON here.')
+
+    startup_parser = commands.add_parser('startup', help='Time importing main, create_app() and the first request.')
+    startup_parser.add_argument('--repeat', type=int, default=10, help='Fresh interpreters to time, the median is reported (default 10).')
+    startup_parser.add_argument('-o', '--output', help='Also write the timings as JSON here.')
+
+    args = parser.parse_args()
+    if args.command == 'run' and args.list:
+        print('\n'.join(ROUTES))
+    elif args.command == 'run':
+        run(args)
+    elif args.command == 'serialize':
+        serialize(args)
+    elif args.command == 'startup':
+        startup(args)
+    else:
+        compare(args)
@@ -0,0 +1,206 @@
+import json
+from datetime import datetime
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from models import Posts, User, db, make_excerpt, utcnow
+from pagination import InvalidFilter, parse_timestamp
+from search import search_engine
+from cache import response_cache
+from counters import post_counters
+from slugs import SlugAllocator, SlugConflictError, assign_unique_slug, base_slug
+from storage import upload_store
+
+EXPORT_BATCH = 1000
+IMPORT_BATCH = 500
+MAX_REPORTED_ERRORS = 1000
+
+
+def export_posts(user_id=None, include_email=False):
+    '''Yield posts as NDJSON lines from a server-side cursor; rows never enter the ORM session'''
+    columns = [Posts.sno, Posts.title, Posts.slug, Posts.content, Posts.date, Posts.created_at, Posts.img_file,
+               Posts.user_id, User.name]
+    if include_email:
+        columns.append(User.email)
+    statement = select(*columns).outerjoin(User, User.id == Posts.user_id).order_by(Posts.sno)
+    if user_id is not None:
+        statement = statement.where(Posts.user_id == user_id)
+
+    result = db.session.execute(statement.execution_options(stream_results=True, yield_per=EXPORT_BATCH))
+    for row in result:
+        record = {
+            "id": row.sno,
+            "title": row.title,
+            "slug": row.slug,
+            "content": row.content,
+            "date": row.date,
+            "created_at": row.created_at.isoformat() if row.created_at else None,
+            "img_file": row.img_file,
+            "user_id": row.user_id,
+            "author": row.name,
+        }
+        if include_email:
+            record["author_email"] = row.email
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def _validate(record):
+    # Same rules as add_post
+    if not isinstance(record, dict):
+        return "Each line must be a JSON object", None
+    title = str(record.get('title') or '').strip()
+    content = str(record.get('content') or '').strip()
+    if not title:
+        return "Title is required!", None
+    if len(title) < 3 or len(title) > 100:
+        return "Title must be between 3 and 100 characters!", None
+    if not content:
+        return "Content is required!", None
+    if len(content) < 10 or len(content) > 5000:
+        return "Content must be between 10 and 5000 characters!", None
+    date = record.get('date') or datetime.now().strftime("%d-%m-%Y %I:%M %p")
+    if not isinstance(date, str) or len(date) > Posts.date.type.length:
+        return f"date must be a string of at most {Posts.date.type.length} characters!", None
+    img_file = record.get('img_file') or None
+    if img_file is not None and (not isinstance(img_file, str) or len(img_file) > Posts.img_file.type.length):
+        return f"img_file must be a string of at most {Posts.img_file.type.length} characters!", None
+    try:
+        created_at = parse_timestamp(str(record['created_at']), 'created_at') if record.get('created_at') else utcnow()
+    except InvalidFilter as e:
+        return str(e), None
+    return None, {
+        "title": title,
+        "content": content,
+        "excerpt": make_excerpt(content),
+        "slug": str(record.get('slug') or '').strip(),
+        "date": date,
+        "img_file": img_file,
+        "created_at": created_at,
+    }
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self):
+        return {"imported": self.imported, "failed": self.failed, "errors": self.errors}
+
+
+def _resolve_owners(batch, report):
+    emails = {email for _, _, email in batch if email}
+    owners = dict(db.session.query(User.email, User.id).filter(User.email.in_(emails)).all()) if emails else {}
+    resolved = []
+    for number, row, email in batch:
+        if email not in owners:
+            report.error(number, f"Unknown author_email '{email}'" if email else "author_email is required")
+            continue
+        row["user_id"] = owners[email]
+        resolved.append((number, row))
+    return resolved
+
+
+def _check_images(rows, user_id, report):
+    '''Rows whose img_file is one the user already uses (on a post or as their picture);
+    anything else would let an import take a reference on someone else's upload'''
+    wanted = {row["img_file"] for _, row in rows if row["img_file"]}
+    if not wanted:
+        return rows
+    owned = set(db.session.execute(
+        select(Posts.img_file).where(Posts.user_id == user_id, Posts.img_file.in_(wanted))
+        .union(select(User.image).where(User.id == user_id, User.image.in_(wanted)))
+    ).scalars())
+    allowed = []
+    for number, row in rows:
+        if row["img_file"] and row["img_file"] not in owned:
+            report.error(number, f"img_file '{row['img_file']}' is not one of your images")
+            continue
+        allowed.append((number, row))
+    return allowed
+
+
+def _insert_batch(rows, report, slugs):
+    bases = [base_slug(row.pop("slug") or row["title"]) for _, row in rows]
+    for (_, row), slug in zip(rows, slugs.allocate(bases)):
+        row["slug"] = slug
+
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(Posts), [row for _, row in rows])
+        inserted = [row["slug"] for _, row in rows]
+        report.imported += len(rows)
+    except IntegrityError:
+        # A concurrent writer took one of our slugs; fall back to the per-post allocator
+        slugs.forget()
+        inserted = []
+        for number, row in rows:
+            post = Posts(**row)
+            try:
+                assign_unique_slug(post, row["title"])
+            except (IntegrityError, SlugConflictError) as e:
+                report.error(number, str(e.orig) if isinstance(e, IntegrityError) else str(e))
+                continue
+            inserted.append(post.slug)
+            report.imported += 1
+    return inserted
+
+
+def import_posts(lines, user_id=None, batch_size=IMPORT_BATCH):
+    '''Insert NDJSON posts in executemany batches, committing per batch.
+
+    With `user_id` every post belongs to that user and may only reuse images that user
+    already has; otherwise (an operator's import) each line's author_email is matched
+    against existing users.
+    '''
+    report = ImportReport()
+    slug_allocator = SlugAllocator()
+    batch = []
+
+    def flush():
+        if user_id is not None:
+            rows = _check_images([(number, dict(row, user_id=user_id)) for number, row, _ in batch], user_id, report)
+        else:
+            rows = _resolve_owners(batch, report)
+        if rows:
+            slugs = _insert_batch(rows, report, slug_allocator)
+            posts = db.session.query(Posts.sno, Posts.user_id, Posts.title, Posts.content, Posts.img_file) \
+                .filter(Posts.slug.in_(slugs)).all()
+            search_engine.index_posts(posts)
+            post_counters.count_rows(posts)
+            for post in posts:
+                upload_store.retain(post.img_file)
+            response_cache.invalidate("listing", *(f"slug:{slug}" for slug in slugs))
+        db.session.commit()
+        db.session.expunge_all()
+        batch.clear()
+
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            report.error(number, f"Invalid JSON: {str(e)}")
+            continue
+        error, row = _validate(record)
+        if error:
+            report.error(number, error)
+            continue
+        batch.append((number, row, record.get('author_email')))
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+    return report.as_dict()
@@ -0,0 +1,249 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, make_response, request
+from sqlalchemy import event
+
+from models import db
+
+
+class CacheEntry:
+    '''body mimetype etag variants - a cached 200 response; variants maps a content
+    coding (gzip, br, ...) to the body compressed with it'''
+    def __init__(self, body, mimetype, etag, variants=None):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag
+        self.variants = variants or {}
+
+
+class MemoryBackend:
+    '''Per-process LRU with TTL and a tag -> keys index for targeted eviction'''
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, entry, tags)
+        self._tags = {}                # tag -> {key}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def _drop(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def epoch(self):
+        return self._epoch
+
+    def get(self, key, encoding=None):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key, entry, ttl, tags, epoch):
+        with self._lock:
+            # Something was invalidated while this response was being built
+            if epoch != self._epoch:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, entry, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def set_variant(self, key, entry, encoding, body, ttl):
+        # The entry object is the one stored, so every later get() sees the variant
+        entry.variants[encoding] = body
+
+    def invalidate(self, tags):
+        with self._lock:
+            self._epoch += 1
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._tags.clear()
+
+
+class RedisBackend:
+    '''Shared backend so every worker sees the same entries and invalidations'''
+    def __init__(self, url, prefix='resp-cache:'):
+        import redis  # optional dependency, only needed for RESPONSE_CACHE_BACKEND=redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def epoch(self):
+        return int(self.client.get(f"{self.prefix}epoch") or 0)
+
+    def get(self, key, encoding=None):
+        '''The entry, with its `encoding` variant if one was stored, in one round trip'''
+        if encoding is None:
+            raw, variant = self.client.get(f"{self.prefix}entry:{key}"), None
+        else:
+            raw, variant = self.client.mget(f"{self.prefix}entry:{key}", f"{self.prefix}variant:{encoding}:{key}")
+        if raw is None:
+            return None
+        meta, body = raw.split(b"\n", 1)
+        meta = json.loads(meta)
+        entry = CacheEntry(body, meta["mimetype"], meta["etag"])
+        if variant is not None:
+            etag, variant_body = variant.split(b"\n", 1)
+            # Left over from an entry that was invalidated and rebuilt since
+            if etag.decode() == entry.etag:
+                entry.variants[encoding] = variant_body
+        return entry
+
+    def set(self, key, entry, ttl, tags, epoch):
+        if epoch != self.epoch():
+            return
+        meta = json.dumps({"mimetype": entry.mimetype, "etag": entry.etag}).encode()
+        pipe = self.client.pipeline()
+        pipe.set(f"{self.prefix}entry:{key}", meta + b"\n" + entry.body, ex=ttl)
+        for tag in tags:
+            pipe.sadd(f"{self.prefix}tag:{tag}", key)
+            pipe.expire(f"{self.prefix}tag:{tag}", ttl * 2)
+        pipe.execute()
+
+    def set_variant(self, key, entry, encoding, body, ttl):
+        self.client.set(f"{self.prefix}variant:{encoding}:{key}", entry.etag.encode() + b"\n" + body, ex=ttl)
+
+    def invalidate(self, tags):
+        self.client.incr(f"{self.prefix}epoch")
+        for tag in tags:
+            tag_key = f"{self.prefix}tag:{tag}"
+            keys = self.client.smembers(tag_key)
+            pipe = self.client.pipeline()
+            for key in keys:
+                pipe.delete(f"{self.prefix}entry:{key.decode()}")
+            pipe.delete(tag_key)
+            pipe.execute()
+
+    def clear(self):
+        self.client.incr(f"{self.prefix}epoch")
+        for pattern in ("entry:*", "variant:*"):
+            for key in self.client.scan_iter(f"{self.prefix}{pattern}"):
+                self.client.delete(key)
+
+
+class ResponseCache:
+    '''Caches whole GET responses keyed on path + normalized query args and answers
+    If-None-Match with 304. Views label what they rendered with tag(); writers
+    call invalidate() and the matching entries are evicted once the session commits.
+    With ResponseCompression installed an entry also keeps each compressed variant
+    it was asked for, validated by its own ETag (`<etag>-<coding>`).'''
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RESPONSE_CACHE_ENABLED', True)
+        app.config.setdefault('RESPONSE_CACHE_BACKEND', 'memory')
+        app.config.setdefault('RESPONSE_CACHE_TTL', 60)
+        app.config.setdefault('RESPONSE_CACHE_MAX_ENTRIES', 1024)
+        app.config.setdefault('RESPONSE_CACHE_REDIS_URL', None)
+        app.extensions['response_cache'] = self
+        self.app = app
+
+        if app.config['RESPONSE_CACHE_BACKEND'] == 'redis':
+            self.backend = RedisBackend(app.config['RESPONSE_CACHE_REDIS_URL'])
+        else:
+            self.backend = MemoryBackend(app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_rollback', self._after_rollback)
+
+    @staticmethod
+    def cache_key(path=None, args=None):
+        '''Key of the current request, or of `path` and `args` (a MultiDict) outside Flask'''
+        if path is None:
+            path, args = request.path, request.args
+        args = sorted((name, value.strip()) for name, values in args.lists() for value in values)
+        return path + "?" + "&".join(f"{name}={value}" for name, value in args)
+
+    def tag(self, *tags):
+        '''Label the response being built so invalidate() can find it'''
+        g.setdefault('response_cache_tags', set()).update(tags)
+
+    def invalidate(self, *tags):
+        # Evict only after commit, otherwise a concurrent reader could re-cache the old rows
+        db.session.info.setdefault('response_cache_invalidate', set()).update(tags)
+
+    def _after_commit(self, session):
+        # Releasing a savepoint fires this too; the tags wait for the outermost commit
+        if session.in_nested_transaction():
+            return
+        tags = session.info.pop('response_cache_invalidate', None)
+        if tags:
+            self.backend.invalidate(tags)
+
+    def _after_rollback(self, session):
+        # Tags queued inside a rolled-back savepoint stay too: evicting more is harmless
+        if session.in_nested_transaction():
+            return
+        session.info.pop('response_cache_invalidate', None)
+
+    def cached(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.app.config['RESPONSE_CACHE_ENABLED']:
+                return view(*args, **kwargs)
+
+            key = self.cache_key()
+            compression = self.app.extensions.get('response_compression')
+            encoding = compression.negotiate(request.headers.get('Accept-Encoding')) if compression else None
+            entry = self.backend.get(key, encoding)
+            if entry is not None:
+                response = self.app.response_class(entry.body, mimetype=entry.mimetype)
+                response.headers['X-Cache'] = 'HIT'
+            else:
+                epoch = self.backend.epoch()
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                body = response.get_data()
+                entry = CacheEntry(body, response.mimetype, hashlib.sha256(body).hexdigest())
+                self.backend.set(key, entry, self.app.config['RESPONSE_CACHE_TTL'],
+                                 g.pop('response_cache_tags', set()), epoch)
+                response.headers['X-Cache'] = 'MISS'
+
+            etag = entry.etag
+            if compression is not None and compression.compressible(entry.mimetype, len(entry.body)):
+                response.vary.add('Accept-Encoding')
+                if encoding is not None:
+                    response.set_data(self.variant(key, entry, encoding))
+                    response.headers['Content-Encoding'] = encoding
+                    etag = f"{etag}-{encoding}"
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'public, no-cache'
+            return response.make_conditional(request)
+        return wrapper
+
+    def variant(self, key, entry, encoding):
+        '''entry.body compressed with `encoding`, compressed once and then kept with the entry'''
+        body = entry.variants.get(encoding)
+        if body is None:
+            body = self.app.extensions['response_compression'].compress(entry.body, encoding)
+            self.backend.set_variant(key, entry, encoding, body, self.app.config['RESPONSE_CACHE_TTL'])
+        return body
+
+
+response_cache = ResponseCache()
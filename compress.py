@@ -0,0 +1,125 @@
+import zlib
+
+from flask import request
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # optional: no br without it
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional: no zstd without it
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/html', 'text/plain', 'text/css',
+                          'text/csv', 'text/xml', 'application/xml', 'application/javascript', 'image/svg+xml')
+
+
+class _BrotliEncoder:
+    # The compress()/flush() interface zlib and zstandard compressors already have
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+ENCODERS = {'gzip': lambda level: zlib.compressobj(level, zlib.DEFLATED, 31)}
+if brotli is not None:
+    ENCODERS['br'] = _BrotliEncoder
+if zstandard is not None:
+    ENCODERS['zstd'] = lambda level: zstandard.ZstdCompressor(level=level).compressobj()
+
+
+class ResponseCompression:
+    '''Compresses response bodies with the best coding the client accepts. Bodies under
+    COMPRESS_MIN_SIZE bytes are sent as they are; streamed responses are compressed
+    chunk by chunk as they go out. ResponseCache compresses its entries itself, so the
+    compressed bytes are cached next to the plain ones under their own ETag.'''
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+        # Server preference, used when the client rates several codings the same
+        app.config.setdefault('COMPRESS_ENCODINGS', ('zstd', 'br', 'gzip'))
+        app.config.setdefault('COMPRESS_LEVELS', {'zstd': 3, 'br': 4, 'gzip': 6})
+        app.config.setdefault('COMPRESS_MIMETYPES', COMPRESSIBLE_MIMETYPES)
+        app.extensions['response_compression'] = self
+        self.app = app
+        self.encodings = [encoding for encoding in app.config['COMPRESS_ENCODINGS'] if encoding in ENCODERS]
+        app.after_request(self._after_request)
+
+    def negotiate(self, accept_encoding):
+        '''The coding to use for an Accept-Encoding header value, or None for identity'''
+        if not accept_encoding or not self.app.config['COMPRESS_ENABLED']:
+            return None
+        return parse_accept_header(accept_encoding).best_match(self.encodings)
+
+    def compressible(self, mimetype, size=None):
+        '''Whether a body of this type (and size; None for a stream) is worth compressing'''
+        if not self.app.config['COMPRESS_ENABLED'] or mimetype not in self.app.config['COMPRESS_MIMETYPES']:
+            return False
+        return size is None or size >= self.app.config['COMPRESS_MIN_SIZE']
+
+    def encoder(self, encoding):
+        return ENCODERS[encoding](self.app.config['COMPRESS_LEVELS'][encoding])
+
+    def compress(self, data, encoding):
+        encoder = self.encoder(encoding)
+        return encoder.compress(data) + encoder.flush()
+
+    def compress_stream(self, chunks, encoding):
+        encoder = self.encoder(encoding)
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                data = encoder.compress(chunk)
+                if data:
+                    yield data
+            yield encoder.flush()
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def _after_request(self, response):
+        status = response.status_code
+        if (status < 200 or status in (204, 206, 304) or response.direct_passthrough
+                or 'Content-Encoding' in response.headers or response.cache_control.no_transform
+                or not self.compressible(response.mimetype)):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self.compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if not self.compressible(response.mimetype, len(body)):
+                return response
+            compressed = self.compress(body, encoding)
+            if len(compressed) >= len(body):
+                return response
+            response.set_data(compressed)
+
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            # A different representation, so a different validator
+            response.set_etag(f"{etag}-{encoding}", weak)
+        return response
+
+
+response_compression = ResponseCompression()
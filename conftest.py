@@ -0,0 +1,97 @@
+import os
+import shutil
+
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import insert, text
+
+import main
+from cache import response_cache
+from counters import post_counters
+from identity import token_versions
+from images import DERIVED_DIR, image_pipeline
+from models import Posts, User, db
+from search import search_engine
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    # One app per run: the extensions are module-level and hook db.session on every init_app
+    folder = tmp_path_factory.mktemp('blog')
+    return main.create_app({
+        'TESTING': True,
+        'SECRET_KEY': 'test-secret',
+        'JWT_SECRET_KEY': 'test-jwt-secret-with-at-least-32-bytes',
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{folder / 'blog.db'}",
+        'UPLOAD_FOLDER': str(folder / 'uploads'),
+        'RATELIMIT_ENABLED': False,
+        'OUTBOX_AUTOSTART': False,
+        'IMAGE_PIPELINE_ENABLED': False,
+        'BCRYPT_LOG_ROUNDS': 4,
+    })
+
+
+@pytest.fixture(autouse=True)
+def database(app):
+    '''A fresh schema, search index, upload folder and caches for every test'''
+    with app.app_context():
+        db.drop_all()
+        db.session.execute(text("DROP TABLE IF EXISTS posts_fts"))
+        db.session.commit()
+        db.create_all()
+        search_engine.setup()
+    response_cache.backend.clear()
+    token_versions._entries.clear()
+    shutil.rmtree(app.config['UPLOAD_FOLDER'])
+    os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], DERIVED_DIR))
+    image_pipeline._checked.clear()
+    yield
+    with app.app_context():
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    '''make_user(name) -> id of a new user'''
+    def make(name='Author'):
+        with app.app_context():
+            user = User(name=name, email=f"{name.lower().replace(' ', '.')}@example.test", password='x')
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make
+
+
+@pytest.fixture
+def make_posts(app):
+    '''make_posts(user_id, count) -> snos of `count` new posts, indexed and counted like an import'''
+    def make(user_id, count, img_file=None):
+        with app.app_context():
+            first = db.session.query(db.func.max(Posts.sno)).scalar() or 0
+            rows = [{
+                "sno": sno, "user_id": user_id, "title": f"Post number {sno}", "slug": f"post-number-{sno}",
+                "content": f"Content of post number {sno}, long enough.", "date": "01-01-2026 10:00 AM",
+                "img_file": img_file,
+            } for sno in range(first + 1, first + count + 1)]
+            db.session.execute(insert(Posts), rows)
+            search_engine.index_posts(Posts.query.filter(Posts.sno > first).all())
+            post_counters.count_rows(rows)
+            db.session.commit()
+            return [row["sno"] for row in rows]
+    return make
+
+
+@pytest.fixture
+def auth(app):
+    '''auth(user_id) -> headers carrying a valid access token'''
+    def headers(user_id):
+        with app.app_context():
+            user = db.session.get(User, user_id)
+            token = create_access_token(identity=str(user.id), additional_claims=token_versions.claims(user))
+        return {'Authorization': f"Bearer {token}"}
+    return headers
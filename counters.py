@@ -0,0 +1,143 @@
+from collections import Counter as Tally
+
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.exc import IntegrityError
+
+from models import Counter, Posts, db
+
+TOTAL_KEY = 'posts'
+USER_PREFIX = 'posts:user:'
+# Above this many counters a write bumps them in bulk instead of one by one
+BULK_BUMP = 8
+IN_CHUNK = 900
+
+
+def user_key(user_id):
+    return f"{USER_PREFIX}{int(user_id)}"
+
+
+class PostCounters:
+    '''Post totals kept in the counter table, so listings never run COUNT(*) over posts.
+
+    Every write that adds or removes posts calls add() in the same transaction as the
+    rows themselves; the counts commit or roll back with them. reconcile() recounts and
+    repairs whatever drifted anyway (manual SQL, a write path that forgot to count).
+    '''
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['post_counters'] = self
+        self.app = app
+
+    def add(self, user_id, delta=1):
+        self.add_many({user_id: delta})
+
+    def add_many(self, deltas):
+        '''Apply {user_id: delta}; the total row first, then users in id order, so
+        concurrent writers always lock counter rows in the same order'''
+        deltas = {int(user_id): delta for user_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        changes = [(TOTAL_KEY, sum(deltas.values()))]
+        changes += [(user_key(user_id), deltas[user_id]) for user_id in sorted(deltas)]
+        if len(changes) > BULK_BUMP:
+            self._bump_many(changes)
+            return
+        for name, delta in changes:
+            self._bump(name, delta)
+
+    def count_rows(self, rows):
+        '''add_many() for freshly inserted rows (dicts or objects with user_id)'''
+        self.add_many(Tally(row["user_id"] if isinstance(row, dict) else row.user_id for row in rows))
+
+    def _bump(self, name, delta):
+        updated = Counter.query.filter_by(name=name).update(
+            {Counter.value: Counter.value + delta}, synchronize_session=False
+        )
+        if updated:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(Counter(name=name, value=delta))
+        except IntegrityError:
+            # Another transaction created the row first
+            Counter.query.filter_by(name=name).update(
+                {Counter.value: Counter.value + delta}, synchronize_session=False
+            )
+
+    def _bump_many(self, changes):
+        # Imports and seeding touch hundreds of users per batch: one executemany UPDATE and one
+        # multi-row INSERT rather than a statement, and a savepoint, for every counter
+        names = [name for name, _ in changes]
+        existing = set()
+        for i in range(0, len(names), IN_CHUNK):
+            existing.update(db.session.execute(select(Counter.name).where(Counter.name.in_(names[i:i + IN_CHUNK]))).scalars())
+
+        table = Counter.__table__
+        updates = [{"counter_name": name, "delta": delta} for name, delta in changes if name in existing]
+        if updates:
+            db.session.execute(
+                table.update().where(table.c.name == bindparam('counter_name')).values(value=table.c.value + bindparam('delta')),
+                updates
+            )
+        missing = [(name, delta) for name, delta in changes if name not in existing]
+        if not missing:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert(), [{"name": name, "value": delta} for name, delta in missing])
+        except IntegrityError:
+            # Another transaction created some of them first
+            for name, delta in missing:
+                self._bump(name, delta)
+
+    def total(self, user_id=None):
+        name = TOTAL_KEY if user_id is None else user_key(user_id)
+        return db.session.query(Counter.value).filter(Counter.name == name).scalar() or 0
+
+    async def total_async(self, session, user_id=None):
+        '''total() for the ASGI app, reading through an AsyncSession'''
+        name = TOTAL_KEY if user_id is None else user_key(user_id)
+        return (await session.execute(select(Counter.value).where(Counter.name == name))).scalar() or 0
+
+    def _recount(self, name):
+        query = db.session.query(func.count(Posts.sno))
+        if name != TOTAL_KEY:
+            query = query.filter(Posts.user_id == int(name[len(USER_PREFIX):]))
+        return query.scalar()
+
+    def reconcile(self):
+        '''Recount every post counter and fix the ones that drifted; returns [(name, stored, actual)]'''
+        actual = {TOTAL_KEY: db.session.query(func.count(Posts.sno)).scalar()}
+        for user_id, count in db.session.query(Posts.user_id, func.count(Posts.sno)).group_by(Posts.user_id):
+            actual[user_key(user_id)] = count
+        stored = dict(db.session.query(Counter.name, Counter.value)
+                      .filter((Counter.name == TOTAL_KEY) | Counter.name.like(f"{USER_PREFIX}%")))
+        db.session.commit()
+
+        fixed = []
+        for name in sorted(set(actual) | set(stored)):
+            if stored.get(name) == actual.get(name, 0) or (name not in stored and not actual.get(name)):
+                continue
+            # The snapshot above may have raced a writer: recount with the row locked, so any
+            # transaction that already bumped it has committed and any later one waits for us
+            row = Counter.query.filter_by(name=name).with_for_update().first()
+            count = self._recount(name)
+            if row is None:
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(Counter(name=name, value=count))
+                except IntegrityError:
+                    row = Counter.query.filter_by(name=name).with_for_update().first()
+            before = stored.get(name, 0) if row is None else row.value
+            if row is not None:
+                row.value = count
+            db.session.commit()
+            if before != count:
+                fixed.append((name, before, count))
+        return fixed
+
+
+post_counters = PostCounters()
@@ -0,0 +1,17 @@
+# gunicorn -c gunicorn.conf.py
+import multiprocessing
+import os
+
+wsgi_app = 'main:create_app()'
+bind = os.getenv('BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Build the app once in the master; workers fork from it and share its imported code pages
+preload_app = True
+
+
+def post_fork(server, worker):
+    # create_app() does not connect, but anything the master did connect must not be shared
+    from models import db
+    with server.app.wsgi().app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
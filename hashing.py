@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from blinker import Namespace
+
+_signals = Namespace()
+# Sent from the calling thread with the seconds it waited for a hash or verify, queueing included
+password_hashed = _signals.signal('password-hashed')
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    '''Runs bcrypt on a bounded worker pool so login bursts cannot occupy every request thread.
+
+    bcrypt releases the GIL, so the pool gives real parallelism up to HASH_WORKERS
+    while HASH_MAX_QUEUE caps how much work may wait behind it.
+    '''
+    def __init__(self, app=None, bcrypt=None):
+        self.bcrypt = None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._run_total = 0.0
+        self._latencies = deque(maxlen=1024)
+        if app is not None:
+            self.init_app(app, bcrypt)
+
+    def init_app(self, app, bcrypt):
+        app.config.setdefault('BCRYPT_LOG_ROUNDS', 12)
+        app.config.setdefault('HASH_WORKERS', os.cpu_count() or 2)
+        app.config.setdefault('HASH_MAX_QUEUE', 64)
+        app.config.setdefault('HASH_TIMEOUT', 30)
+        app.extensions['password_hasher'] = self
+        self.app = app
+        self.bcrypt = bcrypt
+
+    @property
+    def rounds(self):
+        return int(self.app.config['BCRYPT_LOG_ROUNDS'])
+
+    def _get_executor(self):
+        # Created lazily so a preloaded app never forks with live pool threads
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.app.config['HASH_WORKERS'],
+                                                        thread_name_prefix='bcrypt')
+        return self._executor
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._queued >= self.app.config['HASH_MAX_QUEUE']:
+                self._rejected += 1
+                raise HasherBusy("Password hashing queue is full")
+            self._queued += 1
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._in_flight += 1
+            try:
+                return fn(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._in_flight -= 1
+                    self._completed += 1
+                    self._wait_total += started - submitted
+                    self._run_total += finished - started
+                    self._latencies.append(finished - submitted)
+
+        try:
+            return self._get_executor().submit(job).result(timeout=self.app.config['HASH_TIMEOUT'])
+        finally:
+            password_hashed.send(self, seconds=time.perf_counter() - submitted)
+
+    def hash(self, password):
+        return self._run(self.bcrypt.generate_password_hash, password, self.rounds).decode('utf-8')
+
+    def verify(self, pw_hash, password):
+        return self._run(self.bcrypt.check_password_hash, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        # bcrypt hashes look like $2b$<cost>$<salt+digest>
+        try:
+            return int(pw_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            completed = self._completed or 1
+            return {
+                "rounds": self.rounds,
+                "workers": self.app.config['HASH_WORKERS'],
+                "queue_depth": self._queued,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._wait_total / completed * 1000, 2),
+                "avg_hash_ms": round(self._run_total / completed * 1000, 2),
+                "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2) if latencies else 0,
+                "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2) if latencies else 0,
+            }
+
+
+password_hasher = PasswordHasher()
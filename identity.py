@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import jsonify
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import User, db
+
+VERSION_CLAIM = 'ver'
+
+
+class TokenVersions:
+    '''Access tokens carry their user's token_version; a token behind the user's current
+    version, or whose user no longer exists, is rejected as revoked.
+
+    Versions are kept in a small per-process TTL cache, so an authenticated request
+    normally costs no query at all. A revoke() is seen at once by this process and by
+    the others within IDENTITY_CACHE_TTL seconds. Misses always read the primary: a
+    lagging replica would hand back, and the cache keep, a version already revoked.
+    '''
+    def __init__(self, app=None, jwt=None):
+        self._entries = OrderedDict()  # user_id -> (expires_at, version, or None for a deleted user)
+        self._epoch = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, jwt)
+
+    def init_app(self, app, jwt):
+        app.config.setdefault('IDENTITY_CACHE_TTL', 30)
+        app.config.setdefault('IDENTITY_CACHE_MAX_ENTRIES', 10000)
+        app.extensions['token_versions'] = self
+        self.app = app
+        jwt.token_in_blocklist_loader(self._is_revoked)
+        jwt.revoked_token_loader(self._revoked_response)
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_rollback', self._after_rollback)
+
+    def claims(self, user):
+        '''additional_claims for create_access_token()'''
+        return {VERSION_CLAIM: user.token_version or 0}
+
+    def revoke(self, user):
+        '''Invalidate every token issued to `user` so far, once the current transaction commits'''
+        # Incremented in the database: two revokes racing on a stale `user` must still both count
+        db.session.execute(
+            update(User).where(User.id == user.id).values(token_version=func.coalesce(User.token_version, 0) + 1)
+            .execution_options(synchronize_session=False)
+        )
+        version = db.session.execute(select(User.token_version).where(User.id == user.id)).scalar_one()
+        set_committed_value(user, 'token_version', version)
+        db.session.info.setdefault('revoked_users', set()).add(user.id)
+
+    def current(self, user_id):
+        hit, version, epoch = self._cached(user_id)
+        if hit:
+            return version
+        row = db.session.execute(select(User.token_version).where(User.id == user_id),
+                                 bind_arguments={'bind': db.engine}).first()
+        return self._store(user_id, row, epoch)
+
+    async def current_async(self, user_id, session):
+        '''current() for the ASGI app, reading through an AsyncSession on the primary'''
+        hit, version, epoch = self._cached(user_id)
+        if hit:
+            return version
+        row = (await session.execute(select(User.token_version).where(User.id == user_id))).first()
+        return self._store(user_id, row, epoch)
+
+    def is_current(self, jwt_payload, version):
+        # Tokens issued before versions existed count as version 0
+        return version is not None and jwt_payload.get(VERSION_CLAIM, 0) == version
+
+    def _cached(self, user_id):
+        with self._lock:
+            item = self._entries.get(user_id)
+            if item is not None and item[0] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                return True, item[1], None
+            return False, None, self._epoch
+
+    def _store(self, user_id, row, epoch):
+        version = (row[0] or 0) if row else None
+        with self._lock:
+            # A revoke committed while we were reading; do not cache what we read
+            if epoch == self._epoch:
+                self._entries[user_id] = (time.monotonic() + self.app.config['IDENTITY_CACHE_TTL'], version)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.app.config['IDENTITY_CACHE_MAX_ENTRIES']:
+                    self._entries.popitem(last=False)
+        return version
+
+    def _is_revoked(self, jwt_header, jwt_payload):
+        try:
+            user_id = int(jwt_payload['sub'])
+        except (KeyError, TypeError, ValueError):
+            return True
+        return not self.is_current(jwt_payload, self.current(user_id))
+
+    def _revoked_response(self, jwt_header, jwt_payload):
+        return jsonify({"status": False, "error": "Token has been revoked, please log in again"}), 401
+
+    def _after_commit(self, session):
+        # Not on a savepoint release: a reader could cache the old version again before the commit
+        if session.in_nested_transaction():
+            return
+        user_ids = session.info.pop('revoked_users', ())
+        if user_ids:
+            with self._lock:
+                self._epoch += 1
+                for user_id in user_ids:
+                    self._entries.pop(user_id, None)
+
+    def _after_rollback(self, session):
+        if not session.in_nested_transaction():
+            session.info.pop('revoked_users', None)
+
+
+token_versions = TokenVersions()
@@ -0,0 +1,177 @@
+import importlib.util
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from storage import upload_store
+
+# name -> longest edge in pixels
+VARIANTS = {
+    'thumb': 160,
+    'card': 640,
+    'full': 1600,
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+DERIVED_DIR = 'derived'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+
+
+def variant_name(source_name, variant, fmt):
+    stem = source_name.rsplit('.', 1)[0]
+    return f"{DERIVED_DIR}/{stem}-{variant}.{'jpg' if fmt == 'jpeg' else fmt}"
+
+
+def render_variants(source_path, upload_folder):
+    '''Runs in a pool process: write every missing variant of one image, without metadata'''
+    from PIL import Image, ImageOps
+
+    source_name = os.path.basename(source_path)
+    targets = {
+        (variant, fmt): os.path.join(upload_folder, variant_name(source_name, variant, fmt))
+        for variant in VARIANTS for fmt in FORMATS
+    }
+    missing = {spec: path for spec, path in targets.items() if not os.path.exists(path)}
+    if not missing:
+        return 0
+
+    with Image.open(source_path) as original:
+        # Bake EXIF orientation into the pixels since the EXIF block itself is dropped
+        image = ImageOps.exif_transpose(original)
+        image.info.clear()
+        for (variant, fmt), path in missing.items():
+            resized = image.copy()
+            resized.thumbnail((VARIANTS[variant], VARIANTS[variant]), Image.LANCZOS)
+            if fmt == 'jpeg' and resized.mode != 'RGB':
+                resized = resized.convert('RGB')
+            elif fmt == 'webp' and resized.mode not in ('RGB', 'RGBA'):
+                resized = resized.convert('RGBA')
+            pil_format, options = FORMATS[fmt]
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            resized.save(tmp_path, pil_format, **options)
+            os.replace(tmp_path, path)
+    return len(missing)
+
+
+class ImagePipeline:
+    '''Generates resized WebP/JPEG variants of uploads in a process pool. The upload store
+    submits each upload once its file is in place, after the upload commits.'''
+    def __init__(self, app=None):
+        self._executor = None
+        self._lock = threading.Lock()
+        # key -> (recheck at, {(variant, fmt): name} on disk). Content-addressed, so a complete
+        # set stays that way; anything less is looked at again after IMAGE_VARIANT_RECHECK
+        self._checked = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IMAGE_PIPELINE_ENABLED', importlib.util.find_spec('PIL') is not None)
+        app.config.setdefault('IMAGE_WORKERS', os.cpu_count() or 2)
+        app.config.setdefault('IMAGE_VARIANT_RECHECK', 60)
+        app.extensions['image_pipeline'] = self
+        self.app = app
+        self.folder = app.config['UPLOAD_FOLDER']
+        os.makedirs(os.path.join(self.folder, DERIVED_DIR), exist_ok=True)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: workers must not inherit the web worker's threads or DB connections
+                self._executor = ProcessPoolExecutor(max_workers=self.app.config['IMAGE_WORKERS'],
+                                                     mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _discard_executor(self, executor):
+        # A worker died (OOM kill, segfault in a codec) and the pool refuses new work; the next
+        # submit starts a fresh one
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self, wait=True):
+        '''Stop the worker processes (the next submit starts new ones)'''
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def submit(self, key):
+        '''Render the variants of an upload whose file is in place (called by the upload store)'''
+        if not self.app.config['IMAGE_PIPELINE_ENABLED'] or not key.lower().endswith(IMAGE_EXTENSIONS):
+            return
+        # The transaction is already committed, so a failure here must not reach the request
+        source = os.path.join(self.folder, key)
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                future = executor.submit(render_variants, source, self.folder)
+            except BrokenProcessPool:
+                self._discard_executor(executor)
+                continue
+            except Exception as e:
+                self.app.logger.error(f"Could not queue image variants for {key}: {str(e)}")
+                return
+            future.add_done_callback(partial(self._finished, executor, key))
+            return
+        self.app.logger.error(f"Could not queue image variants for {key}: the process pool keeps breaking")
+
+    def _finished(self, executor, key, future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            # Show the new variants without waiting for the recheck
+            self._checked.pop(key, None)
+            return
+        if isinstance(error, BrokenProcessPool):
+            self._discard_executor(executor)
+        self.app.logger.error(f"Image variant generation failed for {key}: {str(error)}")
+
+    def variant_urls(self, key):
+        '''{variant: {format: url}} for the variants of an upload that are on disk, None for
+        external images and for uploads with nothing rendered (yet, or ever)'''
+        if not key or '/' in key or '.' not in key:
+            return None
+        checked = self._checked.get(key)
+        if checked is None or checked[0] < time.monotonic():
+            names = {(variant, fmt): variant_name(key, variant, fmt) for variant in VARIANTS for fmt in FORMATS}
+            names = {spec: name for spec, name in names.items() if os.path.exists(os.path.join(self.folder, name))}
+            complete = len(names) == len(VARIANTS) * len(FORMATS)
+            recheck_at = math.inf if complete else time.monotonic() + self.app.config['IMAGE_VARIANT_RECHECK']
+            self._checked[key] = checked = (recheck_at, names)
+        names = checked[1]
+        if not names:
+            return None
+        urls = {}
+        for (variant, fmt), name in names.items():
+            urls.setdefault(variant, {})[fmt] = upload_store.url(name)
+        return urls
+
+    def backfill(self):
+        '''Render variants for every image already in the upload folder, in parallel'''
+        sources = [
+            os.path.join(self.folder, name) for name in sorted(os.listdir(self.folder))
+            if name.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(os.path.join(self.folder, name))
+        ]
+        rendered, failed = 0, []
+        with ProcessPoolExecutor(max_workers=self.app.config['IMAGE_WORKERS'],
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {pool.submit(render_variants, path, self.folder): path for path in sources}
+            for future, path in futures.items():
+                try:
+                    rendered += future.result()
+                except Exception as e:
+                    failed.append((os.path.basename(path), str(e)))
+        return len(sources), rendered, failed
+
+
+image_pipeline = ImagePipeline()
@@ -1,83 +1,262 @@
 import os
-import math
 import re
 import secrets
 import random
-import jwt
+import click
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from dotenv import load_dotenv
-from flask import Flask, jsonify, request, make_response
-from flask_sqlalchemy import SQLAlchemy
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity,unset_jwt_cookies,decode_token
-from flask_bcrypt import Bcrypt, check_password_hash, generate_password_hash
-from jwt import decode, ExpiredSignatureError, InvalidTokenError
-from flask_jwt_extended.exceptions import JWTDecodeError
+from flask import Blueprint, Flask, Response, current_app, jsonify, request, make_response, stream_with_context
+from flask.cli import ScriptInfo
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity,unset_jwt_cookies
+from flask_bcrypt import Bcrypt
 from flask_cors import CORS
-from flask_migrate import Migrate
-from faker import Faker
-from slugify import slugify
-from flask_mail import Mail, Message
-from werkzeug.utils import secure_filename
 from models import Contacts,User,Posts,db
+from replicas import replica_router
+from search import search_engine
+from pagination import InvalidCursor, InvalidFilter, cursor_requested, filter_posts, keyset_paginate, listing_options, paginate, total_pages
+from slugs import SlugConflictError, assign_unique_slug
+from outbox import outbox
+from hashing import HasherBusy, password_hasher
+from cache import response_cache
+from compress import response_compression
+from metrics import metrics
+from storage import upload_store
+from images import image_pipeline
+from static_assets import static_assets
+from bulk import export_posts, import_posts
+from serializers import (LISTING_FIELDS, POST_DETAIL_FIELDS, POST_EDIT_FIELDS, POST_SUMMARY_FIELDS, USER_LISTING_FIELDS,
+                         USER_PROFILE_FIELDS, USER_SUMMARY_FIELDS, post_schema, user_schema)
+from json_provider import FastJSONProvider
+from throttle import throttle
+from identity import token_versions
+from counters import post_counters
 
-# Load environment variables
-load_dotenv()
-
-# Flask app setup
-app = Flask(__name__)
-app.secret_key = os.getenv('SECRET_KEY')
-cors = CORS(app)
-app.config['CORS_HEADERS'] = 'Content-Type'
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
-
-# Database Configuration
-local_server = os.getenv('LOCAL_SERVER', 'True').lower() == 'true'
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('LOCAL_URL') if local_server else os.getenv('PROD_URL')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Initialize extensions
-db.init_app(app)
-jwt = JWTManager(app)
-bcrypt = Bcrypt(app)
-migrate = Migrate(app, db)
-fake = Faker()
-
-# File upload configuration
-UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER")
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
-# Mail configuration
-app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER')
-app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT'))
-app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS').lower() == 'true'
-app.config['MAIL_USE_SSL'] = os.getenv('MAIL_USE_SSL').lower() == 'true'
-app.config['MAIL_USERNAME'] = os.getenv('GMAIL_USER')
-app.config['MAIL_PASSWORD'] = os.getenv('GMAIL_PASSWORD')
-app.config['MAIL_DEFAULT_SENDER'] = os.getenv('GMAIL_USER')
-mail = Mail(app)
-
-# Blog Configurations
-blog_name = os.getenv('BLOG_NAME')
-about_txt = os.getenv('ABOUT_TXT')
-no_of_posts = int(os.getenv('NO_OF_POSTS'))
-
-# Social Media URLs
-fb_url = os.getenv('FB_URL')
-x_url = os.getenv('X_URL')
-git_url = os.getenv('GIT_URL')
+# Routes and CLI commands; cli_group=None keeps the commands at the top level (`flask seed`)
+bp = Blueprint('blog', __name__, cli_group=None)
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    return value.lower() == 'true' if value else default
+
+def config_from_env():
+    """Settings from the environment (and .env); anything unset falls back to a default."""
+    load_dotenv()
+    local_server = _env_bool('LOCAL_SERVER', True)
+    return {
+        'SECRET_KEY': os.getenv('SECRET_KEY'),
+        'CORS_HEADERS': 'Content-Type',
+        'JWT_SECRET_KEY': os.getenv('JWT_SECRET_KEY'),
+        'JWT_ACCESS_TOKEN_EXPIRES': timedelta(hours=1),
+        'BCRYPT_LOG_ROUNDS': _env_int('BCRYPT_LOG_ROUNDS', 12),
+
+        # Database Configuration
+        'SQLALCHEMY_DATABASE_URI': (os.getenv('LOCAL_URL') if local_server else os.getenv('PROD_URL')) or 'sqlite:///blog.db',
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        # Read replicas, comma separated; GET requests read from one of them
+        'SQLALCHEMY_REPLICA_URIS': [url.strip() for url in os.getenv('REPLICA_URLS', '').split(',') if url.strip()],
+        # Connection pool for the primary and every replica
+        'DB_POOL_OPTIONS': {
+            'pool_size': _env_int('DB_POOL_SIZE', 5),
+            'max_overflow': _env_int('DB_MAX_OVERFLOW', 10),
+            'pool_timeout': _env_int('DB_POOL_TIMEOUT', 30),
+            'pool_recycle': _env_int('DB_POOL_RECYCLE', 1800),
+            'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', True),
+        },
+        'REPLICA_STICKY_SECONDS': _env_int('REPLICA_STICKY_SECONDS', 5),
+
+        # Rate limits on the expensive routes; memory:// is per process, redis://... is shared
+        'RATELIMIT_ENABLED': _env_bool('RATELIMIT_ENABLED', True),
+        'RATELIMIT_STORAGE_URI': os.getenv('RATELIMIT_STORAGE_URI', 'memory://'),
+
+        # File upload configuration
+        'UPLOAD_FOLDER': os.getenv('UPLOAD_FOLDER') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads'),
+
+        # Mail configuration
+        'MAIL_SERVER': os.getenv('MAIL_SERVER', 'localhost'),
+        'MAIL_PORT': _env_int('MAIL_PORT', 25),
+        'MAIL_USE_TLS': _env_bool('MAIL_USE_TLS', False),
+        'MAIL_USE_SSL': _env_bool('MAIL_USE_SSL', False),
+        'MAIL_USERNAME': os.getenv('GMAIL_USER'),
+        'MAIL_PASSWORD': os.getenv('GMAIL_PASSWORD'),
+        'MAIL_DEFAULT_SENDER': os.getenv('GMAIL_USER'),
+
+        # Blog Configurations
+        'BLOG_NAME': os.getenv('BLOG_NAME', 'Code Hunter'),
+        'ABOUT_TXT': os.getenv('ABOUT_TXT'),
+        'NO_OF_POSTS': _env_int('NO_OF_POSTS', 5),
+        # Most ids/slugs one /posts/batch-* request may name
+        'BATCH_MAX_SIZE': _env_int('BATCH_MAX_SIZE', 100),
+
+        # Social Media URLs
+        'FB_URL': os.getenv('FB_URL'),
+        'X_URL': os.getenv('X_URL'),
+        'GIT_URL': os.getenv('GIT_URL'),
+    }
+
+class MigrateCommands(click.Command):
+    """`flask db ...` from Flask-Migrate, which (with Alembic) is only imported when the command runs."""
+    def make_context(self, info_name, args, parent=None, **extra):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as migrate_group
+        app = parent.ensure_object(ScriptInfo).load_app()
+        if 'migrate' not in app.extensions:
+            Migrate(app, db)
+        # The context belongs to Flask-Migrate's group, so click goes on to invoke that
+        return migrate_group.make_context(info_name, args, parent=parent, **extra)
+
+def create_app(config=None):
+    """Build the app. Nothing here connects to the database or imports Faker, Flask-Mail
+    or Alembic, so a server can import it once and fork workers (gunicorn --preload).
+    The schema comes from `flask init-db` / `flask db upgrade`, not from starting the app."""
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.config.from_mapping(config_from_env())
+    app.config.from_mapping(config or {})
+    CORS(app)
+
+    # Initialize extensions
+    replica_router.init_app(app)
+    db.init_app(app)
+    replica_router.configure_engines(db)
+    token_versions.init_app(app, JWTManager(app))
+    password_hasher.init_app(app, Bcrypt(app))
+    search_engine.init_app(app)
+    post_counters.init_app(app)
+    response_cache.init_app(app)
+    metrics.init_app(app)
+    # after_request hooks run last-registered first: compress before metrics counts the bytes
+    response_compression.init_app(app)
+    throttle.init_app(app)
+    upload_store.init_app(app)
+    image_pipeline.init_app(app)
+    static_assets.init_app(app)
+    outbox.init_app(app)
+
+    app.register_blueprint(bp)
+    app.cli.add_command(MigrateCommands('db', help='Perform database migrations.'))
+    return app
+
+@lru_cache(maxsize=None)
+def _faker():
+    from faker import Faker
+    return Faker()
 
 # Helper function for file validation
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-with app.app_context():
+# Load the authors of a page of posts in one query, fetching only id and name
+def author_names(posts):
+    user_ids = {post.user_id for post in posts}
+    if not user_ids:
+        return {}
+    return dict(db.session.query(User.id, User.name).filter(User.id.in_(user_ids)).all())
+
+# SEARCH_COUNT may leave the total out (None) or stop counting at SEARCH_COUNT_LIMIT
+def search_totals(page):
+    return {"total_estimated": page.estimated, "has_next": page.has_next}
+
+@bp.cli.command('init-db')
+def init_db():
+    """Create missing tables, the search index and post counters (then run `flask db stamp head`)."""
     db.create_all()
+    search_engine.setup()
+    post_counters.reconcile()
+    print(f"Database ready (search: {search_engine.backend.name})")
+
+@bp.cli.command('search-reindex')
+def search_reindex():
+    """Rebuild the post search index from the posts table."""
+    search_engine.rebuild()
+    db.session.commit()
+    print(f"Search index rebuilt ({search_engine.backend.name})")
+
+@bp.cli.command('counters-reconcile')
+def counters_reconcile():
+    """Recount posts and fix post counters that drifted."""
+    fixed = post_counters.reconcile()
+    for name, stored, actual in fixed:
+        print(f"  {name}: {stored} -> {actual}")
+    print(f"Fixed {len(fixed)} counters")
+
+@bp.cli.command('outbox-worker')
+def outbox_worker():
+    """Deliver queued mail until interrupted."""
+    outbox.run_forever()
+
+@bp.cli.command('uploads-adopt')
+def uploads_adopt():
+    """Move uploads saved under client filenames into content-addressed storage."""
+    adopted = upload_store.adopt_legacy()
+    print(f"Adopted {len(adopted)} files into {len(set(adopted.values()))} stored objects")
+
+@bp.cli.command('uploads-gc')
+def uploads_gc():
+    """Delete uploaded files that are no longer referenced."""
+    print(f"Removed {upload_store.collect_garbage()} unreferenced and abandoned files")
+
+@bp.cli.command('assets-build')
+def assets_build():
+    """Fingerprint static files and prebuild their gzip/brotli variants."""
+    manifest, written = static_assets.build()
+    print(f"Fingerprinted {len(manifest)} static files, wrote {written} compressed variants")
+
+@bp.cli.command('posts-export')
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-', help='NDJSON file to write (default stdout).')
+def posts_export(output):
+    """Stream every post, with its author's email, as NDJSON."""
+    for line in export_posts(include_email=True):
+        output.write(line)
+
+@bp.cli.command('posts-import')
+@click.argument('source', type=click.File('rb'))
+@click.option('--user-id', type=int, default=None, help='Owner of every imported post instead of matching author_email.')
+def posts_import(source, user_id):
+    """Import posts from an NDJSON file."""
+    report = import_posts(source, user_id=user_id)
+    print(f"Imported {report['imported']} posts, {report['failed']} lines failed")
+    for error in report['errors']:
+        print(f"  line {error['line']}: {error['error']}")
+
+@bp.cli.command('seed')
+@click.option('--users', default=100, show_default=True, help='Users to create.')
+@click.option('--posts', default=1000, show_default=True, help='Posts to create.')
+@click.option('--seed', 'seed_value', default=0, show_default=True, help='Random seed; the same seed gives the same data.')
+@click.option('--content-length', default='lognormal:6.3:0.7', show_default=True,
+              help='Content length in characters: fixed:N, uniform:LOW:HIGH or lognormal:MU:SIGMA.')
+@click.option('--title-collisions', default=0.05, show_default=True, help='Share of posts reusing a popular title.')
+@click.option('--title-pool', default=50, show_default=True, help='Number of popular titles (Zipf distributed).')
+@click.option('--batch-size', default=10000, show_default=True, help='Rows per generated chunk and INSERT.')
+@click.option('--workers', default=None, type=int, help='Generator processes (default: CPU count).')
+@click.option('--password', default='Passw0rd!', show_default=True, help='Password shared by every seeded user.')
+def seed_command(users, posts, seed_value, content_length, title_collisions, title_pool, batch_size, workers, password):
+    """Generate a reproducible synthetic dataset for load testing."""
+    from seed import seed
+    try:
+        seed(users=users, posts=posts, seed_value=seed_value, content_length=content_length,
+             collision_rate=title_collisions, title_pool_size=title_pool, batch_size=batch_size,
+             workers=workers, password_hash=password_hasher.hash(password))
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+@bp.cli.command('images-backfill')
+def images_backfill():
+    """Generate resized variants for every image in the upload folder."""
+    total, rendered, failed = image_pipeline.backfill()
+    print(f"Processed {total} images, wrote {rendered} variants")
+    for name, error in failed:
+        print(f"  failed: {name}: {error}")
 
 # User Authentication Routes
-@app.route('/register', methods=['POST'])
+@bp.route('/register', methods=['POST'])
+@throttle.expensive(cost=10)
 def register():
     try:
         # Handle JSON data
@@ -126,63 +305,45 @@ def register():
         if errors:
             return jsonify({"status": False, "errors": errors}), 422
         
-        # Handle Image Upload
+        # Handle Image Upload, stored once per distinct content
         filename = None
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-
-            # Ensure unique filename
-            counter = 1
-            while os.path.exists(file_path):
-                filename = f"{counter}_{secure_filename(file.filename)}"
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                counter += 1
-            file.save(file_path)
+            filename = upload_store.save(file)
         
         # Hash password and create user
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        hashed_password = password_hasher.hash(password)
         new_user = User(name=name, dob=dob, place=place, address=address, image=filename, email=email, password=hashed_password)
         db.session.add(new_user)
-        db.session.commit()
 
-        # Send welcome email to the user
-        try:
-            subject = f"Welcome to {blog_name}!"
-            body = f"""
-            Hello {name},
-            
-            Thank you for registering on our blog. We're excited to have you join our community!
-            
-            Best regards,
-            The {blog_name} Team
-            """
-            
-            msg = Message(subject, recipients=[email], bcc=[os.getenv('GMAIL_USER')])
-            msg.body = body
-            mail.send(msg)
-        except Exception as e:
-            app.logger.error(f"Failed to send welcome email: {str(e)}")
+        # Queue welcome email to the user
+        blog_name = current_app.config['BLOG_NAME']
+        subject = f"Welcome to {blog_name}!"
+        body = f"""
+        Hello {name},
+        
+        Thank you for registering on our blog. We're excited to have you join our community!
+        
+        Best regards,
+        The {blog_name} Team
+        """
+        outbox.queue(subject, [email], body, bcc=[os.getenv('GMAIL_USER')])
+        db.session.commit()
 
         return jsonify({
             "status": True,
             "message": "User registered successfully!",
-            "User": {
-                "id": new_user.id,
-                "name": new_user.name,
-                "dob": new_user.dob,
-                "place": new_user.place,
-                "address": new_user.address,
-                "email": new_user.email,
-                "image_url": new_user.image
-            }
+            "User": user_schema.dump(new_user, USER_PROFILE_FIELDS)
         }), 201
     
+    except HasherBusy:
+        db.session.rollback()
+        return jsonify({"status": False, "message": "Server is busy, please try again shortly"}), 503, {"Retry-After": "1"}
     except Exception as e:
         db.session.rollback()
         return jsonify({"status": False, "message": f"Registration failed: {str(e)}"}), 500
 
-@app.route('/login', methods=['POST'])
+@bp.route('/login', methods=['POST'])
+@throttle.expensive(cost=4)
 def login():
     try:
         data = request.get_json()
@@ -205,27 +366,31 @@ def login():
         if not user:
             return jsonify({"status": False, "error": "Email not found"}), 404
         
-        if not check_password_hash(user.password, password):
+        if not password_hasher.verify(user.password, password):
             return jsonify({"status": False, "error": "Incorrect password"}), 401
 
+        # Upgrade hashes made with a different bcrypt cost while we have the plain password
+        if password_hasher.needs_rehash(user.password):
+            user.password = password_hasher.hash(password)
+            db.session.commit()
+
         # Generate JWT tokens
-        access_token = create_access_token(identity=str(user.id))
+        access_token = create_access_token(identity=str(user.id), additional_claims=token_versions.claims(user))
         
         return jsonify({
             "status": True,
             "message": "Login successful!",
             "access_token": access_token,
-            "user": {
-                "id": user.id,
-                "name": user.name,
-                "email": user.email
-            }
+            "user": user_schema.dump(user, USER_SUMMARY_FIELDS)
         }), 200
 
+    except HasherBusy:
+        return jsonify({"status": False, "error": "Server is busy, please try again shortly"}), 503, {"Retry-After": "1"}
     except Exception as e:
         return jsonify({"status": False, "error": f"Login failed: {str(e)}"}), 500
 
-@app.route('/forgot-password', methods=['POST'])
+@bp.route('/forgot-password', methods=['POST'])
+@throttle.expensive(cost=3)
 def forgot_password():
     try:
         data = request.get_json()
@@ -249,37 +414,34 @@ def forgot_password():
         # Store token and expiry in the database
         user.reset_token = reset_token
         user.token_expiry = token_expiry
-        db.session.commit()
 
-        # Send Reset Email
-        try:
-            reset_link = f"{request.host_url}reset-password/{reset_token}"
-            subject = "Password Reset Request"
-            body = f"""
-            Hello {user.name},
+        # Queue Reset Email in the same transaction as the token
+        reset_link = f"{request.host_url}reset-password/{reset_token}"
+        subject = "Password Reset Request"
+        body = f"""
+        Hello {user.name},
 
-            We received a request to reset your password. Click the link below to reset it:
-            
-            {reset_link}
+        We received a request to reset your password. Click the link below to reset it:
+        
+        {reset_link}
 
-            This link will expire in 10 minutes.
+        This link will expire in 10 minutes.
 
-            If you did not request this, please ignore this email.
+        If you did not request this, please ignore this email.
 
-            Regards,
-            Your Team Code Hunter
-            """
-            msg = Message(subject, recipients=[email], body=body)
-            mail.send(msg)
-        except Exception as e:
-            return jsonify({"status": False, "error": f"Failed to send email: {str(e)}"}), 500
+        Regards,
+        Your Team Code Hunter
+        """
+        outbox.queue(subject, [email], body)
+        db.session.commit()
 
         return jsonify({"status": True, "message": "Password reset email sent"}), 200
 
     except Exception as e:
         return jsonify({"status": False, "error": f"Forgot password failed: {str(e)}"}), 500
 
-@app.route('/reset-password/<token>', methods=['POST'])
+@bp.route('/reset-password/<token>', methods=['POST'])
+@throttle.expensive(cost=5)
 def reset_password(token):
     try:
         data = request.get_json()
@@ -309,35 +471,34 @@ def reset_password(token):
         if user.token_expiry.replace(tzinfo=timezone.utc) < datetime.now(timezone.utc):
             return jsonify({"status": False, "error": "Token has expired"}), 400
 
-        # Update password and clear reset token
-        user.password = generate_password_hash(new_password)
+        # Update password, clear reset token and revoke the tokens issued so far
+        user.password = password_hasher.hash(new_password)
         user.reset_token = None
         user.token_expiry = None
-        db.session.commit()
+        token_versions.revoke(user)
 
-        # Send email notification
-        try:
-            subject = "Password Reset Successful!"
-            body = f"""
-            Hello {user.name},
+        # Queue email notification
+        subject = "Password Reset Successful!"
+        body = f"""
+        Hello {user.name},
 
-            Your password has been successfully reset. If you did not request this change, please contact support immediately.
+        Your password has been successfully reset. If you did not request this change, please contact support immediately.
 
-            Best Regards,  
-            The Team Code Hunter
-            """
-            msg = Message(subject, recipients=[user.email],body=body)
-            msg.body = body
-            mail.send(msg)
-        except Exception as e:
-            app.logger.error(f"Failed to send reset password email: {str(e)}")
+        Best Regards,  
+        The Team Code Hunter
+        """
+        outbox.queue(subject, [user.email], body)
+        db.session.commit()
 
         return jsonify({"status": True, "message": "Password reset successful! A confirmation email has been sent."}), 200
 
+    except HasherBusy:
+        return jsonify({"status": False, "error": "Server is busy, please try again shortly"}), 503, {"Retry-After": "1"}
     except Exception as e:
         return jsonify({"status": False, "error": f"Reset password failed: {str(e)}"}), 500
 
-@app.route('/change-password', methods=['POST'])
+@bp.route('/change-password', methods=['POST'])
+@throttle.expensive(cost=8)
 @jwt_required()
 def change_password():
     try:
@@ -365,71 +526,65 @@ def change_password():
             return jsonify({"status": False, "errors": errors}), 400
 
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = db.session.get(User, user_id)
         if not user:
             return jsonify({"status": False, "error": "User not found"}), 404
 
-        if not check_password_hash(user.password, current_password):
+        if not password_hasher.verify(user.password, current_password):
             return jsonify({"status": False, "error": "Incorrect current password"}), 401
 
-        if check_password_hash(user.password, new_password):
+        # current_password is verified, so a plain comparison saves a second bcrypt run
+        if new_password == current_password:
             return jsonify({"status": False, "error": "New password cannot be the same as the old password"}), 400
 
-        user.password = generate_password_hash(new_password)
-        db.session.commit()
+        user.password = password_hasher.hash(new_password)
+        # Every token issued so far, on every device, stops working once this commits
+        token_versions.revoke(user)
 
-        # Force logout by unsetting all JWT cookies
-        response = jsonify({"status": True, "message": "Password changed successfully! You have been logged out on all devices."})
-        unset_jwt_cookies(response)
+        # Queue email notification
+        subject = "Password Change Notification"
+        body = f"""
+        Hello {user.name},
 
-        # Send email notification
-        try:
-            subject = "Password Change Notification"
-            body = f"""
-            Hello {user.name},
+        Your password has been successfully changed. If you did not request this change, please contact support immediately.
 
-            Your password has been successfully changed. If you did not request this change, please contact support immediately.
+        Best Regards,  
+        The Team Code Hunter
+        """
+        outbox.queue(subject, [user.email], body)
+        db.session.commit()
 
-            Best Regards,  
-            The Team Code Hunter
-            """
-            msg = Message(subject, recipients=[user.email])
-            msg.body = body
-            mail.send(msg)
-        except Exception as e:
-            app.logger.error(f"Failed to send password change email: {str(e)}")
+        # Also clear the JWT cookies of this client
+        response = jsonify({"status": True, "message": "Password changed successfully! You have been logged out on all devices."})
+        unset_jwt_cookies(response)
 
         return response
 
+    except HasherBusy:
+        return jsonify({"status": False, "error": "Server is busy, please try again shortly"}), 503, {"Retry-After": "1"}
     except Exception as e:
         return jsonify({"status": False, "error": f"Password change failed: {str(e)}"}), 500
 
-@app.route('/random_post/<int:user_id>', methods=['POST'])
+@bp.route('/random_post/<int:user_id>', methods=['POST'])
 def random_post(user_id):
-    user = User.query.get(user_id)
+    user = db.session.get(User, user_id)
     if not user:
         return jsonify({"status": False, "error": "User not found!"}), 404
     
     for _ in range(5):  # Generate exactly 5 posts
-        title = fake.sentence()
-        base_slug = slugify(title)
-        
-        # Ensure unique slug
-        unique_slug = base_slug
-        count = 1
-        while Posts.query.filter_by(slug=unique_slug).first():
-            unique_slug = f"{base_slug}-{count}"
-            count += 1
-        
+        title = _faker().sentence()
         post = Posts(
             user_id=user_id,
             title=title,
-            slug=unique_slug,
-            content=fake.text(),
+            content=_faker().text(),
             date=datetime.now().strftime("%d-%m-%Y %I:%M %p"),
             img_file=f"https://picsum.photos/200/300?random={random.randint(1, 100)}"
         )
-        db.session.add(post)
+        assign_unique_slug(post, title)
+        search_engine.index_post(post)
+        response_cache.invalidate(f"slug:{post.slug}")
+    post_counters.add(user_id, 5)
+    response_cache.invalidate("listing")
     db.session.commit()  # Commit all 5 posts in a single transaction
 
     return jsonify({
@@ -437,20 +592,38 @@ def random_post(user_id):
         "message": f"5 random posts created successfully for user {user_id}!"
     }), 201
 
-@app.route("/post", methods=['GET'])
+@bp.route("/post", methods=['GET'])
+@response_cache.cached
 def get_posts():
     try:
         # Get query parameters from the request URL
         search_query = request.args.get("search", "").strip()
         page = request.args.get("page", 1, type=int)
         per_page = request.args.get("per_page", 2, type=int)
-        
-        posts_query = Posts.query
-
+        cursor_mode = cursor_requested(request.args)
+        sort, since, until = listing_options(request.args)
+        fields = post_schema.requested(request.args, LISTING_FIELDS)
+
+        if search_query and (sort or since or until):
+            return jsonify({"error": "Sorting and date filters cannot be combined with search!", "status": False}), 400
+
+        # Plain rows of just the columns behind the requested fields; content only if asked for
+        base_query = post_schema.select(Posts.query, fields, extra=(Posts.created_at,) if sort else ())
+        if cursor_mode:
+            if search_query:
+                return jsonify({"error": "Cursor pagination cannot be combined with search!", "status": False}), 400
+            posts_query = filter_posts(base_query, since=since, until=until)
+            posts_paginated = keyset_paginate(posts_query, request.args.get("cursor"), request.args.get("limit", type=int), sort=sort)
+        elif search_query:
+            posts_paginated = search_engine.paginate(search_query, page=page, per_page=per_page, query=base_query)
+        else:
+            # Unfiltered listings take their total from the counter instead of a COUNT(*)
+            total = post_counters.total() if since is None and until is None else None
+            posts_paginated = paginate(filter_posts(base_query, sort, since, until), page, per_page, total)
+
+        response_cache.tag("listing", *(f"post:{post.sno}" for post in posts_paginated.items))
         if search_query:
-            posts_query = posts_query.filter(Posts.title.ilike(f"%{search_query}%"))
-
-        posts_paginated = posts_query.paginate(page=page, per_page=per_page, error_out=False)
+            response_cache.tag("search")
 
         if not posts_paginated.items:
             return make_response(jsonify({
@@ -459,18 +632,17 @@ def get_posts():
             "status": "true"
         }), 200)
 
-        posts_data = [
-            {
-                "id": post.sno,
-                "title": post.title,
-                "content": post.content,
-                "slug": post.slug,
-                "img_file": post.img_file,
-                "author": post.author.name if post.author else "Unknown Author",
-                "date": post.date if post.date else ""
-            }
-            for post in posts_paginated.items
-        ]
+        authors = author_names(posts_paginated.items) if "author" in fields else {}
+        posts_data = post_schema.dump_many(posts_paginated.items, fields, authors)
+
+        if cursor_mode:
+            return jsonify({
+                "message": "Posts fetched successfully!",
+                "status": True,
+                "limit": posts_paginated.limit,
+                "next_cursor": posts_paginated.next_cursor,
+                "posts": posts_data
+            }), 200
 
         return jsonify({
             "message": "Posts fetched successfully!",
@@ -478,37 +650,33 @@ def get_posts():
             "search_query": search_query,
             "current_page": page,
             "per_page": per_page,
-            "total_pages": posts_paginated.pages,
+            "total_pages": total_pages(posts_paginated.total, posts_paginated.per_page),
             "total_posts": posts_paginated.total,
+            **(search_totals(posts_paginated) if search_query else {}),
             "posts": posts_data
         }), 200
 
+    except (InvalidCursor, InvalidFilter) as e:
+        return jsonify({"error": str(e), "status": False}), 400
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}", "status": False}), 500
 
-@app.route("/post/<string:post_slug>",methods = ['GET'])
+@bp.route("/post/<string:post_slug>",methods = ['GET'])
+@response_cache.cached
 def post_slug(post_slug):
         post = Posts.query.filter_by(slug=post_slug).first()
+        response_cache.tag(f"slug:{post_slug}")
         if not post:
             return make_response(jsonify({
             "message": "No posts found",
             "posts": [],
             "status": "true"
         }), 200)
-        post_data = [
-            {
-                "id": post.sno,
-                "title": post.title,
-                "content": post.content,
-                "slug": post.slug,
-                "img_file": post.img_file,
-                "date": post.date,
-                "user_id": post.user_id
-            }
-        ]
+        response_cache.tag(f"post:{post.sno}")
+        post_data = [post_schema.dump(post, POST_DETAIL_FIELDS)]
         return make_response(jsonify({"message": "Post fetched successfully!","status": True, "post": post_data}), 200)
 
-@app.route("/add",methods=['POST'])
+@bp.route("/add",methods=['POST'])
 @jwt_required()
 def add_post():
     try:
@@ -532,80 +700,58 @@ def add_post():
         if not img_file:
             return jsonify({"error": "Image file is required!","status": False}), 400
     
-        # Generate Unique Slug from Title
-        base_slug = slugify(title)
-        unique_slug = base_slug
-        count = 1
-        while Posts.query.filter_by(slug=unique_slug).first():
-            unique_slug = f"{base_slug}-{count}"
-            count += 1
-        
         # Image Upload
         filename = None
         if img_file and img_file.filename:
             if not allowed_file(img_file.filename):
                 return jsonify({"error": "Invalid file type! Only JPG, JPEG, PNG allowed.","status": False}), 400
 
-            filename = secure_filename(img_file.filename)
-            upload_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-
             try:
-                img_file.save(upload_path)
+                filename = upload_store.save(img_file)
             except Exception as e:
                 return jsonify({"error": "Failed to upload image!", "details": str(e)}), 500
 
         new_post = Posts(
-            title=title, slug=unique_slug, content=content,
+            title=title, content=content,
             date=date, img_file=filename, user_id=user_id
         )
-        db.session.add(new_post)
+        # Generate Unique Slug from Title
+        assign_unique_slug(new_post, title)
+        search_engine.index_post(new_post)
+        post_counters.add(new_post.user_id)
+        response_cache.invalidate("listing", f"slug:{new_post.slug}")
         db.session.commit()
 
         return jsonify({
             "message": "Post added successfully!",
             "status": True,
-            "post": {
-                "id": new_post.sno,
-                "title": new_post.title,
-                "slug": new_post.slug,
-                "content": new_post.content,
-                "date": new_post.date,
-                "img_file": new_post.img_file,
-                "user_id": new_post.user_id
-            }
+            "post": post_schema.dump(new_post, POST_EDIT_FIELDS)
         }), 201
 
+    except SlugConflictError as e:
+        db.session.rollback()
+        return jsonify({"error": "Could not generate a unique slug, please try again!", "details": str(e), "status": False}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": "Something went wrong!", "details": str(e)}), 500
 
-@app.route("/edit/<int:sno>", methods=['GET','PUT'])
+@bp.route("/edit/<int:sno>", methods=['GET','PUT'])
 @jwt_required()
 def edit_post(sno):
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({"error": "Unauthorized! Please log in.","status": False}), 401
-        
-        post = Posts.query.get(sno)
+        # The token check already confirmed the user exists
+        user_id = int(get_jwt_identity())
+
+        post = db.session.get(Posts, sno)
         if not post:
             return jsonify({"error": f"Post with ID {sno} not found!","status": False}), 404
 
-        if post.user_id != user.id:
+        if post.user_id != user_id:
             return jsonify({"error": "You are not authorized to edit this post!","status": False}), 403
         
         if request.method == 'GET':
             return jsonify({
-                "post": {
-                    "id": post.sno,
-                    "title": post.title,
-                    "slug": post.slug,
-                    "content": post.content,
-                    "date": post.date,
-                    "img_file": post.img_file,
-                    "user_id": post.user_id
-                }
+                "post": post_schema.dump(post, POST_EDIT_FIELDS)
             }), 200
         
         if request.method == 'PUT':
@@ -624,49 +770,40 @@ def edit_post(sno):
             if len(content) < 10 or len(content) > 5000:
                 return jsonify({"error": "Content must be between 10 and 5000 characters!","status": False}), 400
 
-            base_slug = slugify(title)
-            unique_slug = base_slug
-            count = 1
-            while Posts.query.filter(Posts.slug == unique_slug, Posts.sno != sno).first():
-                unique_slug = f"{base_slug}-{count}"
-                count += 1
+            old_slug = post.slug
 
             # Update post fields
             post.title = title
-            post.slug = unique_slug
             post.content = content
             post.date = datetime.now().strftime("%d-%m-%Y %I:%M %p")
 
             if img_file and allowed_file(img_file.filename):
-                filename = secure_filename(img_file.filename)
-                img_file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                post.img_file = filename
+                upload_store.release(post.img_file)
+                post.img_file = upload_store.save(img_file)
 
+            assign_unique_slug(post, title)
+            search_engine.index_post(post)
+            response_cache.invalidate(f"post:{post.sno}", f"slug:{old_slug}", f"slug:{post.slug}", "search")
             db.session.commit()
 
             return jsonify({
                 "message": "Post updated successfully!",
                 "status": True,
-                "post": {
-                    "id": post.sno,
-                    "title": post.title,
-                    "slug": post.slug,
-                    "content": post.content,
-                    "date": post.date,
-                    "img_file": post.img_file,
-                    "user_id": post.user_id
-                }
+                "post": post_schema.dump(post, POST_EDIT_FIELDS)
             }), 200
+    except SlugConflictError as e:
+        db.session.rollback()
+        return jsonify({"error": "Could not generate a unique slug, please try again!", "details": str(e), "status": False}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": "Something went wrong!", "details": str(e)}), 500
 
-@app.route("/delete/<int:sno>", methods=['DELETE'])
+@bp.route("/delete/<int:sno>", methods=['DELETE'])
 @jwt_required()
 def delete_post(sno):
     user_id = int(get_jwt_identity())
     
-    post = Posts.query.get(sno)
+    post = db.session.get(Posts, sno)
     if not post:
         return jsonify({"error": "Post not found!","status": False}), 404
     if post.user_id != user_id:
@@ -678,15 +815,17 @@ def delete_post(sno):
             }), 403
     
     try:
+        search_engine.remove_post(post.sno)
+        response_cache.invalidate("listing", f"post:{post.sno}", f"slug:{post.slug}")
+        upload_store.release(post.img_file)
+        post_counters.add(post.user_id, -1)
         db.session.delete(post)
         db.session.commit()
         return jsonify({
             "message": "Post deleted successfully!",
             "status": True,
             "deleted_post": {
-                "id": post.sno,
-                "title": post.title,
-                "slug": post.slug,
+                **post_schema.dump(post, POST_SUMMARY_FIELDS),
                 "deleted_at": datetime.now().strftime("%d-%m-%Y %I:%M %p")
             }
         }), 200
@@ -694,7 +833,96 @@ def delete_post(sno):
         db.session.rollback()
         return jsonify({"error": "An error occurred while deleting the post.", "details": str(e)}), 500
 
-@app.route("/contact", methods = ['POST'])
+# The one list among `kinds` ("ids" and/or "slugs") in a batch request body, de-duplicated in order
+def batch_keys(data, kinds):
+    given = [kind for kind in kinds if isinstance(data, dict) and kind in data]
+    if len(given) != 1:
+        raise ValueError(f"Send exactly one of: {', '.join(kinds)}")
+    kind = given[0]
+    keys = data[kind]
+    if not isinstance(keys, list) or not keys:
+        raise ValueError(f"'{kind}' must be a non-empty list")
+    limit = current_app.config['BATCH_MAX_SIZE']
+    if len(keys) > limit:
+        raise ValueError(f"At most {limit} {kind} per request")
+    if kind == "ids" and not all(isinstance(key, int) and not isinstance(key, bool) for key in keys):
+        raise ValueError("'ids' must be integers")
+    if kind == "slugs" and not all(isinstance(key, str) for key in keys):
+        raise ValueError("'slugs' must be strings")
+    return kind, list(dict.fromkeys(keys))
+
+@bp.route("/posts/batch-get", methods=['POST'])
+def batch_get_posts():
+    try:
+        kind, keys = batch_keys(request.get_json(silent=True), ("ids", "slugs"))
+        fields = post_schema.requested(request.args, POST_DETAIL_FIELDS)
+    except (ValueError, InvalidFilter) as e:
+        return jsonify({"error": str(e), "status": False}), 400
+
+    # One IN query for the whole batch
+    column = Posts.sno if kind == "ids" else Posts.slug
+    rows = post_schema.select(Posts.query, fields, extra=(Posts.slug,)).filter(column.in_(keys)).all()
+    authors = author_names(rows) if "author" in fields else {}
+    found = {getattr(row, column.key): post for row, post in zip(rows, post_schema.dump_many(rows, fields, authors))}
+
+    key_name = "id" if kind == "ids" else "slug"
+    results = [
+        {key_name: key, "status": "found", "post": found[key]} if key in found
+        else {key_name: key, "status": "not_found", "error": "Post not found!"}
+        for key in keys
+    ]
+    return jsonify({
+        "message": f"{len(found)} of {len(keys)} posts found",
+        "status": True,
+        "results": results
+    }), 200
+
+@bp.route("/posts/batch-delete", methods=['POST'])
+@jwt_required()
+def batch_delete_posts():
+    user_id = int(get_jwt_identity())
+    try:
+        _, ids = batch_keys(request.get_json(silent=True), ("ids",))
+    except ValueError as e:
+        return jsonify({"error": str(e), "status": False}), 400
+
+    try:
+        # Existence and ownership of the whole batch from one query, then one DELETE
+        posts = {post.sno: post for post in
+                 db.session.query(Posts.sno, Posts.user_id, Posts.slug, Posts.img_file).filter(Posts.sno.in_(ids))}
+        owned = [posts[sno] for sno in ids if sno in posts and posts[sno].user_id == user_id]
+        if owned:
+            snos = [post.sno for post in owned]
+            search_engine.remove_posts(snos)
+            response_cache.invalidate("listing", *(f"post:{post.sno}" for post in owned),
+                                      *(f"slug:{post.slug}" for post in owned))
+            for post in owned:
+                upload_store.release(post.img_file)
+            deleted = Posts.query.filter(Posts.sno.in_(snos), Posts.user_id == user_id).delete(synchronize_session=False)
+            post_counters.add(user_id, -deleted)
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": "An error occurred while deleting the posts.", "details": str(e), "status": False}), 500
+
+    results = []
+    for sno in ids:
+        post = posts.get(sno)
+        if post is None:
+            results.append({"id": sno, "status": "not_found", "error": "Post not found!"})
+        elif post.user_id != user_id:
+            results.append({"id": sno, "status": "forbidden", "error": "Unauthorized! You can only delete your own posts."})
+        else:
+            results.append({"id": sno, "status": "deleted", "slug": post.slug})
+    return jsonify({
+        "message": f"{len(owned)} of {len(ids)} posts deleted",
+        "status": True,
+        "deleted_at": datetime.now().strftime("%d-%m-%Y %I:%M %p"),
+        "results": results
+    }), 200
+
+@bp.route("/contact", methods = ['POST'])
+@throttle.expensive(cost=3)
 def contact():
     data = request.get_json()
     name = data.get('name', '').strip()
@@ -732,10 +960,9 @@ def contact():
     try:
         new_contact = Contacts(name=name, email=email, ph_no=phone, msg=message, date=date)
         db.session.add(new_contact)
-        db.session.commit()
 
-        # Send email to admin
-        admin_email = app.config.get('MAIL_USERNAME')
+        # Queue email to admin
+        admin_email = current_app.config.get('MAIL_USERNAME')
         subject = f"New Contact Form Submission from {name}"
         body = f"""
         Name: {name}
@@ -744,19 +971,17 @@ def contact():
         Message: {message}
         Date: {date}
         """
-
-        msg = Message(subject, sender=email, recipients=[admin_email])
-        msg.body = body
-        mail.send(msg)
+        outbox.queue(subject, [admin_email], body, sender=email)
+        db.session.commit()
 
         return jsonify({"status": True, "message": "Your message has been sent successfully!"}), 201
 
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Contact form submission error: {str(e)}")
+        current_app.logger.error(f"Contact form submission error: {str(e)}")
         return jsonify({"status": False, "error": "Something went wrong! Please try again later.", "details": str(e)}), 500
 
-@app.route("/user/posts", methods=['GET'])
+@bp.route("/user/posts", methods=['GET'])
 @jwt_required()
 def user_posts():
     try:
@@ -765,13 +990,26 @@ def user_posts():
         per_page = request.args.get("per_page", type=int)
         page = max(1, request.args.get("page", 1, type=int))
         search_query = request.args.get("search", default="", type=str).strip()
-
-        posts_query = Posts.query.filter_by(user_id=current_user_id)
-        
-        if search_query:
-            posts_query = posts_query.filter(Posts.title.ilike(f"%{search_query}%"))
-        
-        posts_paginated = posts_query.paginate(page=page, per_page=per_page, error_out=False)
+        cursor_mode = cursor_requested(request.args)
+        sort, since, until = listing_options(request.args)
+        fields = post_schema.requested(request.args, USER_LISTING_FIELDS)
+
+        if search_query and (sort or since or until):
+            return jsonify({"error": "Sorting and date filters cannot be combined with search!", "status": False}), 400
+
+        base_query = post_schema.select(Posts.query, fields, extra=(Posts.created_at,) if sort else ())
+        # (user_id, created_at) serves both the filter and the order
+        if cursor_mode:
+            if search_query:
+                return jsonify({"error": "Cursor pagination cannot be combined with search!", "status": False}), 400
+            posts_query = filter_posts(base_query.filter_by(user_id=current_user_id), since=since, until=until)
+            posts_paginated = keyset_paginate(posts_query, request.args.get("cursor"), request.args.get("limit", type=int), sort=sort)
+        elif search_query:
+            posts_paginated = search_engine.paginate(search_query, page=page, per_page=per_page or 20, user_id=current_user_id, query=base_query)
+        else:
+            posts_query = filter_posts(base_query.filter_by(user_id=current_user_id), sort, since, until)
+            total = post_counters.total(current_user_id) if since is None and until is None else None
+            posts_paginated = paginate(posts_query, page, per_page, total)
 
         # If no posts found
         # if not posts_paginated.items:
@@ -785,58 +1023,78 @@ def user_posts():
             }), 200
         
 
-        posts_data = [
-            {
-                "id": post.sno,
-                "title": post.title,
-                "content": post.content,
-                "slug": post.slug,
-                "img_file": post.img_file,
-                "date": post.date
-            }
-            for post in posts_paginated.items
-        ]
-        
+        authors = author_names(posts_paginated.items) if "author" in fields else {}
+        posts_data = post_schema.dump_many(posts_paginated.items, fields, authors)
+
+        if cursor_mode:
+            return jsonify({
+                "status": True,
+                "message": "User posts fetched successfully!",
+                "limit": posts_paginated.limit,
+                "next_cursor": posts_paginated.next_cursor,
+                "posts": posts_data
+            }), 200
+
         return jsonify({
             "status": True,
             "message": "User posts fetched successfully!",
             "current_page": page,
             "per_page": per_page,
-            "total_pages": posts_paginated.pages or 1,
+            "total_pages": total_pages(posts_paginated.total, posts_paginated.per_page),
             "total_posts": posts_paginated.total,
+            **(search_totals(posts_paginated) if search_query else {}),
             "posts": posts_data
         }), 200
 
+    except (InvalidCursor, InvalidFilter) as e:
+        return jsonify({"error": str(e), "status": False}), 400
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}", "status": False}), 500
 
-@app.route('/profile', methods=['GET'])
+@bp.route("/posts/export", methods=['GET'])
+@jwt_required()
+def export_user_posts():
+    user_id = int(get_jwt_identity())
+    return Response(
+        stream_with_context(export_posts(user_id=user_id)),
+        mimetype="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=posts.ndjson"}
+    )
+
+@bp.route("/posts/import", methods=['POST'])
+@jwt_required()
+def import_user_posts():
+    try:
+        user_id = int(get_jwt_identity())
+        report = import_posts(request.stream, user_id=user_id)
+        return jsonify({
+            "status": True,
+            "message": f"{report['imported']} posts imported, {report['failed']} lines failed",
+            **report
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": "Something went wrong!", "details": str(e), "status": False}), 500
+
+@bp.route('/profile', methods=['GET'])
 @jwt_required()
 def profile():
     try:
         # Get the user ID from JWT token
         user_id = int(get_jwt_identity())
 
-        user = User.query.get(user_id)
+        user = db.session.get(User, user_id)
         if not user:
             return jsonify({"status": False, "error": "User not found"}), 404
 
         return jsonify({
             "status": True,
             "message": "User profile fetched successfully!",
-            "user": {
-                "id": user.id,
-                "name": user.name,
-                "dob": user.dob,
-                "place": user.place,
-                "address": user.address,
-                "email": user.email,
-                "image_url": user.image
-            }
+            "user": user_schema.dump(user, USER_PROFILE_FIELDS)
         }), 200
 
     except Exception as e:
         return jsonify({"status": False, "error": f"Error fetching profile: {str(e)}"}), 500
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,255 @@
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from hashing import password_hashed
+from outbox import mail_sent
+
+REQUEST_LABELS = ('method', 'route', 'status')
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}' if pairs else ''
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{self._labels(key)} {_format(value)}"
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (the last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, [list(state[0]), state[1], state[2]]) for key, state in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else _format(bound)
+                yield f"{self.name}_bucket{self._labels(key, [('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{self._labels(key)} {_format(total)}"
+            yield f"{self.name}_count{self._labels(key)} {count}"
+
+
+class Gauge(_Metric):
+    '''Read from `callback` at scrape time'''
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, callback):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def _samples(self):
+        yield f"{self.name} {_format(self.callback())}"
+
+
+def _rule():
+    # The rule, not the path, so /post/<slug> is one series rather than one per post
+    return request.url_rule.rule if request.url_rule else '<unmatched>'
+
+
+def current_route():
+    return f"{request.method} {_rule()}" if has_request_context() else 'background'
+
+
+class Metrics:
+    '''Per-request instrumentation exported in the Prometheus text format on METRICS_PATH.
+
+    SQL statements and DB time come from engine events, bcrypt time from the
+    password hasher's signal and SMTP time from the outbox worker's. Values are
+    kept per process; with several worker processes scrape each one.
+    '''
+    def __init__(self, app=None):
+        self.request_duration = Histogram(
+            'http_request_duration_seconds', 'Time spent handling the request.', REQUEST_LABELS)
+        self.request_statements = Histogram(
+            'http_request_db_statements', 'SQL statements executed per request.', REQUEST_LABELS, STATEMENT_BUCKETS)
+        self.request_db_time = Histogram(
+            'http_request_db_seconds', 'Time spent in SQL per request.', REQUEST_LABELS)
+        self.request_bytes = Counter(
+            'http_request_bytes_total', 'Request body bytes received.', REQUEST_LABELS)
+        self.response_bytes = Counter(
+            'http_response_bytes_total', 'Response body bytes sent.', REQUEST_LABELS)
+        self.bcrypt_time = Counter(
+            'http_request_bcrypt_seconds_total', 'Time requests spent waiting for bcrypt.', REQUEST_LABELS)
+        self.slow_queries = Counter(
+            'db_slow_queries_total', 'SQL statements slower than SLOW_QUERY_THRESHOLD.', ('route',))
+        self.smtp_time = Histogram(
+            'smtp_send_seconds', 'Time spent sending one message over SMTP.', ('result',))
+        self.hasher_queue = Gauge(
+            'password_hasher_queue_depth', 'Hashes waiting for a bcrypt worker.', lambda: self._hasher_stat('queue_depth'))
+        self.hasher_in_flight = Gauge(
+            'password_hasher_in_flight', 'Hashes currently running.', lambda: self._hasher_stat('in_flight'))
+        self.requests_in_flight = Gauge(
+            'http_requests_in_flight', 'Requests being handled.', lambda: self._throttle_stat('in_flight'))
+        self.expensive_in_flight = Gauge(
+            'http_expensive_requests_in_flight', 'Rate limited (expensive) requests being handled.',
+            lambda: self._throttle_stat('expensive_in_flight'))
+        self.registry = [
+            self.request_duration, self.request_statements, self.request_db_time, self.request_bytes,
+            self.response_bytes, self.bcrypt_time, self.slow_queries, self.smtp_time,
+            self.hasher_queue, self.hasher_in_flight, self.requests_in_flight, self.expensive_in_flight,
+        ]
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_PATH', '/metrics')
+        # Seconds; statements at or above this are logged with the route that ran them
+        app.config.setdefault('SLOW_QUERY_THRESHOLD', 0.5)
+        app.extensions['metrics'] = self
+        self.app = app
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule(app.config['METRICS_PATH'], 'metrics', self.render)
+        # On the Engine class so replicas and other binds are covered too
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        password_hashed.connect(self._password_hashed)
+        mail_sent.connect(self._mail_sent)
+
+    def _hasher_stat(self, name):
+        hasher = self.app.extensions.get('password_hasher')
+        return hasher.stats()[name] if hasher else 0
+
+    def _throttle_stat(self, name):
+        throttle = self.app.extensions.get('throttle')
+        return throttle.stats()[name] if throttle else 0
+
+    def _before_request(self):
+        g.request_metrics = {'started': time.perf_counter(), 'statements': 0, 'db_seconds': 0.0, 'bcrypt_seconds': 0.0}
+
+    def _after_request(self, response):
+        stats = g.pop('request_metrics', None)
+        if stats is None:
+            return response
+        labels = {'method': request.method, 'route': _rule(), 'status': response.status_code}
+        self.request_duration.observe(time.perf_counter() - stats['started'], **labels)
+        self.request_statements.observe(stats['statements'], **labels)
+        self.request_db_time.observe(stats['db_seconds'], **labels)
+        self.request_bytes.inc(request.content_length or 0, **labels)
+        if stats['bcrypt_seconds']:
+            self.bcrypt_time.inc(stats['bcrypt_seconds'], **labels)
+
+        if response.content_length is not None or not response.is_streamed:
+            self.response_bytes.inc(response.content_length or 0, **labels)
+        else:
+            self._count_stream(response, labels)
+        return response
+
+    def _count_stream(self, response, labels):
+        # Streamed bodies (e.g. the NDJSON export) are only counted as they go out
+        chunks = response.response
+
+        def counting():
+            sent = 0
+            try:
+                for chunk in chunks:
+                    sent += len(chunk)
+                    yield chunk
+            finally:
+                self.response_bytes.inc(sent, **labels)
+                if hasattr(chunks, 'close'):
+                    chunks.close()
+
+        response.response = counting()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # On the execution context, not the pooled connection: a statement that raises never
+        # reaches after_cursor_execute and must not leave a start time behind
+        if context is not None:
+            context.metrics_query_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'metrics_query_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        if has_request_context() and 'request_metrics' in g:
+            g.request_metrics['statements'] += 1
+            g.request_metrics['db_seconds'] += elapsed
+        if elapsed >= self.app.config['SLOW_QUERY_THRESHOLD']:
+            route = current_route()
+            self.slow_queries.inc(route=route)
+            self.app.logger.warning(f"Slow query ({elapsed * 1000:.1f} ms) from {route}: {' '.join(statement.split())[:1000]}")
+
+    def _password_hashed(self, sender, seconds):
+        if has_request_context() and 'request_metrics' in g:
+            g.request_metrics['bcrypt_seconds'] += seconds
+
+    def _mail_sent(self, sender, seconds, error):
+        self.smtp_time.observe(seconds, result='error' if error else 'sent')
+
+    def render(self):
+        lines = []
+        for metric in self.registry:
+            lines.extend(metric.render())
+        return Response("\n".join(lines) + "\n", content_type=CONTENT_TYPE)
+
+
+metrics = Metrics()
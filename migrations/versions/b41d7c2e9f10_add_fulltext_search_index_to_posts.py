@@ -0,0 +1,33 @@
+"""Add full-text search index to Posts
+
+Revision ID: b41d7c2e9f10
+Revises: e932b7e8ab16
+Create Date: 2026-10-18 10:02:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b41d7c2e9f10'
+down_revision = 'e932b7e8ab16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name in ('mysql', 'mariadb'):
+        op.create_index('ix_posts_fulltext', 'posts', ['title', 'content'], unique=False, mysql_prefix='FULLTEXT')
+    elif bind.dialect.name == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(title, content, tokenize = 'unicode61')")
+        op.execute("INSERT INTO posts_fts (rowid, title, content) SELECT sno, title, content FROM posts")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name in ('mysql', 'mariadb'):
+        op.drop_index('ix_posts_fulltext', table_name='posts')
+    elif bind.dialect.name == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS posts_fts")
@@ -1,28 +1,64 @@
+from datetime import datetime, timezone
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import validates
+
+from replicas import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+EXCERPT_LENGTH = 200
+
+
+def utcnow():
+    # Naive UTC, the way every DateTime column is stored
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def make_excerpt(content, length=EXCERPT_LENGTH):
+    '''First `length` characters of content on one line, cut at a word boundary'''
+    text = " ".join((content or "").split())
+    if len(text) <= length:
+        return text
+    cut = text[:length - 1]
+    if " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut.rstrip(".,;:!?-") + "…"
 
-db = SQLAlchemy()
 
 class Contacts(db.Model):
-    '''sno name email ph_no msg date'''
+    '''sno name email ph_no msg date created_at'''
     sno = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), nullable = False)
     email = db.Column(db.String(100), nullable=False)
     ph_no = db.Column(db.String(15), nullable = False)
     msg = db.Column(db.Text, nullable=False)
     date = db.Column(db.String(50), nullable = True)
+    created_at = db.Column(db.DateTime, nullable=True, index=True, default=utcnow)
 
 class Posts(db.Model):
-    '''sno title slug content date'''
+    '''sno title slug content excerpt date img_file created_at'''
     sno = db.Column(db.Integer,primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     title = db.Column(db.String(100), nullable=False)
     slug = db.Column(db.String(50), unique=True, nullable=False)
     content = db.Column(db.Text, nullable=False)
+    # Listings show this instead of reading content; kept in sync by _update_excerpt
+    excerpt = db.Column(db.String(EXCERPT_LENGTH), nullable=True)
     date = db.Column(db.String(50), nullable=False)
     img_file = db.Column(db.String(255), nullable=True)
+    # `date` stays the display string; created_at is what listings sort and filter on
+    created_at = db.Column(db.DateTime, nullable=True, index=True, default=utcnow)
 
     author = db.relationship('User', backref='posts', lazy=True)  # Define backref only once
 
+    __table_args__ = (db.Index('ix_posts_user_id_created_at', 'user_id', 'created_at'),)
+
+    @validates('content')
+    def _update_excerpt(self, key, content):
+        self.excerpt = make_excerpt(content)
+        return content
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), nullable=False)
@@ -34,3 +70,36 @@ class User(db.Model):
     password = db.Column(db.String(255), nullable=False)
     reset_token = db.Column(db.String(64), nullable=True)  # Token for password reset
     token_expiry = db.Column(db.DateTime, nullable=True)   # Expiry time of the token
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Bumped to revoke access tokens
+
+class Outbox(db.Model):
+    '''id subject sender recipients bcc body status attempts next_attempt_at claim_token claimed_at last_error created_at sent_at'''
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(100), nullable=True)
+    recipients = db.Column(db.Text, nullable=False)  # JSON list of addresses
+    bcc = db.Column(db.Text, nullable=True)          # JSON list of addresses
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False)
+    claim_token = db.Column(db.String(32), nullable=True, index=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (db.Index('ix_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),)
+
+class Upload(db.Model):
+    '''key size ref_count created_at released_at'''
+    key = db.Column(db.String(80), primary_key=True)  # <sha256>.<ext>, also the file name on disk
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False)
+    released_at = db.Column(db.DateTime, nullable=True)  # when ref_count last dropped to 0
+
+class Counter(db.Model):
+    '''name value - running totals maintained by counters.post_counters instead of COUNT(*)'''
+    name = db.Column(db.String(64), primary_key=True)  # posts, posts:user:<id>
+    value = db.Column(db.Integer, nullable=False, default=0)
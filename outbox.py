@@ -0,0 +1,186 @@
+import json
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from blinker import Namespace
+from sqlalchemy import and_, event, or_
+
+from models import Outbox, db
+
+_signals = Namespace()
+# Sent by the delivery worker for every message with the seconds spent talking SMTP and the error, if any
+mail_sent = _signals.signal('mail-sent')
+
+
+def utcnow():
+    # Naive UTC, matching how the other DateTime columns are stored
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class MailOutbox:
+    '''Mail is written to the outbox table inside the caller's transaction and
+    delivered by a background worker over one pooled SMTP connection per batch.
+    Flask-Mail is only imported (and `mail` created) once the worker first sends.'''
+    def __init__(self, app=None, mail=None):
+        self.app = None
+        self.mail = None
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, mail)
+
+    def init_app(self, app, mail=None):
+        app.config.setdefault('OUTBOX_AUTOSTART', True)
+        app.config.setdefault('OUTBOX_BATCH_SIZE', 50)
+        app.config.setdefault('OUTBOX_POLL_INTERVAL', 5)
+        app.config.setdefault('OUTBOX_MAX_ATTEMPTS', 6)
+        app.config.setdefault('OUTBOX_BACKOFF_BASE', 30)
+        app.config.setdefault('OUTBOX_BACKOFF_MAX', 3600)
+        app.config.setdefault('OUTBOX_LEASE', 300)
+        app.extensions['outbox'] = self
+        self.app = app
+        self.mail = mail
+        event.listen(db.session, 'after_commit', self._after_commit)
+
+    def queue(self, subject, recipients, body, sender=None, bcc=None):
+        '''Stage a message on the current session; it is only sent once the session commits'''
+        now = utcnow()
+        message = Outbox(
+            subject=subject, sender=sender, body=body,
+            recipients=json.dumps(list(recipients)),
+            bcc=json.dumps(list(bcc)) if bcc else None,
+            status='pending', attempts=0, next_attempt_at=now, created_at=now
+        )
+        db.session.add(message)
+        db.session.info['outbox_queued'] = True
+        return message
+
+    def _after_commit(self, session):
+        # Not on a savepoint release: the worker would look before the rows are committed
+        if not session.in_nested_transaction() and session.info.pop('outbox_queued', False):
+            self.wake()
+
+    def wake(self):
+        if self.app.config['OUTBOX_AUTOSTART']:
+            self.start()
+        self._wakeup.set()
+
+    def start(self):
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self.run_forever, name='mail-outbox', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run_forever(self):
+        while not self._stopped.is_set():
+            with self.app.app_context():
+                try:
+                    while self.drain() and not self._stopped.is_set():
+                        pass
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.error(f"Mail outbox worker error: {str(e)}")
+                finally:
+                    db.session.remove()
+            self._wakeup.wait(self.app.config['OUTBOX_POLL_INTERVAL'])
+            self._wakeup.clear()
+
+    def _claimable(self, now):
+        stale = now - timedelta(seconds=self.app.config['OUTBOX_LEASE'])
+        return or_(
+            and_(Outbox.status == 'pending', Outbox.next_attempt_at <= now),
+            # A worker that died mid-batch leaves rows in 'sending'; reclaim them after the lease
+            and_(Outbox.status == 'sending', Outbox.claimed_at < stale)
+        )
+
+    def _claim(self):
+        now = utcnow()
+        ids = [row_id for (row_id,) in db.session.query(Outbox.id)
+               .filter(self._claimable(now))
+               .order_by(Outbox.id)
+               .limit(self.app.config['OUTBOX_BATCH_SIZE'])]
+        if not ids:
+            db.session.rollback()
+            return []
+
+        # The conditional UPDATE is the lock: concurrent workers only get rows still claimable
+        token = secrets.token_hex(16)
+        db.session.query(Outbox).filter(Outbox.id.in_(ids), self._claimable(now)).update(
+            {Outbox.status: 'sending', Outbox.claim_token: token, Outbox.claimed_at: now},
+            synchronize_session=False
+        )
+        db.session.commit()
+        return Outbox.query.filter_by(claim_token=token).order_by(Outbox.id).all()
+
+    def _get_mail(self):
+        if self.mail is None:
+            from flask_mail import Mail
+            self.mail = Mail(self.app)
+        return self.mail
+
+    def _to_message(self, row):
+        from flask_mail import Message
+        return Message(
+            row.subject,
+            sender=row.sender or self.app.config.get('MAIL_DEFAULT_SENDER'),
+            recipients=json.loads(row.recipients),
+            bcc=json.loads(row.bcc) if row.bcc else None,
+            body=row.body
+        )
+
+    def _failed(self, row, error):
+        row.attempts += 1
+        row.claim_token = None
+        row.last_error = str(error)
+        if row.attempts >= self.app.config['OUTBOX_MAX_ATTEMPTS']:
+            row.status = 'failed'
+            self.app.logger.error(f"Giving up on outbox message {row.id} after {row.attempts} attempts: {str(error)}")
+            return
+        delay = min(self.app.config['OUTBOX_BACKOFF_BASE'] * 2 ** (row.attempts - 1),
+                    self.app.config['OUTBOX_BACKOFF_MAX'])
+        row.status = 'pending'
+        row.next_attempt_at = utcnow() + timedelta(seconds=delay)
+
+    def drain(self):
+        '''Deliver one batch; returns how many messages were claimed'''
+        rows = self._claim()
+        if not rows:
+            return 0
+
+        try:
+            with self._get_mail().connect() as connection:
+                for row in rows:
+                    started = time.perf_counter()
+                    try:
+                        connection.send(self._to_message(row))
+                    except Exception as e:
+                        mail_sent.send(self, seconds=time.perf_counter() - started, error=e)
+                        self._failed(row, e)
+                    else:
+                        mail_sent.send(self, seconds=time.perf_counter() - started, error=None)
+                        row.status = 'sent'
+                        row.attempts += 1
+                        row.claim_token = None
+                        row.sent_at = utcnow()
+        except Exception as e:
+            # Could not (re)connect: everything not yet sent goes back with backoff
+            for row in rows:
+                if row.status == 'sending':
+                    self._failed(row, e)
+
+        db.session.commit()
+        return len(rows)
+
+
+outbox = MailOutbox()
@@ -0,0 +1,136 @@
+import base64
+import binascii
+import json
+import math
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, or_
+
+from models import Posts
+
+DEFAULT_LIMIT = 2
+MAX_LIMIT = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+class CursorPage:
+    '''items limit next_cursor - keyset page, no total count'''
+    def __init__(self, items, limit, next_cursor):
+        self.items = items
+        self.limit = limit
+        self.next_cursor = next_cursor
+
+
+def cursor_requested(args):
+    return 'cursor' in args or 'limit' in args
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(values, list) or not values:
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+def parse_timestamp(value, name):
+    '''ISO 8601 date or datetime -> naive UTC, the way created_at is stored'''
+    try:
+        moment = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        raise InvalidFilter(f"'{name}' must be an ISO 8601 date or datetime")
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def listing_options(args):
+    '''Validate ?sort=newest|oldest and ?since=/?until=; returns (sort, since, until)'''
+    sort = args.get('sort', '').strip() or None
+    if sort not in (None, 'newest', 'oldest'):
+        raise InvalidFilter("'sort' must be 'newest' or 'oldest'")
+    since = parse_timestamp(args['since'], 'since') if args.get('since') else None
+    until = parse_timestamp(args['until'], 'until') if args.get('until') else None
+    return sort, since, until
+
+
+def filter_posts(query, sort=None, since=None, until=None):
+    '''Apply the created_at range and order; both are served by the created_at indexes'''
+    if since is not None:
+        query = query.filter(Posts.created_at >= since)
+    if until is not None:
+        query = query.filter(Posts.created_at < until)
+    if sort == 'newest':
+        return query.order_by(Posts.created_at.desc(), Posts.sno.desc())
+    if sort == 'oldest':
+        return query.order_by(Posts.created_at, Posts.sno)
+    return query
+
+
+def paginate(query, page, per_page, total=None):
+    '''query.paginate(), taking a known `total` (e.g. a maintained counter) instead of running COUNT(*)'''
+    if total is None:
+        return query.paginate(page=page, per_page=per_page, error_out=False)
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False, count=False)
+    pagination.total = total
+    return pagination
+
+
+def total_pages(total, per_page):
+    '''The total_pages a listing reports: at least 1 once there are results, or None when the
+    total was not counted (search with SEARCH_COUNT='none')'''
+    if total is None:
+        return None
+    return max(1, math.ceil(total / per_page))
+
+
+def _seek(sort, values):
+    if sort is None:
+        if len(values) != 1 or not isinstance(values[0], int):
+            raise InvalidCursor("Invalid cursor")
+        return Posts.sno > values[0]
+
+    if len(values) != 2 or not isinstance(values[0], str) or not isinstance(values[1], int):
+        raise InvalidCursor("Invalid cursor")
+    try:
+        created_at = datetime.fromisoformat(values[0])
+    except ValueError:
+        raise InvalidCursor("Invalid cursor")
+    sno = values[1]
+    if sort == 'newest':
+        return or_(Posts.created_at < created_at, and_(Posts.created_at == created_at, Posts.sno < sno))
+    return or_(Posts.created_at > created_at, and_(Posts.created_at == created_at, Posts.sno > sno))
+
+
+def keyset_paginate(query, cursor=None, limit=DEFAULT_LIMIT, sort=None):
+    '''Seek past the last seen row instead of OFFSET, so every page costs the same.
+    Without a sort the key is Posts.sno; with one it is (created_at, sno).'''
+    limit = min(max(1, limit or DEFAULT_LIMIT), MAX_LIMIT)
+
+    query = filter_posts(query, sort) if sort else query.order_by(Posts.sno)
+    if cursor:
+        query = query.filter(_seek(sort, decode_cursor(cursor)))
+
+    # One extra row tells us whether there is a next page without a COUNT(*)
+    rows = query.limit(limit + 1).all()
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor([last.created_at.isoformat(), last.sno] if sort else [last.sno])
+    return CursorPage(items, limit, next_cursor)
@@ -0,0 +1,45 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from models import db
+
+
+class QueryCounter:
+    '''Collects every SQL statement sent through an engine while active, except the
+    BEGIN that SQLite engines send themselves (replicas.sqlite_transactions)'''
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if statement != "BEGIN":
+            self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return False
+
+
+@contextmanager
+def assert_max_queries(app, limit):
+    '''Fail if the wrapped block (e.g. one test-client request) runs more than `limit` statements
+
+        with assert_max_queries(app, 3):
+            client.get('/post?per_page=20')
+    '''
+    with app.app_context():
+        engine = db.engine
+    with QueryCounter(engine) as counter:
+        yield counter
+    if counter.count > limit:
+        listing = "\n".join(f"  {i}. {statement}" for i, statement in enumerate(counter.statements, 1))
+        raise AssertionError(f"Expected at most {limit} SQL statements, got {counter.count}:\n{listing}")
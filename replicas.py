@@ -0,0 +1,123 @@
+import random
+import time
+
+import sqlalchemy as sa
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND_PREFIX = 'replica_'
+READ_METHODS = ('GET', 'HEAD')
+# StaticPool (in-memory SQLite) takes none of these
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')
+
+
+def engine_options(url, pool_options):
+    '''create_engine() pool arguments that apply to `url`'''
+    url = sa.engine.make_url(url) if url else None
+    if url is not None and url.drivername.startswith('sqlite') and url.database in (None, '', ':memory:'):
+        return {name: value for name, value in pool_options.items() if name not in QUEUE_POOL_OPTIONS}
+    return dict(pool_options)
+
+
+def _sqlite_savepoint(conn, name):
+    # pysqlite sends BEGIN only before INSERT/UPDATE/DELETE, so a savepoint can open outside any transaction
+    if not conn.connection.dbapi_connection.in_transaction:
+        conn.exec_driver_sql("BEGIN")
+
+
+def sqlite_transactions(engine):
+    '''Make begin_nested() safe on pysqlite. A SAVEPOINT opened before the first write
+    runs outside any transaction, so its RELEASE commits for good and an outer rollback()
+    undoes nothing; BEGIN first. Plain reads still run outside a transaction, as pysqlite
+    runs them, so they hold no lock that would make other connections' writes wait.'''
+    if engine.dialect.driver == 'pysqlite' and not event.contains(engine, 'savepoint', _sqlite_savepoint):
+        event.listen(engine, 'savepoint', _sqlite_savepoint)
+    return engine
+
+
+class RoutingSession(Session):
+    '''db.session class: reads in GET/HEAD requests go to a replica; writes, anything
+    after the first write, and everything outside a request go to the primary'''
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or (clause is not None and getattr(clause, 'is_dml', False)):
+                self._wrote()
+            elif not self.info.get('wrote'):
+                engine = replica_router.read_engine(self._db)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _wrote(self):
+        # A replica would not see our own uncommitted (or just committed) rows
+        self.info['wrote'] = True
+        if has_request_context():
+            g.db_wrote = True
+
+
+class ReplicaRouter:
+    '''Adds SQLALCHEMY_REPLICA_URIS as binds, applies DB_POOL_OPTIONS to every engine and
+    picks the replica a request reads from. A client that just wrote gets a short-lived
+    cookie so its next reads see its own writes on the primary despite replication lag.
+
+    Must be initialised before db.init_app(), which creates the engines, and have
+    configure_engines() called after it.
+    '''
+    def __init__(self, app=None):
+        self.bind_keys = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [])
+        app.config.setdefault('DB_POOL_OPTIONS', {})
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 5)
+        app.config.setdefault('REPLICA_STICKY_COOKIE', 'read_primary')
+        app.extensions['replica_router'] = self
+        self.app = app
+
+        pool_options = app.config['DB_POOL_OPTIONS']
+        primary_options = engine_options(app.config.get('SQLALCHEMY_DATABASE_URI'), pool_options)
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**primary_options, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+        self.bind_keys = []
+        for i, url in enumerate(app.config['SQLALCHEMY_REPLICA_URIS']):
+            key = f"{REPLICA_BIND_PREFIX}{i}"
+            binds[key] = {**engine_options(url, pool_options), 'url': url}
+            self.bind_keys.append(key)
+
+        if self.bind_keys:
+            app.after_request(self._after_request)
+
+    def configure_engines(self, db):
+        '''Per-engine setup for the engines db.init_app() created'''
+        with self.app.app_context():
+            for engine in db.engines.values():
+                sqlite_transactions(engine)
+
+    def _sticky(self):
+        try:
+            return float(request.cookies.get(self.app.config['REPLICA_STICKY_COOKIE'], 0)) > time.time()
+        except ValueError:
+            return False
+
+    def read_engine(self, db):
+        '''The replica engine for this request, or None to use the primary'''
+        if not self.bind_keys or not has_request_context() or request.method not in READ_METHODS:
+            return None
+        if 'db_replica' not in g:
+            # One replica per request so its reads see a single consistent snapshot
+            g.db_replica = None if self._sticky() else random.choice(self.bind_keys)
+        return db.engines[g.db_replica] if g.db_replica else None
+
+    def _after_request(self, response):
+        if g.pop('db_wrote', False):
+            seconds = self.app.config['REPLICA_STICKY_SECONDS']
+            response.set_cookie(self.app.config['REPLICA_STICKY_COOKIE'], str(time.time() + seconds),
+                                max_age=seconds, httponly=True, samesite='Lax')
+        return response
+
+
+replica_router = ReplicaRouter()
@@ -0,0 +1,416 @@
+import math
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, inspect, select, text
+
+from counters import TOTAL_KEY
+from models import Counter, Posts, db
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+TITLE_WEIGHT = 2.0
+CONTENT_WEIGHT = 1.0
+FULLTEXT_INDEX_NAME = 'ix_posts_fulltext'
+COUNT_MODES = ('exact', 'estimate', 'none')
+
+
+def tokenize(value):
+    return TOKEN_RE.findall((value or "").lower())
+
+
+def _count(matches, params, count_limit):
+    '''COUNT(*) of the `matches` subquery: all of it (count_limit None), at most count_limit rows, or none (0)'''
+    if count_limit == 0:
+        return None
+    if count_limit is not None:
+        matches += " LIMIT :count_limit"
+        params = dict(params, count_limit=count_limit)
+    return db.session.execute(text(f"SELECT COUNT(*) FROM ({matches}) AS matches"), params).scalar()
+
+
+class SearchPage:
+    '''items total page per_page pages has_next estimated - same shape as a Flask-SQLAlchemy Pagination.
+    total (and pages) is None when not counted; `estimated` means it stopped at the count limit.'''
+    def __init__(self, items, total, page, per_page, has_next=False, estimated=False):
+        self.items = items
+        self.total = total
+        self.page = page
+        self.per_page = per_page
+        self.has_next = has_next
+        self.estimated = estimated
+        self.pages = None if total is None else math.ceil(total / per_page) if per_page else 0
+
+
+class PythonIndexBackend:
+    '''In-process inverted index, used when the database has no native full-text support.
+
+    Writes are staged in the session and reach the index when it commits, so rolled-back
+    posts never show up. Other processes keep their own copy: a search rebuilds it when
+    the post count or the highest sno moved under it, and at the latest every `max_age`
+    seconds (edits leave both alone). Run a single process to see edits immediately.'''
+    name = 'python'
+
+    def __init__(self, max_age=None):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._built = False
+        self._built_at = 0.0
+        self._watermark = None              # (posts counter, highest sno) the index reflects
+        self._postings = defaultdict(dict)  # term -> {sno: weight}
+        self._terms = []                    # sorted vocabulary for prefix lookups
+        self._docs = {}                     # sno -> (user_id, terms)
+
+    def setup(self, connection):
+        pass
+
+    @staticmethod
+    def _read_watermark():
+        total = select(Counter.value).where(Counter.name == TOTAL_KEY).scalar_subquery()
+        highest = select(func.max(Posts.sno)).scalar_subquery()
+        total, highest = db.session.execute(select(total, highest)).one()
+        return total or 0, highest or 0
+
+    def _build(self):
+        self._postings.clear()
+        self._terms.clear()
+        self._docs.clear()
+        # Read first: a write landing during the build moves it again and triggers another
+        self._watermark = self._read_watermark()
+        rows = db.session.query(Posts.sno, Posts.user_id, Posts.title, Posts.content).yield_per(1000)
+        for sno, user_id, title, content in rows:
+            self._add(sno, user_id, title, content)
+        self._built = True
+        self._built_at = time.monotonic()
+
+    def _stale(self):
+        if not self._built:
+            return True
+        if self.max_age and time.monotonic() - self._built_at > self.max_age:
+            return True
+        return self._read_watermark() != self._watermark
+
+    def _add(self, sno, user_id, title, content):
+        weights = defaultdict(float)
+        for term in tokenize(title):
+            weights[term] += TITLE_WEIGHT
+        for term in tokenize(content):
+            weights[term] += CONTENT_WEIGHT
+
+        for term, weight in weights.items():
+            postings = self._postings[term]
+            if not postings:
+                self._terms.insert(bisect_left(self._terms, term), term)
+            postings[sno] = weight
+        self._docs[sno] = (int(user_id), set(weights))
+
+    def _remove(self, sno):
+        doc = self._docs.pop(sno, None)
+        if not doc:
+            return
+        for term in doc[1]:
+            postings = self._postings[term]
+            postings.pop(sno, None)
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect_left(self._terms, term)]
+
+    def index(self, post):
+        db.session.info.setdefault('search_index', {})[post.sno] = (post.user_id, post.title, post.content)
+
+    def index_many(self, posts, new=False):
+        for post in posts:
+            self.index(post)
+
+    def remove(self, sno):
+        db.session.info.setdefault('search_index', {})[sno] = None
+
+    def remove_many(self, snos):
+        for sno in snos:
+            self.remove(sno)
+
+    def apply(self, changes):
+        '''Called once the session that staged `changes` ({sno: (user_id, title, content) or None}) committed'''
+        with self._lock:
+            # Until the first search the index is built lazily from the table
+            if not self._built:
+                return
+            total, highest = self._watermark
+            for sno, post in changes.items():
+                existed = sno in self._docs
+                self._remove(sno)
+                if post is not None:
+                    self._add(sno, *post)
+                    if not existed:
+                        total += 1
+                        highest = max(highest, sno)
+                elif existed:
+                    total -= 1
+                    if sno == highest:
+                        highest = max(self._docs, default=0)
+            # Our own writes move the database the same way, so they do not force a rebuild
+            self._watermark = total, highest
+
+    def rebuild(self):
+        with self._lock:
+            self._build()
+
+    def search(self, terms, user_id, offset, limit, count_limit=None):
+        # The ranking visits every match anyway, so the exact total is free here
+        with self._lock:
+            if self._stale():
+                self._build()
+
+            n_docs = len(self._docs) or 1
+            scores = defaultdict(float)
+            candidates = None
+            for term in terms:
+                matched = set()
+                i = bisect_left(self._terms, term)
+                while i < len(self._terms) and self._terms[i].startswith(term):
+                    postings = self._postings[self._terms[i]]
+                    idf = math.log(1 + n_docs / len(postings))
+                    for sno, weight in postings.items():
+                        scores[sno] += weight * idf
+                        matched.add(sno)
+                    i += 1
+                candidates = matched if candidates is None else candidates & matched
+                if not candidates:
+                    return [], 0
+
+            if user_id is not None:
+                candidates = [sno for sno in candidates if self._docs[sno][0] == int(user_id)]
+
+            ranked = sorted(candidates, key=lambda sno: (-scores[sno], -sno))
+            return ranked[offset:offset + limit], len(ranked)
+
+
+class SQLiteFTS5Backend:
+    '''Shadow FTS5 table keyed by posts.sno, written in the same transaction as the post'''
+    name = 'sqlite-fts5'
+
+    def setup(self, connection):
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'posts_fts'"
+        )).first()
+        if exists:
+            return
+        connection.execute(text("CREATE VIRTUAL TABLE posts_fts USING fts5(title, content, tokenize = 'unicode61')"))
+        connection.execute(text("INSERT INTO posts_fts (rowid, title, content) SELECT sno, title, content FROM posts"))
+
+    def index(self, post):
+        self.remove(post.sno)
+        db.session.execute(
+            text("INSERT INTO posts_fts (rowid, title, content) VALUES (:sno, :title, :content)"),
+            {"sno": post.sno, "title": post.title, "content": post.content}
+        )
+
+    def index_many(self, posts, new=False):
+        if not posts:
+            return
+        if not new:
+            db.session.execute(text("DELETE FROM posts_fts WHERE rowid = :sno"), [{"sno": post.sno} for post in posts])
+        db.session.execute(
+            text("INSERT INTO posts_fts (rowid, title, content) VALUES (:sno, :title, :content)"),
+            [{"sno": post.sno, "title": post.title, "content": post.content} for post in posts]
+        )
+
+    def remove(self, sno):
+        db.session.execute(text("DELETE FROM posts_fts WHERE rowid = :sno"), {"sno": sno})
+
+    def remove_many(self, snos):
+        if snos:
+            db.session.execute(text("DELETE FROM posts_fts WHERE rowid = :sno"), [{"sno": sno} for sno in snos])
+
+    def rebuild(self):
+        db.session.execute(text("DELETE FROM posts_fts"))
+        db.session.execute(text("INSERT INTO posts_fts (rowid, title, content) SELECT sno, title, content FROM posts"))
+
+    def search(self, terms, user_id, offset, limit, count_limit=None):
+        # Terms are \w+ tokens, so quoting them is enough to neutralise FTS5 syntax
+        params = {"match": " ".join(f'"{term}"*' for term in terms)}
+        where = "posts_fts MATCH :match"
+        if user_id is not None:
+            where += " AND posts.user_id = :user_id"
+            params["user_id"] = int(user_id)
+        source = f"FROM posts_fts JOIN posts ON posts.sno = posts_fts.rowid WHERE {where}"
+
+        total = _count(f"SELECT 1 {source}", params, count_limit)
+        ids = db.session.execute(
+            text(f"SELECT posts.sno {source} ORDER BY bm25(posts_fts, {TITLE_WEIGHT}, {CONTENT_WEIGHT}), posts.sno DESC "
+                 "LIMIT :limit OFFSET :offset"),
+            dict(params, limit=limit, offset=offset)
+        ).scalars().all()
+        return ids, total
+
+
+class MySQLFullTextBackend:
+    '''InnoDB FULLTEXT index on posts(title, content); MySQL maintains it on every write'''
+    name = 'mysql-fulltext'
+
+    def setup(self, connection):
+        pass
+
+    def index(self, post):
+        pass
+
+    def index_many(self, posts, new=False):
+        pass
+
+    def remove(self, sno):
+        pass
+
+    def remove_many(self, snos):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, terms, user_id, offset, limit, count_limit=None):
+        params = {"match": " ".join(f"+{term}*" for term in terms)}
+        match = "MATCH (title, content) AGAINST (:match IN BOOLEAN MODE)"
+        where = match
+        if user_id is not None:
+            where += " AND user_id = :user_id"
+            params["user_id"] = int(user_id)
+
+        total = _count(f"SELECT 1 FROM posts WHERE {where}", params, count_limit)
+        ids = db.session.execute(
+            text(f"SELECT sno FROM posts WHERE {where} ORDER BY {match} DESC, sno DESC LIMIT :limit OFFSET :offset"),
+            dict(params, limit=limit, offset=offset)
+        ).scalars().all()
+        return ids, total
+
+
+class SearchState:
+    '''What the search engine knows about one app, kept in app.extensions['search']'''
+    def __init__(self, app):
+        self.app = app
+        self.preference = app.config['SEARCH_BACKEND'].lower()
+        self.backend = None
+
+
+class SearchEngine:
+    '''Picks the best available backend (SEARCH_BACKEND = auto | mysql | sqlite | python).
+
+    SEARCH_COUNT decides what a results page says about the total: 'exact' counts every
+    match, 'estimate' counts up to SEARCH_COUNT_LIMIT matches and reports more than that
+    as the limit, 'none' only tells whether there is a next page.
+
+    The engine itself is shared; each app's backend lives in its SearchState, so the
+    methods below work on the current app's index.
+    '''
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SEARCH_BACKEND', 'auto')
+        app.config.setdefault('SEARCH_COUNT', 'estimate')
+        app.config.setdefault('SEARCH_COUNT_LIMIT', 1000)
+        # Python backend only: rebuild at least this often to pick up other processes' edits
+        app.config.setdefault('SEARCH_INDEX_MAX_AGE', 300)
+        if app.config['SEARCH_COUNT'] not in COUNT_MODES:
+            raise ValueError(f"SEARCH_COUNT must be one of {', '.join(COUNT_MODES)}")
+        app.extensions['search'] = SearchState(app)
+        # db.session is shared by every app: one pair of listeners serves them all
+        if not event.contains(db.session, 'after_commit', self._after_commit):
+            event.listen(db.session, 'after_commit', self._after_commit)
+            event.listen(db.session, 'after_rollback', self._after_rollback)
+
+    @property
+    def backend(self):
+        return current_app.extensions['search'].backend
+
+    @backend.setter
+    def backend(self, backend):
+        current_app.extensions['search'].backend = backend
+
+    def setup(self):
+        '''Choose a backend and create its index structures; needs an app context'''
+        self.backend = self._select_backend(current_app.extensions['search'])
+        with db.engine.begin() as connection:
+            self.backend.setup(connection)
+        return self.backend
+
+    def _select_backend(self, state):
+        dialect = db.engine.dialect.name
+
+        if state.preference in ('auto', 'mysql') and dialect in ('mysql', 'mariadb'):
+            indexes = inspect(db.engine).get_indexes(Posts.__tablename__)
+            if any(index['name'] == FULLTEXT_INDEX_NAME for index in indexes):
+                return MySQLFullTextBackend()
+
+        if state.preference in ('auto', 'sqlite') and dialect == 'sqlite':
+            with db.engine.connect() as connection:
+                options = connection.execute(text("PRAGMA compile_options")).scalars().all()
+            if 'ENABLE_FTS5' in options:
+                return SQLiteFTS5Backend()
+
+        return PythonIndexBackend(state.app.config['SEARCH_INDEX_MAX_AGE'])
+
+    def _after_commit(self, session):
+        # Savepoint releases fire this too; the posts are only committed with the outermost transaction
+        if session.in_nested_transaction():
+            return
+        changes = session.info.pop('search_index', None)
+        state = current_app.extensions.get('search') if has_app_context() else None
+        if changes and state is not None and state.backend is not None:
+            state.backend.apply(changes)
+
+    def _after_rollback(self, session):
+        if not session.in_nested_transaction():
+            session.info.pop('search_index', None)
+
+    def _get_backend(self):
+        if self.backend is None:
+            self.setup()
+        return self.backend
+
+    def index_post(self, post):
+        self._get_backend().index(post)
+
+    def index_posts(self, posts, new=False):
+        '''Bulk form of index_post; posts only need sno, user_id, title and content.
+        new=True promises they were just inserted, so there is no old entry to replace.'''
+        self._get_backend().index_many(posts, new)
+
+    def remove_post(self, sno):
+        self._get_backend().remove(sno)
+
+    def remove_posts(self, snos):
+        self._get_backend().remove_many(snos)
+
+    def rebuild(self):
+        self._get_backend().rebuild()
+
+    def paginate(self, query_text, page=1, per_page=20, user_id=None, query=None):
+        '''`query` loads the matching posts (default Posts.query), e.g. restricted to some columns'''
+        page = max(1, page)
+        terms = tokenize(query_text)
+        if not terms:
+            return SearchPage([], 0, page, per_page)
+
+        config = current_app.config
+        mode = config['SEARCH_COUNT']
+        count_limit = {'exact': None, 'estimate': config['SEARCH_COUNT_LIMIT'], 'none': 0}[mode]
+        # One extra id tells whether there is a next page, counted or not
+        ids, total = self._get_backend().search(terms, user_id, (page - 1) * per_page, per_page + 1, count_limit)
+        has_next = len(ids) > per_page
+        ids = ids[:per_page]
+        estimated = False
+        if mode == 'none':
+            total = None
+        elif count_limit is not None and total >= count_limit:
+            total, estimated = count_limit, True
+        if not ids:
+            return SearchPage([], total, page, per_page, has_next, estimated)
+
+        posts = {post.sno: post for post in (query or Posts.query).filter(Posts.sno.in_(ids))}
+        return SearchPage([posts[sno] for sno in ids if sno in posts], total, page, per_page, has_next, estimated)
+
+
+search_engine = SearchEngine()
@@ -0,0 +1,188 @@
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from faker import Faker
+from sqlalchemy import func, insert
+
+from models import Posts, User, db, make_excerpt
+from search import search_engine
+from cache import response_cache
+from counters import post_counters
+from slugs import SlugAllocator, base_slug
+
+MIN_CONTENT, MAX_CONTENT = 10, 5000  # same bounds as add_post
+ZIPF_EXPONENT = 1.1
+# Post dates are spread over the year before this, so runs do not depend on the clock
+REFERENCE_DATE = datetime(2026, 1, 1)
+
+_words = None
+
+
+def _word_list():
+    global _words
+    if _words is None:
+        _words = Faker().get_words_list()
+    return _words
+
+
+class Distribution:
+    '''fixed:N | uniform:LOW:HIGH | lognormal:MU:SIGMA, sampled in characters'''
+    def __init__(self, spec):
+        kind, _, params = spec.partition(':')
+        try:
+            values = [float(value) for value in params.split(':')] if params else []
+        except ValueError:
+            raise ValueError(f"Invalid distribution '{spec}'")
+        expected = {'fixed': 1, 'uniform': 2, 'lognormal': 2}
+        if kind not in expected or len(values) != expected[kind]:
+            raise ValueError(f"Invalid distribution '{spec}', use fixed:N, uniform:LOW:HIGH or lognormal:MU:SIGMA")
+        self.spec = spec
+        self.kind = kind
+        self.values = values
+
+    def sample(self, rng):
+        if self.kind == 'fixed':
+            value = self.values[0]
+        elif self.kind == 'uniform':
+            value = rng.uniform(*self.values)
+        else:
+            value = rng.lognormvariate(*self.values)
+        return min(MAX_CONTENT, max(MIN_CONTENT, int(value)))
+
+
+def _sentence(rng, words, low, high):
+    return " ".join(rng.choices(words, k=rng.randint(low, high))).capitalize() + "."
+
+
+def _text(rng, words, length):
+    parts, size = [], 0
+    while size < length:
+        sentence = _sentence(rng, words, 6, 16)
+        parts.append(sentence)
+        size += len(sentence) + 1
+    return " ".join(parts)[:length].rstrip() or "Lorem ipsum."
+
+
+def generate_users(task):
+    '''Pool worker: one chunk of user rows, deterministic for (seed, chunk)'''
+    seed, chunk, first_id, count, password_hash = task
+    fake = Faker()
+    fake.seed_instance(f"users:{seed}:{chunk}")
+    rows = []
+    for user_id in range(first_id, first_id + count):
+        rows.append({
+            "id": user_id,
+            "name": fake.first_name() + " " + fake.last_name(),
+            "dob": fake.date_of_birth(minimum_age=16, maximum_age=80).isoformat(),
+            "place": fake.city(),
+            "address": fake.address().replace("\n", ", "),
+            "image": None,
+            # The id keeps generated addresses unique
+            "email": f"{fake.user_name()}.{user_id}@example.test",
+            "password": password_hash,
+        })
+    return rows
+
+
+def generate_posts(task):
+    '''Pool worker: one chunk of post rows, deterministic for (seed, chunk)'''
+    seed, chunk, first_sno, count, options = task
+    rng = random.Random(f"posts:{seed}:{chunk}")
+    words = _word_list()
+    content_length = Distribution(options["content_length"])
+    title_pool = options["title_pool"]
+    now = options["now"]
+    rows = []
+    for sno in range(first_sno, first_sno + count):
+        if title_pool and rng.random() < options["collision_rate"]:
+            title = rng.choices(title_pool, cum_weights=options["pool_weights"])[0]
+        else:
+            title = _sentence(rng, words, 3, 9)[:100]
+        created_at = now - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        content = _text(rng, words, content_length.sample(rng))
+        rows.append({
+            "sno": sno,
+            "user_id": options["user_ids"][rng.randrange(len(options["user_ids"]))]
+            if options["user_ids"] else options["first_user_id"] + rng.randrange(options["user_count"]),
+            "title": title,
+            "base": base_slug(title),
+            "content": content,
+            "excerpt": make_excerpt(content),
+            "date": created_at.strftime("%d-%m-%Y %I:%M %p"),
+            "created_at": created_at,
+            "img_file": f"https://picsum.photos/200/300?random={rng.randint(1, 100)}",
+        })
+    return rows
+
+
+def seed(users=100, posts=1000, seed_value=0, content_length='lognormal:6.3:0.7', collision_rate=0.05,
+         title_pool_size=50, batch_size=10000, workers=None, password_hash='', log=print):
+    '''Generate `users` users and `posts` posts; the same seed produces the same rows.
+    Every seeded user shares `password_hash` so seeding never runs bcrypt per user.'''
+    Distribution(content_length)  # fail fast on a bad spec
+    started = time.perf_counter()
+    context = multiprocessing.get_context('spawn')
+    workers = workers or multiprocessing.cpu_count()
+
+    first_user_id = (db.session.query(func.max(User.id)).scalar() or 0) + 1
+    first_sno = (db.session.query(func.max(Posts.sno)).scalar() or 0) + 1
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        user_tasks = [
+            (seed_value, chunk, first_user_id + start, min(batch_size, users - start), password_hash)
+            for chunk, start in enumerate(range(0, users, batch_size))
+        ]
+        for rows in pool.map(generate_users, user_tasks):
+            db.session.execute(insert(User), rows)
+            db.session.commit()
+        if users:
+            log(f"{users} users in {time.perf_counter() - started:.1f}s")
+
+        if not posts:
+            return
+        user_ids = None
+        if not users:
+            user_ids = [user_id for (user_id,) in db.session.query(User.id)]
+            if not user_ids:
+                raise ValueError("No users to own the posts; seed some users too")
+
+        rng = random.Random(f"titles:{seed_value}")
+        title_pool = [_sentence(rng, _word_list(), 2, 4) for _ in range(title_pool_size)]
+        weights, total = [], 0.0
+        for rank in range(1, title_pool_size + 1):
+            total += 1 / rank ** ZIPF_EXPONENT
+            weights.append(total)
+
+        options = {
+            "content_length": content_length,
+            "collision_rate": collision_rate,
+            "title_pool": title_pool,
+            "pool_weights": weights,
+            "user_ids": user_ids,
+            "first_user_id": first_user_id,
+            "user_count": users,
+            "now": REFERENCE_DATE,
+        }
+        post_tasks = [
+            (seed_value, chunk, first_sno + start, min(batch_size, posts - start), options)
+            for chunk, start in enumerate(range(0, posts, batch_size))
+        ]
+        # Pool titles turn busy in the first batch and are counted on from memory after that
+        slug_allocator = SlugAllocator()
+        done = 0
+        for rows in pool.map(generate_posts, post_tasks):
+            for row, slug in zip(rows, slug_allocator.allocate([row.pop("base") for row in rows])):
+                row["slug"] = slug
+            db.session.execute(insert(Posts), rows)
+            search_engine.index_posts([SimpleNamespace(**row) for row in rows], new=True)
+            post_counters.count_rows(rows)
+            db.session.commit()
+            done += len(rows)
+            log(f"{done}/{posts} posts in {time.perf_counter() - started:.1f}s")
+
+    response_cache.invalidate("listing")
+    db.session.commit()
@@ -0,0 +1,109 @@
+from operator import attrgetter
+
+from images import image_pipeline
+from models import Posts, User
+from pagination import InvalidFilter
+
+
+class Field:
+    '''One output key: the columns it reads and how to get its value from a row or a model.
+    `attribute` is set when the value is just one column's, unchanged.'''
+    __slots__ = ('columns', 'get', 'attribute')
+
+    def __init__(self, columns, get, attribute=None):
+        self.columns = columns
+        self.get = get
+        self.attribute = attribute
+
+
+def column_field(column):
+    get = attrgetter(column.key)
+    return Field((column,), lambda obj, context: get(obj), column.key)
+
+
+class Schema:
+    '''Serializer for one model. Listings select just the columns of the requested fields
+    (select() returns plain rows, so nothing goes through the ORM identity map); single
+    objects are dumped from model instances with the same fields.'''
+    def __init__(self, key, fields):
+        self.key = key
+        self.fields = fields
+
+    def requested(self, args, default):
+        '''?fields=a,b,... in the order given, or `default` without the parameter'''
+        if not args.get("fields", "").strip():
+            return default
+        fields = []
+        for name in args["fields"].split(","):
+            name = name.strip()
+            if name not in self.fields:
+                raise InvalidFilter(f"Unknown field '{name}', choose from: {', '.join(self.fields)}")
+            if name not in fields:
+                fields.append(name)
+        return tuple(fields)
+
+    def columns(self, fields, extra=()):
+        # The key is always selected: cache tags and cursors need it
+        columns = [self.key]
+        for column in [column for name in fields for column in self.fields[name].columns] + list(extra):
+            if not any(column is seen for seen in columns):
+                columns.append(column)
+        return columns
+
+    def select(self, query, fields, extra=()):
+        '''Restrict `query` to the columns `fields` read, plus `extra` (e.g. a cursor's sort key)'''
+        return query.with_entities(*self.columns(fields, extra))
+
+    def dump(self, obj, fields, context=None):
+        return {name: self.fields[name].get(obj, context) for name in fields}
+
+    def dump_many(self, rows, fields, context=None):
+        if not rows or not hasattr(rows[0], '_fields'):
+            return [self.dump(obj, fields, context) for obj in rows]
+        # Looking a Row attribute up by name costs several times indexing it, so plain
+        # column fields are read by position
+        positions = {key: i for i, key in enumerate(rows[0]._fields)}
+        plain = [(name, positions[self.fields[name].attribute]) for name in fields
+                 if self.fields[name].attribute in positions]
+        computed = [(name, self.fields[name].get) for name in fields if self.fields[name].attribute not in positions]
+        items = []
+        for row in rows:
+            item = {name: row[i] for name, i in plain}
+            for name, get in computed:
+                item[name] = get(row, context)
+            items.append(item)
+        return items
+
+
+post_schema = Schema(Posts.sno, {
+    "id": column_field(Posts.sno),
+    "title": column_field(Posts.title),
+    "slug": column_field(Posts.slug),
+    "excerpt": column_field(Posts.excerpt),
+    "content": column_field(Posts.content),
+    "img_file": column_field(Posts.img_file),
+    "images": Field((Posts.img_file,), lambda post, context: image_pipeline.variant_urls(post.img_file)),
+    # context: {user_id: name}, see main.author_names
+    "author": Field((Posts.user_id,), lambda post, context: context.get(post.user_id, "Unknown Author")),
+    "user_id": column_field(Posts.user_id),
+    "date": Field((Posts.date,), lambda post, context: post.date or ""),
+    "created_at": Field((Posts.created_at,), lambda post, context: post.created_at.isoformat() if post.created_at else None),
+})
+LISTING_FIELDS = ("id", "title", "excerpt", "slug", "img_file", "images", "author", "date", "created_at")
+USER_LISTING_FIELDS = ("id", "title", "excerpt", "slug", "img_file", "images", "date", "created_at")
+POST_DETAIL_FIELDS = ("id", "title", "content", "slug", "img_file", "images", "date", "user_id")
+POST_EDIT_FIELDS = ("id", "title", "slug", "content", "date", "img_file", "user_id")
+POST_SUMMARY_FIELDS = ("id", "title", "slug")
+
+user_schema = Schema(User.id, {
+    "id": column_field(User.id),
+    "name": column_field(User.name),
+    "dob": column_field(User.dob),
+    "place": column_field(User.place),
+    "address": column_field(User.address),
+    "email": column_field(User.email),
+    "image_url": column_field(User.image),
+    "images": Field((User.image,), lambda user, context: image_pipeline.variant_urls(user.image)),
+})
+USER_PROFILE_FIELDS = ("id", "name", "dob", "place", "address", "email", "image_url", "images")
+USER_SUMMARY_FIELDS = ("id", "name", "email")
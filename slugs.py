@@ -0,0 +1,135 @@
+from collections import Counter
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+
+from models import Posts, db
+
+MAX_ATTEMPTS = 5
+# Leave room for a "-<n>" suffix inside Posts.slug
+SUFFIX_ROOM = 6
+
+
+class SlugConflictError(Exception):
+    pass
+
+
+def base_slug(title):
+    from slugify import slugify
+    max_length = Posts.slug.type.length - SUFFIX_ROOM
+    return slugify(title, max_length=max_length, word_boundary=True) or "post"
+
+
+def _slug_range(base):
+    # Every "<base>-<anything>" sorts between "<base>-" and "<base>." ('.' follows '-')
+    return or_(Posts.slug == base, and_(Posts.slug > f"{base}-", Posts.slug < f"{base}."))
+
+
+def _taken_suffixes(base, exclude_sno=None):
+    query = db.session.query(Posts.slug).filter(_slug_range(base))
+    if exclude_sno is not None:
+        query = query.filter(Posts.sno != exclude_sno)
+
+    taken = set()
+    for (slug,) in query:
+        if slug == base:
+            taken.add(0)
+        else:
+            suffix = slug[len(base) + 1:]
+            if suffix.isdigit():
+                taken.add(int(suffix))
+    return taken
+
+
+def free_slugs(base, count, exclude_sno=None):
+    '''The first `count` free slugs among base, base-1, base-2, ... from one range scan on the slug index'''
+    taken = _taken_suffixes(base, exclude_sno)
+    slugs = []
+    suffix = 0
+    while len(slugs) < count:
+        if suffix not in taken:
+            slugs.append(f"{base}-{suffix}" if suffix else base)
+        suffix += 1
+    return slugs
+
+
+def next_free_slug(base, exclude_sno=None):
+    return free_slugs(base, 1, exclude_sno)[0]
+
+
+class SlugAllocator:
+    '''Unique slugs for bulk inserts (imports, seeding). A batch costs one IN lookup per
+    IN_CHUNK distinct bases; only bases already taken, or wanted more than once, get a
+    range lookup for their suffixes (RANGE_CHUNK at a time). Busy bases are remembered,
+    so later batches of the same run count on from memory instead of scanning their ever
+    longer ranges again. Concurrent writers are not seen: the unique index has the last word.'''
+    IN_CHUNK = 900
+    RANGE_CHUNK = 100
+
+    def __init__(self):
+        self._next = {}  # busy base -> next suffix to hand out
+
+    def _taken(self, bases, repeated):
+        taken = {base: set() for base in bases}
+        for i in range(0, len(bases), self.IN_CHUNK):
+            for (slug,) in db.session.query(Posts.slug).filter(Posts.slug.in_(bases[i:i + self.IN_CHUNK])):
+                taken[slug].add(0)
+
+        busy = [base for base in bases if taken[base] or base in repeated]
+        for i in range(0, len(busy), self.RANGE_CHUNK):
+            chunk = busy[i:i + self.RANGE_CHUNK]
+            for (slug,) in db.session.query(Posts.slug).filter(or_(*(_slug_range(base) for base in chunk))):
+                prefix, _, suffix = slug.rpartition('-')
+                if prefix in taken and suffix.isdigit():
+                    taken[prefix].add(int(suffix))
+        return taken
+
+    def allocate(self, bases):
+        '''A free slug for each of `bases` (repeats included), in order'''
+        counts = Counter(bases)
+        taken = self._taken(sorted(base for base in counts if base not in self._next),
+                            {base for base, count in counts.items() if count > 1})
+        cursor = {}
+        slugs = []
+        for base in bases:
+            if base in taken:
+                suffix = cursor.get(base, 0)
+                while suffix in taken[base]:
+                    suffix += 1
+                taken[base].add(suffix)
+                cursor[base] = suffix + 1
+            else:
+                suffix = self._next[base]
+                self._next[base] = suffix + 1
+            slugs.append(f"{base}-{suffix}" if suffix else base)
+        for base, suffixes in taken.items():
+            # A base that was free and used once stays out of memory; a million unique titles would not fit
+            if suffixes != {0}:
+                self._next[base] = max(suffixes) + 1
+        return slugs
+
+    def forget(self):
+        '''Drop what was remembered, e.g. after a concurrent writer took one of our slugs'''
+        self._next.clear()
+
+
+def assign_unique_slug(post, title):
+    '''Give `post` a unique slug derived from `title` and flush it.
+
+    A concurrent insert can claim the same slug between our lookup and our
+    flush; the unique index rejects it, the savepoint is rolled back and we
+    look again, up to MAX_ATTEMPTS times.
+    '''
+    base = base_slug(title)
+    for _ in range(MAX_ATTEMPTS):
+        post.slug = next_free_slug(base, exclude_sno=post.sno)
+        try:
+            with db.session.begin_nested():
+                db.session.add(post)
+                db.session.flush()
+            return post.slug
+        except IntegrityError:
+            # Only retry when the slug itself was the conflict
+            if not Posts.query.filter(Posts.slug == post.slug, Posts.sno != post.sno).first():
+                raise
+    raise SlugConflictError(f"Could not allocate a unique slug for '{title}'")
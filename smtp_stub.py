@@ -0,0 +1,86 @@
+import argparse
+import socketserver
+import threading
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    '''Just enough SMTP for smtplib/Flask-Mail: accepts and records every message'''
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 smtp-stub ESMTP ready")
+        mail_from, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            command = line.decode(errors='replace').strip()
+            verb = command[:4].upper()
+
+            if verb in ('HELO', 'EHLO'):
+                self.reply("250 smtp-stub")
+            elif verb == 'MAIL':
+                mail_from, recipients = command[10:].strip(' <>'), []
+                self.reply("250 OK")
+            elif verb == 'RCPT':
+                recipients.append(command[8:].strip(' <>'))
+                self.reply("250 OK")
+            elif verb == 'DATA':
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for raw in self.rfile:
+                    if raw in (b".\r\n", b".\n"):
+                        break
+                    data.append(raw[1:] if raw.startswith(b"..") else raw)
+                self.server.record(mail_from, recipients, b"".join(data).decode(errors='replace'))
+                self.reply("250 OK: queued")
+            elif verb == 'RSET':
+                mail_from, recipients = None, []
+                self.reply("250 OK")
+            elif verb == 'NOOP':
+                self.reply("250 OK")
+            elif verb == 'QUIT':
+                self.reply("221 Bye")
+                break
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    '''Local SMTP stand-in for tests and benchmarks (MAIL_SERVER=127.0.0.1, MAIL_PORT=<port>)'''
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, verbose=False):
+        super().__init__((host, port), SMTPStubHandler)
+        self.messages = []
+        self.connections = 0
+        self.verbose = verbose
+        self._lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def record(self, mail_from, recipients, data):
+        with self._lock:
+            self.messages.append({"from": mail_from, "to": list(recipients), "data": data})
+        if self.verbose:
+            print(f"--- {mail_from} -> {', '.join(recipients)}\n{data}")
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='smtp-stub', daemon=True).start()
+        return self
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a local SMTP stand-in that prints every message it receives.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1025)
+    args = parser.parse_args()
+
+    server = SMTPStub(args.host, args.port, verbose=True)
+    print(f"SMTP stub listening on {args.host}:{server.port}")
+    server.serve_forever()
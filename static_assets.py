@@ -0,0 +1,176 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+
+from flask import abort, request, send_file, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional: gzip-only without it
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html')
+FINGERPRINT_RE = re.compile(r"^(?P<stem>.+)\.(?P<digest>[0-9a-f]{12})(?P<ext>\.[^./]+)$")
+# Content-addressed uploads (<sha256>.<ext>, <sha256>-thumb.webp, ...) never change either
+CONTENT_ADDRESSED_RE = re.compile(r"(^|/)[0-9a-f]{64}[^/]*$")
+ONE_YEAR = 365 * 24 * 3600
+
+
+class StaticAssets:
+    '''Replaces Flask's static view: fingerprinted names get `immutable` caching, text
+    assets are served from prebuilt .br/.gz files, and everything goes through
+    send_file so ETag/Range requests and wsgi.file_wrapper (sendfile) keep working.'''
+    def __init__(self, app=None):
+        self.manifest = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('STATIC_BUILD_FOLDER', os.path.join(app.instance_path, 'static-build'))
+        app.config.setdefault('STATIC_BUILD_ON_STARTUP', False)
+        app.config.setdefault('STATIC_REVALIDATE_MAX_AGE', 0)
+        app.extensions['static_assets'] = self
+        self.app = app
+        self.static_folder = app.static_folder
+        self.build_folder = app.config['STATIC_BUILD_FOLDER']
+        app.view_functions['static'] = self.serve
+        app.jinja_env.globals['asset_url'] = self.asset_url
+
+        if app.config['STATIC_BUILD_ON_STARTUP']:
+            self.build()
+
+    def _excluded(self, relpath):
+        # Uploads change at runtime and are content-addressed already
+        upload_folder = self.app.config.get('UPLOAD_FOLDER')
+        if not upload_folder:
+            return False
+        upload_rel = os.path.relpath(os.path.abspath(upload_folder), self.static_folder)
+        return relpath == upload_rel or relpath.startswith(upload_rel + os.sep)
+
+    def _walk(self):
+        for root, dirs, files in os.walk(self.static_folder):
+            dirs[:] = [d for d in dirs if not self._excluded(os.path.relpath(os.path.join(root, d), self.static_folder))]
+            for name in files:
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, self.static_folder).replace(os.sep, '/'), path
+
+    @staticmethod
+    def _digest(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()[:12]
+
+    def _compressed_path(self, relpath, digest, encoding):
+        return os.path.join(self.build_folder, f"{relpath}.{digest}.{encoding}")
+
+    def build(self):
+        '''Fingerprint every static file and precompress the text ones; run at deploy time'''
+        manifest = {}
+        written = 0
+        for relpath, path in self._walk():
+            digest = self._digest(path)
+            manifest[relpath] = digest
+            if not relpath.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+
+            with open(path, 'rb') as f:
+                data = f.read()
+            variants = {'gz': lambda: gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                variants['br'] = lambda: brotli.compress(data, quality=11)
+            for encoding, compress in variants.items():
+                target = self._compressed_path(relpath, digest, encoding)
+                if os.path.exists(target):
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                compressed = compress()
+                # Not worth a separate representation if it does not shrink
+                if len(compressed) >= len(data):
+                    continue
+                with open(f"{target}.tmp", 'wb') as out:
+                    out.write(compressed)
+                os.replace(f"{target}.tmp", target)
+                written += 1
+
+        os.makedirs(self.build_folder, exist_ok=True)
+        with open(os.path.join(self.build_folder, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        self.manifest = manifest
+        return manifest, written
+
+    def _get_manifest(self):
+        if self.manifest is None:
+            with self._lock:
+                if self.manifest is None:
+                    manifest_path = os.path.join(self.build_folder, 'manifest.json')
+                    if os.path.exists(manifest_path):
+                        with open(manifest_path) as f:
+                            self.manifest = json.load(f)
+                    else:
+                        self.manifest = {relpath: self._digest(path) for relpath, path in self._walk()}
+        return self.manifest
+
+    def fingerprinted(self, filename):
+        digest = self._get_manifest().get(filename)
+        if digest is None:
+            return filename
+        stem, dot, ext = filename.rpartition('.')
+        return f"{stem}.{digest}.{ext}" if dot else filename
+
+    def asset_url(self, filename, **kwargs):
+        return url_for('static', filename=self.fingerprinted(filename), **kwargs)
+
+    def serve(self, filename):
+        immutable = False
+        match = FINGERPRINT_RE.match(filename)
+        if match:
+            original = f"{match['stem']}{match['ext']}"
+            if original in self._get_manifest():
+                # A stale fingerprint from before a deploy still gets the current file, just not forever
+                immutable = self.manifest[original] == match['digest']
+                filename = original
+        elif CONTENT_ADDRESSED_RE.search(filename):
+            immutable = True
+
+        path = safe_join(self.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+
+        digest = self._get_manifest().get(filename)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        served_path, encoding = path, None
+        if digest and filename.endswith(COMPRESSIBLE_EXTENSIONS):
+            for candidate in ('br', 'gzip'):
+                if candidate in request.accept_encodings:
+                    compressed = self._compressed_path(filename, digest, 'br' if candidate == 'br' else 'gz')
+                    if os.path.exists(compressed):
+                        served_path, encoding = compressed, candidate
+                        break
+
+        response = send_file(
+            served_path,
+            mimetype=mimetype,
+            conditional=True,
+            etag=f"{digest}-{encoding}" if digest and encoding else (digest or True),
+            max_age=ONE_YEAR if immutable else self.app.config['STATIC_REVALIDATE_MAX_AGE'],
+        )
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if digest and filename.endswith(COMPRESSIBLE_EXTENSIONS):
+            response.vary.add('Accept-Encoding')
+        if immutable:
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
+
+
+static_assets = StaticAssets()
@@ -0,0 +1,229 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import abort, has_request_context, send_from_directory, url_for
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+from models import Posts, Upload, User, db
+from static_assets import CONTENT_ADDRESSED_RE, ONE_YEAR
+
+CHUNK_SIZE = 64 * 1024
+KEY_RE = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]+$")
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class UploadStore:
+    '''Content-addressed upload folder: each file is stored once as <sha256>.<ext>
+    and the uploads table counts how many users/posts point at it.'''
+    def __init__(self, app=None):
+        self.folder = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('UPLOAD_GC_GRACE', 3600)
+        app.extensions['upload_store'] = self
+        self.app = app
+        self.folder = app.config['UPLOAD_FOLDER']
+        self.static_prefix = self._static_prefix(app)
+        if self.static_prefix is None:
+            # Outside the static folder nothing would serve the files otherwise
+            app.add_url_rule('/uploads/<path:filename>', 'uploads', self.serve)
+        # Builds paths when serializing outside a Flask request (the ASGI handlers)
+        self._urls = app.url_map.bind('', script_name=app.config['APPLICATION_ROOT'])
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_transaction_end', self._after_transaction_end)
+
+    def _static_prefix(self, app):
+        folder = os.path.abspath(self.folder)
+        static = os.path.abspath(app.static_folder)
+        if os.path.commonpath([folder, static]) == static:
+            return os.path.relpath(folder, static).replace(os.sep, '/')
+        return None
+
+    @staticmethod
+    def is_key(value):
+        return bool(value) and bool(KEY_RE.match(value))
+
+    def path(self, key):
+        return os.path.join(self.folder, key)
+
+    def url(self, name):
+        '''URL path of a file in the upload folder (an upload or one of its variants)'''
+        if self.static_prefix is None:
+            endpoint, values = 'uploads', {'filename': name}
+        else:
+            endpoint, values = 'static', {'filename': f"{self.static_prefix}/{name}"}
+        if has_request_context():
+            return url_for(endpoint, **values)
+        return self._urls.build(endpoint, values)
+
+    def serve(self, filename):
+        # Temporary files of uploads in progress start with a dot
+        if any(part.startswith('.') for part in filename.split('/')):
+            abort(404)
+        immutable = bool(CONTENT_ADDRESSED_RE.search(filename))
+        response = send_from_directory(self.folder, filename, max_age=ONE_YEAR if immutable else 0)
+        if immutable:
+            response.cache_control.immutable = True
+        return response
+
+    def _acquire(self, key, size):
+        updated = Upload.query.filter_by(key=key).update(
+            {Upload.ref_count: Upload.ref_count + 1, Upload.released_at: None},
+            synchronize_session=False
+        )
+        if updated:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(Upload(key=key, size=size, ref_count=1, created_at=utcnow()))
+        except IntegrityError:
+            # Another request registered the same bytes first
+            Upload.query.filter_by(key=key).update(
+                {Upload.ref_count: Upload.ref_count + 1, Upload.released_at: None},
+                synchronize_session=False
+            )
+
+    def _place(self, tmp_path, key):
+        final_path = self.path(key)
+        if os.path.exists(final_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, final_path)
+
+    def _after_commit(self, session):
+        # Savepoint releases fire this too; the row is only committed with the outermost transaction
+        if session.in_nested_transaction():
+            return
+        placed = []
+        for tmp_path, key in session.info.pop('upload_store', ()):
+            try:
+                self._place(tmp_path, key)
+                placed.append(key)
+            except OSError as e:
+                self.app.logger.error(f"Could not store upload {key}: {str(e)}")
+        # Variants are rendered from the placed file, so the pipeline hears about uploads from here
+        pipeline = self.app.extensions.get('image_pipeline')
+        if pipeline is not None:
+            for key in placed:
+                pipeline.submit(key)
+
+    def _after_transaction_end(self, session, transaction):
+        # Rolled back or closed without committing: the temporary files have no row
+        if transaction.parent is not None:
+            return
+        for tmp_path, key in session.info.pop('upload_store', ()):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def save(self, file_storage):
+        '''Stream an uploaded file to disk, hashing as we go, and return its key.
+        The reference is added to the current session; the file gets its final name
+        once that commits (and is then handed to the image pipeline) and is deleted if it rolls back.'''
+        ext = file_storage.filename.rsplit('.', 1)[1].lower()
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.folder, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while True:
+                    chunk = file_storage.stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+            key = f"{digest.hexdigest()}.{ext}"
+            self._acquire(key, size)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        db.session.info.setdefault('upload_store', []).append((tmp_path, key))
+        return key
+
+    def retain(self, key):
+        '''Add a reference to an already stored upload (e.g. an imported post reusing a key)'''
+        if self.is_key(key):
+            Upload.query.filter_by(key=key).update(
+                {Upload.ref_count: Upload.ref_count + 1, Upload.released_at: None},
+                synchronize_session=False
+            )
+
+    def release(self, key):
+        '''Drop one reference; unreferenced files are removed later by collect_garbage()'''
+        if not self.is_key(key):
+            return
+        Upload.query.filter(Upload.key == key, Upload.ref_count > 0).update(
+            {Upload.ref_count: Upload.ref_count - 1}, synchronize_session=False
+        )
+        Upload.query.filter(Upload.key == key, Upload.ref_count == 0).update(
+            {Upload.released_at: utcnow()}, synchronize_session=False
+        )
+
+    def collect_garbage(self):
+        '''Delete files that have had no references for longer than UPLOAD_GC_GRACE seconds,
+        and temporary files that old (left by a process that died before its commit)'''
+        removed = 0
+        stale = time.time() - self.app.config['UPLOAD_GC_GRACE']
+        for name in os.listdir(self.folder):
+            if name.startswith('.upload-') and os.path.getmtime(self.path(name)) < stale:
+                os.remove(self.path(name))
+                removed += 1
+
+        cutoff = utcnow() - timedelta(seconds=self.app.config['UPLOAD_GC_GRACE'])
+        keys = [key for (key,) in db.session.query(Upload.key)
+                .filter(Upload.ref_count == 0, Upload.released_at < cutoff)]
+        for key in keys:
+            # The conditional DELETE holds the row until commit, so a concurrent save()
+            # of the same bytes waits for us and then re-creates both row and file
+            deleted = Upload.query.filter(Upload.key == key, Upload.ref_count == 0).delete(synchronize_session=False)
+            if deleted:
+                if os.path.exists(self.path(key)):
+                    os.remove(self.path(key))
+                removed += 1
+            db.session.commit()
+        return removed
+
+    def adopt_legacy(self):
+        '''Move files referenced by their client filename into content-addressed storage'''
+        adopted = {}
+        for column in (User.image, Posts.img_file):
+            model = column.class_
+            for row in model.query.filter(column.isnot(None)).all():
+                name = getattr(row, column.key)
+                if self.is_key(name) or '/' in name or '.' not in name:
+                    continue
+                legacy_path = self.path(name)
+                if not os.path.exists(legacy_path):
+                    continue
+
+                if name not in adopted:
+                    digest = hashlib.sha256()
+                    with open(legacy_path, 'rb') as f:
+                        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                            digest.update(chunk)
+                    adopted[name] = f"{digest.hexdigest()}.{name.rsplit('.', 1)[1].lower()}"
+                    if not os.path.exists(self.path(adopted[name])):
+                        shutil.copyfile(legacy_path, self.path(adopted[name]))
+
+                self._acquire(adopted[name], os.path.getsize(legacy_path))
+                setattr(row, column.key, adopted[name])
+        db.session.commit()
+
+        for name in adopted:
+            os.remove(self.path(name))
+        return adopted
+
+
+upload_store = UploadStore()
@@ -0,0 +1,122 @@
+import asyncio
+import importlib.util
+import json
+
+import pytest
+
+from asgi import AsyncBlog, async_url
+
+
+def test_async_url_picks_the_asyncio_driver(monkeypatch):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, 'find_spec', lambda name: name == 'aiomysql' or find_spec(name))
+    assert str(async_url("sqlite:////tmp/blog.db")) == "sqlite+aiosqlite:////tmp/blog.db"
+    assert async_url("mysql+mysqlconnector://blog@db/blog").drivername == "mysql+aiomysql"
+
+
+def test_a_missing_async_driver_fails_at_startup(monkeypatch):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, 'find_spec', lambda name: None if name == 'aiomysql' else find_spec(name))
+    with pytest.raises(ValueError, match="pip install aiomysql"):
+        async_url("mysql+mysqlconnector://blog@db/blog")
+    with pytest.raises(ValueError, match="No asyncio driver known for 'oracle'"):
+        async_url("oracle://blog@db/blog")
+
+
+@pytest.fixture
+def blog(app, monkeypatch):
+    '''The ASGI app on the test database, called in-process; counts the requests it hands to Flask'''
+    monkeypatch.setitem(app.config, 'RESPONSE_CACHE_ENABLED', False)
+    blog = AsyncBlog(app)
+    blog.delegated = []
+    delegate = blog._delegate
+
+    async def counting_delegate(scope, body, send):
+        blog.delegated.append(scope['path'])
+        await delegate(scope, body, send)
+
+    blog._delegate = counting_delegate
+    loop = asyncio.new_event_loop()
+    blog.call = lambda *args, **kwargs: loop.run_until_complete(asgi_request(blog, *args, **kwargs))
+    yield blog
+    loop.run_until_complete(blog.engine.dispose())
+    loop.close()
+    blog.executor.shutdown()
+
+
+async def asgi_request(blog, method, url, body=None, headers=()):
+    path, _, query = url.partition('?')
+    headers = [(name.lower().encode(), value.encode()) for name, value in dict(headers).items()]
+    if body is not None:
+        body = json.dumps(body).encode()
+        headers.append((b'content-type', b'application/json'))
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(), 'headers': headers,
+             'http_version': '1.1', 'root_path': '', 'scheme': 'http', 'server': ('localhost', 80), 'client': ('127.0.0.1', 1)}
+    messages = [{'type': 'http.request', 'body': body or b'', 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await blog(scope, receive, send)
+    start = sent[0]
+    return start['status'], dict(start['headers']), b''.join(message.get('body', b'') for message in sent[1:])
+
+
+def test_native_handlers_answer_like_flask(blog, client, make_user, make_posts, auth):
+    user_id = make_user()
+    make_posts(user_id, 7)
+    headers = auth(user_id)
+    cases = [
+        ('GET', '/post', None, {}),
+        ('GET', '/post?page=2&per_page=3&fields=id,title,author', None, {}),
+        ('GET', '/post?sort=newest&since=2020-01-01&per_page=3', None, {}),
+        ('GET', '/post?fields=nope', None, {}),
+        ('GET', '/post?page=99', None, {}),
+        ('GET', '/post?page=0&per_page=-1', None, {}),
+        ('GET', '/post/post-number-3', None, {}),
+        ('GET', '/post/missing', None, {}),
+        ('POST', '/posts/batch-get', {'ids': [1, 2, 99]}, {}),
+        ('POST', '/posts/batch-get?fields=title', {'slugs': ['post-number-4', 'missing']}, {}),
+        ('POST', '/posts/batch-get', {'ids': 'x'}, {}),
+        ('GET', '/user/posts', None, headers),
+        ('GET', '/user/posts?per_page=2&page=2&sort=oldest', None, headers),
+    ]
+    for method, url, body, request_headers in cases:
+        status, response_headers, data = blog.call(method, url, body, request_headers)
+        expected = client.open(url, method=method, json=body, headers=request_headers)
+        assert (status, json.loads(data)) == (expected.status_code, expected.get_json()), url
+        assert response_headers[b'content-type'] == expected.headers['Content-Type'].encode()
+    assert blog.delegated == []
+
+
+def test_other_requests_are_handed_to_flask(blog, client, make_user, make_posts, auth):
+    user_id = make_user()
+    make_posts(user_id, 3)
+    cases = [
+        ('GET', '/post?search=number', {}),
+        ('GET', '/post?limit=2', {}),
+        ('GET', '/user/posts', {}),
+        ('GET', '/user/posts', {'Authorization': 'Bearer not-a-token'}),
+        ('GET', '/profile', auth(user_id)),
+    ]
+    for method, url, headers in cases:
+        status, _, data = blog.call(method, url, headers=headers)
+        expected = client.open(url, method=method, headers=headers)
+        assert (status, json.loads(data)) == (expected.status_code, expected.get_json()), url
+    assert blog.delegated == ['/post', '/post', '/user/posts', '/user/posts', '/profile']
+
+
+def test_native_responses_share_the_response_cache(app, blog, client, make_user, make_posts, monkeypatch):
+    monkeypatch.setitem(app.config, 'RESPONSE_CACHE_ENABLED', True)
+    make_posts(make_user(), 3)
+    status, headers, data = blog.call('GET', '/post')
+    assert (status, headers[b'x-cache']) == (200, b'MISS')
+
+    cached = client.get('/post')
+    assert cached.headers['X-Cache'] == 'HIT'
+    assert cached.headers['ETag'].encode() == headers[b'etag'] and cached.data == data
+    assert blog.call('GET', '/post', headers={'If-None-Match': cached.headers['ETag']})[0] == 304
@@ -0,0 +1,75 @@
+import json
+
+from models import Posts, Upload, db, utcnow
+from query_counter import QueryCounter
+from slugs import SlugAllocator
+
+OWN_KEY = "aa" * 32 + ".png"
+OTHER_KEY = "bb" * 32 + ".png"
+
+
+def ndjson(*records):
+    return "".join(json.dumps(record) + "\n" for record in records)
+
+
+def post(**fields):
+    return dict({"title": "Imported post", "content": "Imported content here."}, **fields)
+
+
+def test_malformed_fields_are_per_line_errors(app, client, make_user, auth):
+    body = ndjson(post(date={"day": 1}), post(date="x" * 51), post(img_file=7), post(img_file="x" * 256), post())
+    response = client.post('/posts/import', data=body, headers=auth(make_user()))
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report["imported"] == 1
+    assert [error["line"] for error in report["errors"]] == [1, 2, 3, 4]
+    assert "date must be a string" in report["errors"][0]["error"]
+    assert "img_file must be a string" in report["errors"][2]["error"]
+
+
+def test_imports_only_reuse_the_users_own_images(app, client, make_user, make_posts, auth):
+    owner, other = make_user("Owner"), make_user("Other")
+    make_posts(owner, 1, img_file=OWN_KEY)
+    make_posts(other, 1, img_file=OTHER_KEY)
+    with app.app_context():
+        db.session.add_all([Upload(key=key, size=1, ref_count=1, created_at=utcnow()) for key in (OWN_KEY, OTHER_KEY)])
+        db.session.commit()
+
+    body = ndjson(post(img_file=OWN_KEY), post(img_file=OTHER_KEY))
+    report = client.post('/posts/import', data=body, headers=auth(owner)).get_json()
+    assert report["imported"] == 1
+    assert report["errors"] == [{"line": 2, "error": f"img_file '{OTHER_KEY}' is not one of your images"}]
+    with app.app_context():
+        assert db.session.get(Upload, OWN_KEY).ref_count == 2
+        assert db.session.get(Upload, OTHER_KEY).ref_count == 1
+        assert Posts.query.filter_by(img_file=OTHER_KEY).count() == 1
+
+
+def test_slugs_for_a_batch_cost_one_lookup(app, client, make_user, make_posts, auth):
+    user_id = make_user()
+    make_posts(user_id, 1)  # post-number-1 is taken
+    headers = auth(user_id)
+    client.get('/user/posts', headers=headers)  # token version cached from here on
+    titles = [f"Distinct title {i}" for i in range(40)] + ["Post number 1"] * 2
+    body = ndjson(*(post(title=title) for title in titles))
+
+    with app.app_context():
+        engine = db.engine
+    with QueryCounter(engine) as counter:
+        report = client.post('/posts/import', data=body, headers=headers).get_json()
+    assert report["imported"] == 42
+    assert len([statement for statement in counter.statements if "posts.slug >" in statement]) == 1
+    with app.app_context():
+        assert sorted(slug for (slug,) in db.session.query(Posts.slug).filter(Posts.slug.like("post-number-1%"))) \
+            == ["post-number-1", "post-number-1-1", "post-number-1-2"]
+
+
+def test_slug_allocator_remembers_busy_bases(app, make_user, make_posts):
+    make_posts(make_user(), 1)
+    with app.app_context():
+        allocator = SlugAllocator()
+        assert allocator.allocate(["post-number-1", "fresh", "post-number-1"]) \
+            == ["post-number-1-1", "fresh", "post-number-1-2"]
+        assert allocator.allocate(["post-number-1"]) == ["post-number-1-3"]
+        # A base that was free and used once is looked up again next time
+        assert "fresh" not in allocator._next
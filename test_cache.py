@@ -0,0 +1,61 @@
+from cache import response_cache
+from models import db
+
+
+def test_responses_are_cached_and_revalidated(client, make_user, make_posts):
+    make_posts(make_user(), 3)
+    first = client.get('/post?page=1&per_page=2')
+    assert first.headers['X-Cache'] == 'MISS'
+    assert first.headers['Cache-Control'] == 'public, no-cache'
+    etag = first.headers['ETag']
+
+    # Same arguments in another order: the same entry
+    second = client.get('/post?per_page=2&page=1')
+    assert second.headers['X-Cache'] == 'HIT'
+    assert (second.headers['ETag'], second.data) == (etag, first.data)
+
+    not_modified = client.get('/post?page=1&per_page=2', headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304
+    assert not_modified.data == b""
+    assert client.get('/post?page=1&per_page=2', headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_errors_are_not_cached(client):
+    assert client.get('/post?sort=sideways').status_code == 400
+    response = client.get('/post?sort=sideways')
+    assert response.status_code == 400
+    assert 'X-Cache' not in response.headers
+
+
+def test_writes_evict_once_committed(app, client, make_user, make_posts, auth):
+    user_id = make_user()
+    snos = make_posts(user_id, 2)
+    assert client.get('/post').headers['X-Cache'] == 'MISS'
+
+    with app.app_context():
+        response_cache.invalidate("listing")
+        db.session.rollback()
+    assert client.get('/post').headers['X-Cache'] == 'HIT'
+
+    assert client.delete(f'/delete/{snos[-1]}', headers=auth(user_id)).status_code == 200
+    response = client.get('/post')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert [post["id"] for post in response.json["posts"]] == snos[:1]
+
+
+def test_compressed_variants_have_their_own_etag(app, client, make_user, make_posts, monkeypatch):
+    monkeypatch.setitem(app.config, 'COMPRESS_MIN_SIZE', 0)
+    make_posts(make_user(), 2)
+    plain = client.get('/post')
+    assert plain.vary.as_set() >= {'accept-encoding'}
+    assert 'Content-Encoding' not in plain.headers
+
+    gzipped = client.get('/post', headers={'Accept-Encoding': 'gzip'})
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert gzipped.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+    assert 'accept-encoding' in gzipped.vary.as_set()
+
+    revalidated = client.get('/post', headers={'Accept-Encoding': 'gzip', 'If-None-Match': gzipped.headers['ETag']})
+    assert revalidated.status_code == 304
+    # An ETag of another coding is not a match
+    assert client.get('/post', headers={'If-None-Match': gzipped.headers['ETag']}).status_code == 200
@@ -0,0 +1,89 @@
+import gzip
+import json
+
+import pytest
+from flask import Flask, Response, jsonify, stream_with_context
+
+from compress import ResponseCompression, brotli, zstandard
+
+ROWS = [{"id": i, "title": f"Post number {i}", "excerpt": "Some words that repeat. " * 4} for i in range(50)]
+DECODERS = {'gzip': gzip.decompress}
+if brotli is not None:
+    DECODERS['br'] = brotli.decompress
+if zstandard is not None:
+    DECODERS['zstd'] = lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+@pytest.fixture
+def site():
+    '''A small app with a fresh ResponseCompression: a large and a small JSON body, a stream and an image'''
+    app = Flask(__name__)
+    compression = ResponseCompression(app)
+
+    @app.route('/big')
+    def big():
+        response = jsonify(ROWS)
+        response.set_etag("v1")
+        return response
+
+    @app.route('/small')
+    def small():
+        return jsonify({"status": True})
+
+    @app.route('/stream')
+    def stream():
+        lines = (json.dumps(row) + "\n" for row in ROWS)
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+    @app.route('/image')
+    def image():
+        return Response(b"\x89PNG" + b"\0" * 4096, mimetype='image/png')
+
+    return app, compression
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("gzip, deflate, br, zstd", "zstd" if zstandard else "br" if brotli else "gzip"),
+    ("gzip;q=1.0, br;q=0.5, zstd;q=0.5", "gzip"),
+    ("br", "br" if brotli else None),
+    ("identity", None),
+    ("", None),
+])
+def test_negotiation(site, accept, expected):
+    app, compression = site
+    assert compression.negotiate(accept) == expected
+    app.config['COMPRESS_ENABLED'] = False
+    assert compression.negotiate(accept) is None
+
+
+@pytest.mark.parametrize("encoding", sorted(DECODERS))
+def test_large_bodies_are_compressed(site, encoding):
+    app, _ = site
+    plain = app.test_client().get('/big')
+    response = app.test_client().get('/big', headers={'Accept-Encoding': encoding})
+    assert response.headers['Content-Encoding'] == encoding
+    assert int(response.headers['Content-Length']) == len(response.data) < len(plain.data)
+    assert DECODERS[encoding](response.data) == plain.data
+    assert 'accept-encoding' in response.vary.as_set()
+    assert response.get_etag() == (f"v1-{encoding}", False)
+
+
+def test_small_and_binary_bodies_are_left_alone(site):
+    app, _ = site
+    client = app.test_client()
+    small = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
+    # Large enough another time, so caches must still key on the header
+    assert 'accept-encoding' in small.vary.as_set()
+
+    image = client.get('/image', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in image.headers
+    assert 'accept-encoding' not in image.vary.as_set()
+
+
+def test_streams_are_compressed_as_they_go(site):
+    app, _ = site
+    response = app.test_client().get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    assert [json.loads(line) for line in gzip.decompress(response.data).splitlines()] == ROWS
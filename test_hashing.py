@@ -0,0 +1,55 @@
+from hashing import password_hasher
+from models import User, db
+
+PASSWORD = "Passw0rd-long"
+
+
+def set_password(app, user_id, rounds):
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        user.password = password_hasher.bcrypt.generate_password_hash(PASSWORD, rounds).decode('utf-8')
+        db.session.commit()
+        return user.email
+
+
+def stored_hash(app, user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).password
+
+
+def login(client, email, password=PASSWORD):
+    return client.post('/login', json={"email": email, "password": password})
+
+
+def test_login_upgrades_hashes_made_with_another_cost(app, client, make_user, monkeypatch):
+    user_id = make_user()
+    email = set_password(app, user_id, 4)
+    monkeypatch.setitem(app.config, 'BCRYPT_LOG_ROUNDS', 5)
+
+    assert login(client, email, "Wr0ng-password").status_code == 401
+    assert stored_hash(app, user_id).startswith("$2b$04$")
+
+    assert login(client, email).status_code == 200
+    upgraded = stored_hash(app, user_id)
+    assert upgraded.startswith("$2b$05$")
+    assert login(client, email).status_code == 200
+    assert stored_hash(app, user_id) == upgraded
+
+
+def test_needs_rehash(app):
+    with app.app_context():
+        assert not password_hasher.needs_rehash(password_hasher.hash(PASSWORD))
+        assert password_hasher.needs_rehash("$2b$10$" + "x" * 53)
+        assert password_hasher.needs_rehash("plain text")
+
+
+def test_a_full_hashing_queue_answers_503(app, client, make_user, monkeypatch):
+    email = set_password(app, make_user(), 4)
+    monkeypatch.setitem(app.config, 'HASH_MAX_QUEUE', 0)
+    rejected = password_hasher.stats()["rejected"]
+
+    response = login(client, email)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert response.json["status"] is False
+    assert password_hasher.stats()["rejected"] == rejected + 1
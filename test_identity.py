@@ -0,0 +1,53 @@
+from sqlalchemy import create_engine, insert, update
+
+from identity import token_versions
+from models import Posts, User, db
+from replicas import replica_router
+from slugs import assign_unique_slug
+
+
+def test_versions_are_read_from_the_primary(app, make_user, monkeypatch, tmp_path):
+    user_id = make_user()
+    with app.app_context():
+        token_versions.revoke(db.session.get(User, user_id))
+        db.session.commit()
+
+    # A replica that has not replayed the revoke yet
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    User.__table__.create(replica)
+    with replica.begin() as connection:
+        connection.execute(insert(User), {"id": user_id, "name": "Author", "email": "author@example.test",
+                                          "password": "x", "token_version": 0})
+    monkeypatch.setattr(replica_router, 'read_engine', lambda db: replica)
+
+    with app.test_request_context(method='GET'):
+        assert token_versions.current(user_id) == 1
+    with app.test_request_context(method='GET'):
+        # and the cache holds the primary's answer
+        assert token_versions.current(user_id) == 1
+
+
+def test_revoke_evicts_on_the_outer_commit(app, make_user):
+    user_id = make_user()
+    with app.app_context():
+        assert token_versions.current(user_id) == 0
+        token_versions.revoke(db.session.get(User, user_id))
+        post = Posts(user_id=user_id, title="Hello", content="Some content here.", date="01-01-2026 10:00 AM")
+        assign_unique_slug(post, "Hello")
+        assert "revoked_users" in db.session.info
+        db.session.commit()
+        assert token_versions.current(user_id) == 1
+
+
+def test_revokes_increment_in_the_database(app, make_user):
+    user_id = make_user()
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        assert user.token_version == 0
+        # A concurrent password reset commits in between
+        with db.engine.begin() as connection:
+            connection.execute(update(User).where(User.id == user_id).values(token_version=User.token_version + 1))
+        token_versions.revoke(user)
+        assert user.token_version == 2
+        db.session.commit()
+        assert db.session.get(User, user_id).token_version == 2
@@ -0,0 +1,155 @@
+import io
+import os
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from images import image_pipeline, variant_name
+from models import Posts, db
+from slugs import assign_unique_slug
+from storage import upload_store
+
+KEY = "ab" * 32 + ".png"
+
+
+class FakeExecutor:
+    '''Runs nothing; records what was submitted, or fails like a pool whose worker died'''
+    def __init__(self, broken=False):
+        self.broken = broken
+        self.submitted = []
+        self.sources_in_place = []
+        self.shut_down = False
+
+    def submit(self, fn, *args):
+        if self.broken:
+            raise BrokenProcessPool("A child process terminated abruptly")
+        self.submitted.append(args[0])
+        self.sources_in_place.append(os.path.exists(args[0]))
+        future = Future()
+        future.set_result(0)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+@pytest.fixture
+def pipeline(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'IMAGE_PIPELINE_ENABLED', True)
+    monkeypatch.setattr(image_pipeline, '_executor', FakeExecutor())
+    return image_pipeline
+
+
+def test_uploads_are_rendered_once_placed_by_the_outer_commit(app, make_user, pipeline):
+    user_id = make_user()
+    with app.app_context():
+        key = upload_store.save(FileStorage(io.BytesIO(b"not really a png"), filename="photo.png"))
+        post = Posts(user_id=user_id, title="Hello", content="Some content here.", date="01-01-2026 10:00 AM",
+                     img_file=key)
+        assign_unique_slug(post, "Hello")
+        assert pipeline._executor.submitted == []
+        db.session.commit()
+    assert [path.rsplit('/', 1)[1] for path in pipeline._executor.submitted] == [key]
+    assert pipeline._executor.sources_in_place == [True]
+
+
+def test_rolled_back_uploads_are_not_rendered(app, pipeline):
+    with app.app_context():
+        upload_store.save(FileStorage(io.BytesIO(b"not really a png"), filename="photo.png"))
+        db.session.rollback()
+    assert pipeline._executor.submitted == []
+
+
+def test_a_broken_pool_is_replaced(app, pipeline, monkeypatch):
+    broken, fresh = FakeExecutor(broken=True), FakeExecutor()
+    pipeline._executor = broken
+    monkeypatch.setattr('images.ProcessPoolExecutor', lambda **kwargs: fresh)
+    pipeline.submit("photo.png")
+    assert broken.shut_down
+    assert pipeline._executor is fresh
+    assert len(fresh.submitted) == 1
+
+
+def test_submit_failures_do_not_reach_the_request(app, pipeline, monkeypatch):
+    monkeypatch.setattr('images.ProcessPoolExecutor', lambda **kwargs: FakeExecutor(broken=True))
+    pipeline._executor = FakeExecutor(broken=True)
+    pipeline.submit("photo.png")
+    assert pipeline._executor is None
+
+
+def test_a_pool_that_breaks_while_rendering_is_replaced(app, pipeline):
+    executor = pipeline._executor
+    future = Future()
+    future.set_exception(BrokenProcessPool("A child process terminated abruptly"))
+    with app.app_context():
+        pipeline._finished(executor, "photo.png", future)
+    assert executor.shut_down
+    assert pipeline._executor is None
+
+
+def write_variants(app, key, variants=("thumb", "card", "full"), formats=("webp", "jpeg")):
+    for variant in variants:
+        for fmt in formats:
+            path = os.path.join(app.config['UPLOAD_FOLDER'], variant_name(key, variant, fmt))
+            with open(path, 'wb') as f:
+                f.write(b"rendered")
+
+
+def test_no_variant_urls_before_anything_is_rendered(app):
+    with app.app_context():
+        assert image_pipeline.variant_urls(KEY) is None
+        assert image_pipeline.variant_urls("https://example.test/photo.png") is None
+
+
+def test_variant_urls_only_list_rendered_files(app, client):
+    write_variants(app, KEY, variants=("thumb",), formats=("webp",))
+    with app.test_request_context():
+        urls = image_pipeline.variant_urls(KEY)
+    assert urls == {"thumb": {"webp": f"/uploads/derived/{KEY[:-4]}-thumb.webp"}}
+
+    response = client.get(urls["thumb"]["webp"])
+    assert response.status_code == 200
+    assert response.cache_control.immutable
+
+
+def test_variant_urls_outside_a_request(app):
+    # The ASGI handlers serialize without a Flask request context
+    write_variants(app, KEY)
+    urls = image_pipeline.variant_urls(KEY)
+    assert set(urls) == {"thumb", "card", "full"}
+    assert urls["full"]["jpeg"] == f"/uploads/derived/{KEY[:-4]}-full.jpg"
+
+
+def test_temporary_upload_files_are_not_served(app, client):
+    with open(os.path.join(app.config['UPLOAD_FOLDER'], '.upload-abc'), 'wb') as f:
+        f.write(b"half written")
+    assert client.get('/uploads/.upload-abc').status_code == 404
+
+
+def test_missing_variants_are_rechecked_after_a_while(app, monkeypatch):
+    checks, now = [], [1000.0]
+    exists = os.path.exists
+    monkeypatch.setattr('images.os.path.exists', lambda path: checks.append(path) or exists(path))
+    monkeypatch.setattr('images.time.monotonic', lambda: now[0])
+    assert image_pipeline.variant_urls(KEY) is None
+    write_variants(app, KEY)
+    assert image_pipeline.variant_urls(KEY) is None
+    assert len(checks) == 6
+
+    now[0] += app.config['IMAGE_VARIANT_RECHECK'] + 1
+    assert set(image_pipeline.variant_urls(KEY)) == {"thumb", "card", "full"}
+    # All there now: never looked at again
+    checks.clear()
+    image_pipeline.variant_urls(KEY)
+    assert checks == []
+
+
+def test_finished_renders_show_up_immediately(app):
+    assert image_pipeline.variant_urls(KEY) is None
+    write_variants(app, KEY)
+    future = Future()
+    future.set_result(6)
+    image_pipeline._finished(None, KEY, future)
+    assert set(image_pipeline.variant_urls(KEY)) == {"thumb", "card", "full"}
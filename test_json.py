@@ -0,0 +1,65 @@
+import dataclasses
+import json
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from json_provider import FastJSONProvider, orjson
+
+pytestmark = pytest.mark.skipif(orjson is None, reason="orjson is not installed")
+
+
+@dataclasses.dataclass
+class Point:
+    x: int
+    label: str
+
+
+VALUES = [
+    {"b": 1, "a": [1, 2.5, None, True, False], "c": {"z": "x", "y": ""}},
+    {"when": datetime(2026, 1, 2, 3, 4, 5), "day": date(2026, 1, 2),
+     "aware": datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)},
+    {"price": Decimal("1.10"), "id": uuid.UUID(int=5), "point": Point(1, "x")},
+    [0.1, 1e16, 1e-7, -0.0, 2 ** 70],
+    {1: "a", 2: "b", 10: "c"},
+    "plain",
+]
+
+
+@pytest.fixture
+def providers():
+    app = Flask(__name__)
+    with app.app_context():
+        yield DefaultJSONProvider(app), FastJSONProvider(app), app
+
+
+@pytest.mark.parametrize("value", VALUES)
+def test_responses_match_the_default_provider(providers, value):
+    default, fast, app = providers
+    assert fast.response(value).get_data() == default.response(value).get_data()
+    assert fast.loads(fast.dumps(value)) == default.loads(default.dumps(value))
+
+    app.debug = True
+    assert fast.response(value).get_data() == default.response(value).get_data()
+
+
+def test_non_ascii_text_is_sent_as_utf8(providers):
+    default, fast, app = providers
+    value = {"title": "Café ☕", "tags": ["naïve"]}
+    body = fast.response(value).get_data()
+    assert "Café ☕".encode() in body
+    assert json.loads(body) == json.loads(default.response(value).get_data())
+
+
+def test_the_app_uses_it(app, client, make_user, make_posts):
+    assert isinstance(app.json, FastJSONProvider)
+    make_posts(make_user("Zoë"), 1)
+    response = client.get('/post')
+    assert "Zoë".encode() in response.data
+    with app.app_context():
+        expected = DefaultJSONProvider(app).response(json.loads(response.data)).get_data()
+    assert json.loads(response.data) == json.loads(expected)
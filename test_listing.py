@@ -0,0 +1,109 @@
+import importlib.util
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import sqlalchemy as sa
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+
+from models import Posts, db
+
+MIGRATIONS = os.path.join(os.path.dirname(__file__), 'migrations', 'versions')
+START = datetime(2026, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def posts(app, make_user, make_posts):
+    '''Six posts whose created_at runs against their sno, with a tie between the 3rd and 4th'''
+    user_id = make_user()
+    snos = make_posts(user_id, 6)
+    offsets = {1: 50, 2: 40, 3: 30, 4: 30, 5: 20, 6: 10}
+    with app.app_context():
+        for sno, minutes in offsets.items():
+            Posts.query.filter_by(sno=sno).update({Posts.created_at: START + timedelta(minutes=minutes)})
+        db.session.commit()
+    return user_id, snos
+
+
+def ids(response):
+    assert response.status_code == 200, response.json
+    return [post["id"] for post in response.json["posts"]]
+
+
+def test_sorted_by_created_at(client, posts, auth):
+    assert ids(client.get('/post?sort=newest&per_page=10')) == [1, 2, 4, 3, 5, 6]
+    assert ids(client.get('/post?sort=oldest&per_page=10')) == [6, 5, 3, 4, 2, 1]
+    assert ids(client.get('/user/posts?sort=newest&per_page=10', headers=auth(posts[0]))) == [1, 2, 4, 3, 5, 6]
+    # Unsorted listings keep their sno order
+    assert ids(client.get('/post?per_page=10')) == [1, 2, 3, 4, 5, 6]
+
+
+def test_created_at_ranges(client, posts):
+    since, until = (START + timedelta(minutes=20)).isoformat(), (START + timedelta(minutes=40)).isoformat()
+    page = client.get(f'/post?sort=oldest&since={since}&until={until}&per_page=10')
+    assert ids(page) == [5, 3, 4]
+    assert page.json["total_posts"] == 3
+    # With an offset, the same instant in another zone
+    assert ids(client.get('/post?sort=oldest&since=2026-01-01T13:10:00%2B00:30&per_page=10')) == [2, 1]
+
+
+def test_sorted_cursor_pages_cross_ties(client, posts):
+    seen, cursor = [], ""
+    while True:
+        page = client.get(f'/post?sort=newest&limit=2{cursor}').json
+        seen += [post["id"] for post in page["posts"]]
+        if not page["next_cursor"]:
+            break
+        cursor = f"&cursor={page['next_cursor']}"
+    assert seen == [1, 2, 4, 3, 5, 6]
+
+
+@pytest.mark.parametrize("query", ["sort=sideways", "since=yesterday", "until=2026-13-01"])
+def test_invalid_listing_options(client, query):
+    response = client.get(f'/post?{query}')
+    assert response.status_code == 400
+    assert response.json["status"] is False
+
+
+def load_migration(revision):
+    name = next(name for name in os.listdir(MIGRATIONS) if name.startswith(revision))
+    spec = importlib.util.spec_from_file_location(f"migration_{revision}", os.path.join(MIGRATIONS, name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_created_at_backfill(tmp_path, monkeypatch):
+    migration = load_migration('f3a9c1d07b52')
+    monkeypatch.setattr(migration, 'BATCH_SIZE', 2)
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE posts (sno INTEGER PRIMARY KEY, user_id INTEGER, date VARCHAR(30))")
+        connection.exec_driver_sql("CREATE TABLE contacts (sno INTEGER PRIMARY KEY, date VARCHAR(30))")
+        connection.exec_driver_sql("INSERT INTO posts VALUES (1, 1, '01-02-2025 09:30 PM'), (2, 1, 'garbage'), "
+                                   "(3, 1, '15-03-2024 11:05 AM'), (4, 1, NULL), (5, 1, '31-12-2023 12:00 AM')")
+        connection.exec_driver_sql("INSERT INTO contacts VALUES (1, '01-02-2025 09:30 PM')")
+
+    before = datetime.now(timezone.utc).replace(tzinfo=None)
+    with engine.connect() as connection:
+        context = MigrationContext.configure(connection)
+        with Operations.context(context), context.begin_transaction():
+            migration.upgrade()
+
+    def utc(value):
+        # The old strings are server local time
+        return datetime.strptime(value, migration.DATE_FORMAT).astimezone(timezone.utc).replace(tzinfo=None)
+
+    posts = sa.table('posts', sa.column('sno'), sa.column('created_at', sa.DateTime))
+    contacts = sa.table('contacts', sa.column('created_at', sa.DateTime))
+    with engine.connect() as connection:
+        created = dict(connection.execute(sa.select(posts.c.sno, posts.c.created_at)).all())
+        assert connection.execute(sa.select(contacts.c.created_at)).scalar() == utc('01-02-2025 09:30 PM')
+    assert created[1] == utc('01-02-2025 09:30 PM')
+    assert created[3] == utc('15-03-2024 11:05 AM')
+    assert created[5] == utc('31-12-2023 12:00 AM')
+    # Unparseable dates get the migration time
+    assert created[2] == created[4] and created[2] >= before
+    assert {index['name'] for index in sa.inspect(engine).get_indexes('posts')} == {
+        'ix_posts_created_at', 'ix_posts_user_id_created_at'}
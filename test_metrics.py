@@ -0,0 +1,35 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from models import db
+from query_counter import assert_max_queries
+
+
+def test_failed_statements_leave_no_timing_on_the_connection(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'SLOW_QUERY_THRESHOLD', 0)
+    with app.app_context(), db.engine.connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.exec_driver_sql("SELECT * FROM missing_table")
+        connection.exec_driver_sql("SELECT 1")
+        assert not connection.info.get('metrics_query_started')
+        assert not any(key.startswith('metrics') for key in connection.info)
+
+
+def sample(client, series):
+    for line in client.get('/metrics').get_data(as_text=True).splitlines():
+        if line.startswith(series + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_requests_count_their_statements_after_a_failed_one(app, client, make_user, make_posts, monkeypatch):
+    make_posts(make_user(), 3)
+    series = 'http_request_db_statements_sum{method="GET",route="/post",status="200"}'
+    with app.app_context(), db.engine.connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.exec_driver_sql("SELECT * FROM missing_table")
+
+    before = sample(client, series)
+    with assert_max_queries(app, 3) as counter:
+        client.get('/post?per_page=2')
+    assert sample(client, series) - before == len(counter.statements)
@@ -0,0 +1,124 @@
+import smtplib
+from contextlib import contextmanager
+from datetime import timedelta
+
+import pytest
+
+from models import Outbox, db
+from outbox import outbox, utcnow
+
+
+class FakeMail:
+    '''Stands in for Flask-Mail: records what was sent, or fails to send / to connect'''
+    def __init__(self):
+        self.sent = []
+        self.refuse = set()
+        self.unreachable = False
+
+    @contextmanager
+    def connect(self):
+        if self.unreachable:
+            raise ConnectionRefusedError("Connection refused")
+        yield self
+
+    def send(self, message):
+        if set(message.recipients) & self.refuse:
+            raise smtplib.SMTPRecipientsRefused({address: (550, b"No such user") for address in message.recipients})
+        self.sent.append(message)
+
+
+@pytest.fixture
+def mail(app, monkeypatch):
+    # Messages are still built by Flask-Mail, which looks itself up on the app
+    outbox._get_mail()
+    fake = FakeMail()
+    monkeypatch.setattr(outbox, 'mail', fake)
+    return fake
+
+
+def queue(app, *addresses, commit=True):
+    with app.app_context():
+        for address in addresses:
+            outbox.queue("Hello", [address], "Some text.")
+        if commit:
+            db.session.commit()
+        else:
+            db.session.rollback()
+
+
+def rows(app):
+    with app.app_context():
+        return {row.recipients: row for row in Outbox.query.all()}
+
+
+def test_mail_is_only_sent_once_committed(app, mail):
+    outbox._wakeup.clear()
+    queue(app, "gone@example.test", commit=False)
+    assert not outbox._wakeup.is_set()
+    queue(app, "ann@example.test", "bob@example.test")
+    assert outbox._wakeup.is_set()
+
+    with app.app_context():
+        assert outbox.drain() == 2
+        assert outbox.drain() == 0
+    assert [message.recipients for message in mail.sent] == [["ann@example.test"], ["bob@example.test"]]
+    assert {(row.status, row.attempts) for row in rows(app).values()} == {("sent", 1)}
+
+
+def test_failed_messages_are_retried_with_backoff(app, mail):
+    mail.refuse.add("bob@example.test")
+    queue(app, "ann@example.test", "bob@example.test")
+    with app.app_context():
+        assert outbox.drain() == 2
+        # Not due yet
+        assert outbox.drain() == 0
+
+    bob = rows(app)['["bob@example.test"]']
+    assert (bob.status, bob.attempts, bob.claim_token) == ("pending", 1, None)
+    assert "No such user" in bob.last_error
+    delay = (bob.next_attempt_at - utcnow()).total_seconds()
+    assert app.config['OUTBOX_BACKOFF_BASE'] - 5 < delay <= app.config['OUTBOX_BACKOFF_BASE']
+
+    mail.refuse.clear()
+    with app.app_context():
+        Outbox.query.filter_by(id=bob.id).update({Outbox.next_attempt_at: utcnow()})
+        db.session.commit()
+        assert outbox.drain() == 1
+    assert rows(app)['["bob@example.test"]'].status == "sent"
+    assert [message.recipients for message in mail.sent] == [["ann@example.test"], ["bob@example.test"]]
+
+
+def test_unreachable_servers_put_the_batch_back(app, mail, monkeypatch):
+    monkeypatch.setitem(app.config, 'OUTBOX_MAX_ATTEMPTS', 2)
+    mail.unreachable = True
+    queue(app, "ann@example.test", "bob@example.test")
+    with app.app_context():
+        assert outbox.drain() == 2
+        assert {(row.status, row.attempts) for row in Outbox.query} == {("pending", 1)}
+
+        Outbox.query.update({Outbox.next_attempt_at: utcnow()})
+        db.session.commit()
+        assert outbox.drain() == 2
+        assert {(row.status, row.attempts) for row in Outbox.query} == {("failed", 2)}
+        # Given up on: never claimed again
+        Outbox.query.update({Outbox.next_attempt_at: utcnow()})
+        db.session.commit()
+        assert outbox.drain() == 0
+    assert mail.sent == []
+
+
+def test_batches_abandoned_mid_send_are_reclaimed_after_the_lease(app, mail):
+    queue(app, "ann@example.test")
+    with app.app_context():
+        claimed = outbox._claim()
+        assert [row.status for row in claimed] == ["sending"]
+        # The worker holding it died
+        db.session.rollback()
+        assert outbox.drain() == 0
+
+        lease = timedelta(seconds=app.config['OUTBOX_LEASE'] + 1)
+        Outbox.query.update({Outbox.claimed_at: utcnow() - lease})
+        db.session.commit()
+        assert outbox.drain() == 1
+    assert rows(app)['["ann@example.test"]'].status == "sent"
+    assert len(mail.sent) == 1
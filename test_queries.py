@@ -0,0 +1,120 @@
+from counters import post_counters
+from models import Counter, Posts, db
+from query_counter import QueryCounter, assert_max_queries
+
+
+def statements(app, call):
+    '''(result of call(), [SQL it ran])'''
+    with app.app_context():
+        engine = db.engine
+    with QueryCounter(engine) as counter:
+        result = call()
+    return result, counter.statements
+
+
+def test_listing_loads_authors_in_one_query(app, client, make_user, make_posts):
+    for i in range(5):
+        make_posts(make_user(f"User {i}"), 4)
+
+    # counter total, one page of rows, one query for every author on the page
+    with assert_max_queries(app, 3) as counter:
+        response = client.get('/post?per_page=20&fields=id,title,author')
+    assert response.status_code == 200
+    assert len(response.get_json()["posts"]) == 20
+    assert not any("count(" in statement.lower() for statement in counter.statements)
+
+
+def test_listing_total_comes_from_the_counter(app, client, make_user, make_posts):
+    make_posts(make_user(), 7)
+    with app.app_context():
+        # A stale counter shows up in the total, so the total is not a COUNT(*)
+        Counter.query.filter_by(name='posts').update({Counter.value: 70})
+        db.session.commit()
+    assert client.get('/post?per_page=5').get_json()["total_posts"] == 70
+
+
+def test_cursor_pages_cost_the_same(app, client, make_user, make_posts):
+    make_posts(make_user(), 30)
+    first = client.get('/post?limit=10&fields=id,title,author').get_json()
+    with assert_max_queries(app, 2) as counter:
+        response = client.get(f"/post?limit=10&fields=id,title,author&cursor={first['next_cursor']}")
+    assert [post["id"] for post in response.get_json()["posts"]] == list(range(11, 21))
+    # Seeks past the cursor instead of skipping rows
+    assert "posts.sno > ?" in counter.statements[0]
+
+
+def test_user_posts_query_count(app, client, make_user, make_posts, auth):
+    user_id = make_user()
+    make_posts(user_id, 12)
+    headers = auth(user_id)
+    # token version, counter total, one page of rows
+    with assert_max_queries(app, 3):
+        response = client.get('/user/posts?per_page=5', headers=headers)
+    assert response.get_json()["total_posts"] == 12
+
+
+def test_batch_get_is_one_query_whatever_the_size(app, client, make_user, make_posts):
+    snos = make_posts(make_user("One"), 20) + make_posts(make_user("Two"), 20)
+
+    _, small = statements(app, lambda: client.post('/posts/batch-get?fields=id,author', json={'ids': snos[:2]}))
+    response, large = statements(app, lambda: client.post('/posts/batch-get?fields=id,author',
+                                                          json={'ids': snos + [9999]}))
+    assert len(small) == len(large) == 2
+    results = response.get_json()["results"]
+    assert [result["status"] for result in results].count("found") == 40
+    assert results[-1] == {"id": 9999, "status": "not_found", "error": "Post not found!"}
+
+
+def test_batch_delete_is_constant_whatever_the_size(app, client, make_user, make_posts, auth):
+    owner, other = make_user("Owner"), make_user("Other")
+    mine, theirs = make_posts(owner, 30), make_posts(other, 2)
+    headers = auth(owner)
+    client.get('/user/posts', headers=headers)  # token version cached from here on
+
+    _, small = statements(app, lambda: client.post('/posts/batch-delete', json={'ids': mine[:1]}, headers=headers))
+    response, large = statements(app, lambda: client.post('/posts/batch-delete',
+                                                          json={'ids': mine[1:] + theirs + [9999]}, headers=headers))
+    assert len(small) == len(large) <= 6
+    statuses = [result["status"] for result in response.get_json()["results"]]
+    assert statuses == ["deleted"] * 29 + ["forbidden"] * 2 + ["not_found"]
+    with app.app_context():
+        assert Posts.query.count() == 2
+        assert post_counters.total() == 2
+        assert post_counters.total(owner) == 0
+        assert post_counters.total(other) == 2
+
+
+def test_counters_follow_adds_and_deletes(app, client, make_user, make_posts, auth):
+    user_id = make_user()
+    snos = make_posts(user_id, 3)
+    assert client.post(f'/random_post/{user_id}').status_code == 201
+    assert client.delete(f'/delete/{snos[0]}', headers=auth(user_id)).status_code == 200
+
+    with app.app_context():
+        assert post_counters.total() == post_counters.total(user_id) == 7
+        assert post_counters.reconcile() == []
+
+
+def test_reconcile_repairs_drift(app, make_user, make_posts):
+    user_id = make_user()
+    make_posts(user_id, 4)
+    with app.app_context():
+        Counter.query.filter_by(name=f'posts:user:{user_id}').delete()
+        Counter.query.filter_by(name='posts').update({Counter.value: 1})
+        db.session.commit()
+        assert sorted(post_counters.reconcile()) == [('posts', 1, 4), (f'posts:user:{user_id}', 0, 4)]
+        assert post_counters.total() == post_counters.total(user_id) == 4
+
+
+def test_counters_for_many_users_are_bumped_in_bulk(app, make_user, make_posts):
+    user_ids = [make_user(f"User {i}") for i in range(12)]
+    make_posts(user_ids[0], 2)
+    with app.app_context():
+        rows = [{"user_id": user_id} for user_id in user_ids for _ in range(3)]
+        _, bumped = statements(app, lambda: post_counters.count_rows(rows))
+        # which counters exist, one UPDATE for those, one INSERT for the rest
+        assert len([statement for statement in bumped if not statement.startswith(("SAVEPOINT", "RELEASE"))]) == 3
+        db.session.commit()
+        assert post_counters.total() == 38
+        assert post_counters.total(user_ids[0]) == 5
+        assert post_counters.total(user_ids[-1]) == 3
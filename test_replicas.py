@@ -0,0 +1,74 @@
+import pytest
+from sqlalchemy import create_engine, insert, select
+
+from models import Posts, User, db
+from query_counter import QueryCounter
+from replicas import replica_router
+
+
+@pytest.fixture
+def replica(app, monkeypatch, tmp_path):
+    '''A second SQLite database registered as the app's only replica, holding a post the primary lacks'''
+    engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(User), {"id": 1, "name": "Author", "email": "author@example.test", "password": "x"})
+        connection.execute(insert(Posts), {"sno": 1, "user_id": 1, "title": "From the replica", "slug": "from-the-replica",
+                                           "content": "Replicated content.", "date": "01-01-2026 10:00 AM"})
+    with app.app_context():
+        monkeypatch.setitem(db.engines, 'replica_0', engine)
+    monkeypatch.setattr(replica_router, 'bind_keys', ['replica_0'])
+    # Registered by init_app only when replicas are configured
+    monkeypatch.setitem(app.after_request_funcs, None,
+                        [*app.after_request_funcs.get(None, []), replica_router._after_request])
+    monkeypatch.setitem(app.config, 'RESPONSE_CACHE_ENABLED', False)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def primary(app):
+    with app.app_context():
+        return db.engine
+
+
+def test_get_requests_read_from_the_replica(client, replica, primary):
+    with QueryCounter(primary) as on_primary, QueryCounter(replica) as on_replica:
+        response = client.get('/post/from-the-replica')
+    assert response.json["post"][0]["title"] == "From the replica"
+    assert on_replica.count and not on_primary.count
+
+
+def test_reads_after_a_write_stay_on_the_primary(app, make_user, replica):
+    user_id = make_user('Writer')
+    with app.test_request_context(method='GET'):
+        assert db.session.execute(select(Posts.title)).scalars().all() == ["From the replica"]
+        db.session.get(User, user_id).place = "Somewhere"
+        db.session.flush()
+        with QueryCounter(replica) as on_replica:
+            assert db.session.execute(select(Posts.title)).scalars().all() == []
+        assert not on_replica.count
+        db.session.rollback()
+    # Outside a request everything is on the primary
+    with app.app_context(), QueryCounter(replica) as on_replica:
+        assert db.session.execute(select(Posts.title)).scalars().all() == []
+    assert not on_replica.count
+
+
+def test_writers_read_their_writes_for_a_while(app, client, make_user, make_posts, auth, replica):
+    user_id = make_user('Writer')
+    sno = make_posts(user_id, 2)[-1]
+    response = client.delete(f'/delete/{sno}', headers=auth(user_id))
+    assert response.status_code == 200
+    cookie = client.get_cookie(app.config['REPLICA_STICKY_COOKIE'])
+    assert cookie is not None and cookie.max_age == app.config['REPLICA_STICKY_SECONDS']
+
+    with QueryCounter(replica) as on_replica:
+        titles = [post["title"] for post in client.get('/post?per_page=10').json["posts"]]
+    assert titles == ["Post number 1"]
+    assert not on_replica.count
+
+    # Someone else, without the cookie, reads the replica
+    with QueryCounter(replica) as on_replica:
+        app.test_client().get('/post?per_page=10')
+    assert on_replica.count
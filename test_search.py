@@ -0,0 +1,106 @@
+import pytest
+from flask import Flask
+from sqlalchemy import insert
+
+from counters import post_counters
+from models import Posts, db
+from search import PythonIndexBackend, search_engine
+
+
+@pytest.fixture
+def index(app, monkeypatch):
+    backend = PythonIndexBackend(max_age=300)
+    monkeypatch.setattr(app.extensions['search'], 'backend', backend)
+    return backend
+
+
+def found(app, query):
+    with app.app_context():
+        return [post.sno for post in search_engine.paginate(query).items]
+
+
+def test_rolled_back_posts_are_not_searchable(app, make_user, make_posts, index):
+    user_id = make_user()
+    make_posts(user_id, 1)
+    assert found(app, "number") == [1]
+    with app.app_context():
+        post = Posts(user_id=user_id, title="Ghost post", content="Never committed.", date="01-01-2026 10:00 AM",
+                     slug="ghost-post")
+        db.session.add(post)
+        db.session.flush()
+        search_engine.index_post(post)
+        db.session.rollback()
+    assert found(app, "ghost") == []
+
+
+def test_committed_posts_are_searchable_without_a_rebuild(app, make_user, make_posts, index, monkeypatch):
+    user_id = make_user()
+    make_posts(user_id, 2)
+    assert found(app, "number") == [2, 1]
+    monkeypatch.setattr(index, '_build', lambda: pytest.fail("rebuilt for our own writes"))
+    snos = make_posts(user_id, 1)
+    with app.app_context():
+        search_engine.remove_post(1)
+        Posts.query.filter_by(sno=1).delete()
+        post_counters.add(user_id, -1)
+        db.session.commit()
+    assert found(app, "number") == [snos[0], 2]
+
+
+def test_posts_written_by_another_process_trigger_a_rebuild(app, make_user, make_posts, index):
+    user_id = make_user()
+    make_posts(user_id, 1)
+    assert found(app, "number") == [1]
+    with app.app_context():
+        # Committed elsewhere: nothing staged in this process
+        db.session.execute(insert(Posts), [{"sno": 2, "user_id": user_id, "title": "Elsewhere", "slug": "elsewhere",
+                                            "content": "Written by another worker.", "date": "01-01-2026 10:00 AM"}])
+        post_counters.add(user_id)
+        db.session.commit()
+    assert found(app, "worker") == [2]
+
+
+def test_other_processes_edits_show_up_after_max_age(app, make_user, make_posts, index, monkeypatch):
+    make_posts(make_user(), 1)
+    assert found(app, "number") == [1]
+    with app.app_context():
+        Posts.query.filter_by(sno=1).update({Posts.title: "Renamed elsewhere"})
+        db.session.commit()
+    assert found(app, "renamed") == []
+    monkeypatch.setattr(index, '_built_at', index._built_at - 301)
+    assert found(app, "renamed") == [1]
+
+
+def test_listings_agree_on_total_pages(app, client, make_user, make_posts, auth, monkeypatch):
+    user_id = make_user()
+    make_posts(user_id, 3)
+    assert client.get('/post?per_page=2').json["total_pages"] == 2
+    assert client.get('/user/posts?per_page=2', headers=auth(user_id)).json["total_pages"] == 2
+    assert client.get('/post?search=number&per_page=2').json["total_pages"] == 2
+
+    # Not counted at all: no page count either
+    monkeypatch.setitem(app.config, 'SEARCH_COUNT', 'none')
+    page = client.get('/user/posts?search=number&per_page=2', headers=auth(user_id)).json
+    assert page["total_posts"] is None and page["total_pages"] is None
+    assert client.get('/post?search=number&per_page=5').json["total_pages"] is None
+
+
+def test_each_app_keeps_its_own_index(app, make_user, make_posts, tmp_path):
+    other = Flask(__name__)
+    other.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'other.db'}", SEARCH_BACKEND='python')
+    db.init_app(other)
+    with app.app_context():
+        listeners = len(db.session().dispatch.after_commit)
+    search_engine.init_app(other)
+    search_engine.init_app(other)
+
+    with other.app_context():
+        db.create_all()
+        assert search_engine.setup().name == 'python'
+        assert len(db.session().dispatch.after_commit) == listeners
+    make_posts(make_user(), 1)
+    with app.app_context():
+        assert search_engine.backend.name != 'python'
+        assert [post.sno for post in search_engine.paginate("number").items] == [1]
+    with other.app_context():
+        assert search_engine.paginate("number").items == []
@@ -0,0 +1,74 @@
+from models import EXCERPT_LENGTH, Posts, User, db, make_excerpt
+from query_counter import QueryCounter
+from serializers import LISTING_FIELDS, POST_DETAIL_FIELDS, post_schema
+from slugs import assign_unique_slug
+
+LONG = "Word " * 30 + "ending, sentence. " * 20
+
+
+def add_post(app, user_id, content):
+    with app.app_context():
+        post = Posts(user_id=user_id, title="Long read", content=content, date="01-01-2026 10:00 AM")
+        assign_unique_slug(post, "Long read")
+        db.session.commit()
+        return post.sno
+
+
+def test_make_excerpt():
+    assert make_excerpt("  Short\n\n text  ") == "Short text"
+    excerpt = make_excerpt(LONG)
+    assert len(excerpt) <= EXCERPT_LENGTH
+    assert excerpt.endswith("ending…")
+    assert LONG.startswith(excerpt[:-1])
+    assert make_excerpt("x" * 500) == "x" * (EXCERPT_LENGTH - 1) + "…"
+    assert make_excerpt(None) == ""
+
+
+def test_excerpt_follows_content(app, make_user):
+    sno = add_post(app, make_user(), LONG)
+    with app.app_context():
+        post = db.session.get(Posts, sno)
+        assert post.excerpt == make_excerpt(LONG)
+        post.content = "Rewritten."
+        db.session.commit()
+        assert db.session.get(Posts, sno).excerpt == "Rewritten."
+
+
+def test_listings_read_the_excerpt_not_the_content(app, client, make_user):
+    add_post(app, make_user(), LONG)
+    with app.app_context():
+        engine = db.engine
+    with QueryCounter(engine) as counter:
+        post = client.get('/post').json["posts"][0]
+    assert set(post) == set(LISTING_FIELDS)
+    assert post["excerpt"] == make_excerpt(LONG) and post["author"] == "Author"
+    assert not any("posts.content" in statement for statement in counter.statements)
+
+
+def test_fields_projection(app, client, make_user, make_posts):
+    make_posts(make_user(), 2)
+    with app.app_context():
+        engine = db.engine
+    with QueryCounter(engine) as counter:
+        posts = client.get('/post?fields=title, id,title').json["posts"]
+    assert [set(post) for post in posts] == [{"title", "id"}, {"title", "id"}]
+    # No author asked for: no user lookup either
+    assert not any("FROM user" in statement for statement in counter.statements)
+
+    found = client.post('/posts/batch-get?fields=content', json={"ids": [1]}).json["results"][0]
+    assert found["post"] == {"content": "Content of post number 1, long enough."}
+
+    response = client.get('/post?fields=title,password')
+    assert response.status_code == 400
+    assert "Unknown field 'password'" in response.json["error"]
+
+
+def test_rows_and_models_dump_alike(app, make_user, make_posts):
+    user_id = make_user()
+    make_posts(user_id, 2)
+    fields = POST_DETAIL_FIELDS + ("author", "created_at")
+    with app.app_context():
+        authors = {user_id: db.session.get(User, user_id).name}
+        rows = post_schema.select(Posts.query, fields).order_by(Posts.sno).all()
+        models = Posts.query.order_by(Posts.sno).all()
+        assert post_schema.dump_many(rows, fields, authors) == post_schema.dump_many(models, fields, authors)
@@ -0,0 +1,77 @@
+import gzip
+import hashlib
+
+import pytest
+from flask import Flask
+
+from static_assets import ONE_YEAR, StaticAssets, brotli
+
+CSS = b"body { color: #333; }\n" * 40
+
+
+@pytest.fixture
+def site(tmp_path):
+    '''A small app whose static folder holds one stylesheet and one image, served by a fresh StaticAssets'''
+    static = tmp_path / 'static'
+    (static / 'css').mkdir(parents=True)
+    (static / 'css' / 'site.css').write_bytes(CSS)
+    (static / 'logo.png').write_bytes(b"\x89PNG not really")
+    app = Flask(__name__, static_folder=str(static))
+    app.config['STATIC_BUILD_FOLDER'] = str(tmp_path / 'build')
+    assets = StaticAssets(app)
+    return app, assets
+
+
+def test_fingerprinted_urls_are_immutable(site):
+    app, assets = site
+    with app.test_request_context():
+        url = assets.asset_url('css/site.css')
+    assert url == f"/static/css/site.{hashlib.sha256(CSS).hexdigest()[:12]}.css"
+
+    response = app.test_client().get(url)
+    assert response.status_code == 200
+    assert response.data == CSS
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == ONE_YEAR
+
+
+def test_other_names_are_revalidated(site):
+    app, assets = site
+    client = app.test_client()
+    for url in ('/static/css/site.css', '/static/css/site.0123456789ab.css'):
+        # The plain name, and a fingerprint from before the last deploy
+        response = client.get(url)
+        assert response.data == CSS
+        assert response.cache_control.no_cache and not response.cache_control.immutable
+        assert client.get(url, headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+    assert client.get('/static/missing.css').status_code == 404
+    assert client.get('/static/../secret.txt').status_code == 404
+
+
+@pytest.mark.skipif(brotli is None, reason="brotli is not installed")
+def test_prebuilt_compressed_assets(site):
+    app, assets = site
+    manifest, written = assets.build()
+    assert set(manifest) == {'css/site.css', 'logo.png'}
+    assert written == 2
+    client = app.test_client()
+    with app.test_request_context():
+        url = assets.asset_url('css/site.css')
+
+    br = client.get(url, headers={'Accept-Encoding': 'gzip, br'})
+    assert br.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(br.data) == CSS
+    assert 'accept-encoding' in br.vary.as_set()
+
+    gz = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert gz.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(gz.data) == CSS
+    assert gz.headers['ETag'] != br.headers['ETag']
+
+    plain = client.get(url)
+    assert 'Content-Encoding' not in plain.headers and plain.data == CSS
+    # Images are never precompressed
+    with app.test_request_context():
+        logo = client.get(assets.asset_url('logo.png'), headers={'Accept-Encoding': 'br'})
+    assert 'Content-Encoding' not in logo.headers and logo.cache_control.immutable
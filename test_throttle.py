@@ -0,0 +1,88 @@
+import time
+
+import pytest
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager
+
+from throttle import Throttle
+
+
+@pytest.fixture
+def throttled():
+    '''A small app with a fresh Throttle: a login-like route that always fails, a pricier export and a cheap page'''
+    throttle = Throttle()
+    app = Flask(__name__)
+    app.config.update(JWT_SECRET_KEY='test-jwt-secret-with-at-least-32-bytes', THROTTLE_ACCOUNT_LIMIT='3/minute')
+    JWTManager(app)
+    throttle.init_app(app)
+
+    @app.route('/login', methods=['POST'])
+    @throttle.expensive(cost=1)
+    def login():
+        return jsonify({"status": False, "error": "Incorrect password"}), 401
+
+    @app.route('/export', methods=['POST'])
+    @throttle.expensive(cost=4)
+    def export():
+        return jsonify({"status": True})
+
+    @app.route('/page')
+    def page():
+        return jsonify({"status": True})
+
+    return app
+
+
+def login_from(client, address, email="victim@example.test"):
+    return client.post('/login', json={"email": email, "password": "Wrong-password1"},
+                       environ_base={'REMOTE_ADDR': address})
+
+
+def test_an_account_cannot_be_locked_out_from_another_client(throttled):
+    client = throttled.test_client()
+    statuses = [login_from(client, '203.0.113.7').status_code for _ in range(4)]
+    assert statuses == [401, 401, 401, 429]
+
+    # The owner, elsewhere, can still log in
+    assert login_from(client, '198.51.100.2').status_code == 401
+    # and the guessing client is still limited on that account, whatever case the email is in
+    assert login_from(client, '203.0.113.7', email=" Victim@Example.test").status_code == 429
+
+
+def test_expensive_routes_share_one_client_budget(throttled):
+    throttled.config['THROTTLE_CLIENT_BUDGET'] = '6/minute'
+    client = throttled.test_client()
+    assert client.post('/export').status_code == 200
+    assert login_from(client, '127.0.0.1').status_code == 401
+    assert login_from(client, '127.0.0.1', email="other@example.test").status_code == 401
+
+    response = login_from(client, '127.0.0.1', email="third@example.test")
+    assert response.status_code == 429
+    assert response.json["status"] is False
+    assert 1 <= int(response.headers['Retry-After']) <= 60
+    # Cheap routes are not budgeted
+    assert client.get('/page').status_code == 200
+
+
+def test_expensive_requests_are_shed_first(throttled):
+    throttled.config['SHED_EXPENSIVE_IN_FLIGHT'] = 1
+    throttle = throttled.extensions['throttle']
+    throttle._expensive_in_flight = 1  # a login still hashing
+    client = throttled.test_client()
+
+    response = client.post('/export')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert client.get('/page').status_code == 200
+
+    throttle._expensive_in_flight = 0
+    assert client.post('/export').status_code == 200
+    assert throttle.stats() == {"in_flight": 0, "expensive_in_flight": 0}
+
+
+def test_requests_that_queued_too_long_are_shed(throttled):
+    client = throttled.test_client()
+    queued_since = f"t={int((time.time() - 5) * 1000)}"
+    assert client.post('/export', headers={'X-Request-Start': queued_since}).status_code == 503
+    assert client.get('/page', headers={'X-Request-Start': queued_since}).status_code == 200
+    assert client.post('/export', headers={'X-Request-Start': f"t={time.time():.3f}"}).status_code == 200
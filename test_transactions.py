@@ -0,0 +1,143 @@
+import io
+import os
+import time
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import slugs
+from cache import response_cache
+from counters import post_counters
+from models import Counter, Posts, Upload, db
+from outbox import outbox
+from slugs import assign_unique_slug
+from storage import upload_store
+
+
+def test_slug_savepoint_is_undone_by_the_outer_rollback(app, make_user):
+    user_id = make_user()
+    with app.app_context():
+        post = Posts(user_id=user_id, title="Hello", content="Some content here.", date="01-01-2026 10:00 AM")
+        assert assign_unique_slug(post, "Hello") == "hello"
+        db.session.rollback()
+        assert Posts.query.count() == 0
+
+
+def test_slug_conflict_retry_keeps_earlier_writes_until_the_outer_rollback(app, make_user, make_posts, monkeypatch):
+    user_id = make_user()
+    make_posts(user_id, 1)
+    with app.app_context():
+        post_counters.add(user_id)
+        # The first lookup misses a concurrent insert of the same slug
+        stale = iter(["post-number-1"])
+        lookup = slugs.next_free_slug
+        monkeypatch.setattr(slugs, "next_free_slug", lambda base, exclude_sno=None: next(stale, None) or lookup(base, exclude_sno))
+
+        post = Posts(user_id=user_id, title="Post number 1", content="Some content here.", date="01-01-2026 10:00 AM")
+        assert assign_unique_slug(post, "Post number 1") == "post-number-1-1"
+        assert post_counters.total(user_id) == 2
+        db.session.rollback()
+        assert Posts.query.count() == 1
+        assert post_counters.total(user_id) == 1
+
+
+def upload_files(app):
+    return sorted(name for name in os.listdir(app.config['UPLOAD_FOLDER'])
+                  if os.path.isfile(os.path.join(app.config['UPLOAD_FOLDER'], name)))
+
+
+def test_upload_row_and_file_are_undone_by_the_outer_rollback(app):
+    with app.app_context():
+        upload_store.save(FileStorage(io.BytesIO(b"not really a png"), filename="photo.png"))
+        db.session.rollback()
+        assert Upload.query.count() == 0
+    assert upload_files(app) == []
+
+
+def test_upload_file_is_placed_on_the_outer_commit(app, make_user):
+    user_id = make_user()
+    with app.app_context():
+        key = upload_store.save(FileStorage(io.BytesIO(b"not really a png"), filename="photo.png"))
+        post = Posts(user_id=user_id, title="Hello", content="Some content here.", date="01-01-2026 10:00 AM",
+                     img_file=key)
+        assign_unique_slug(post, "Hello")
+        assert key not in upload_files(app)
+        db.session.commit()
+        assert Upload.query.count() == 1
+    assert upload_files(app) == [key]
+
+
+def test_upload_file_is_dropped_when_the_session_closes_uncommitted(app):
+    with app.app_context():
+        upload_store.save(FileStorage(io.BytesIO(b"not really a png"), filename="photo.png"))
+        db.session.remove()
+    assert upload_files(app) == []
+
+
+def test_new_counter_rows_are_undone_by_the_outer_rollback(app, make_user):
+    user_id = make_user()
+    with app.app_context():
+        post_counters.add(user_id)
+        assert post_counters.total(user_id) == 1
+        db.session.rollback()
+        assert Counter.query.count() == 0
+
+
+@pytest.fixture
+def evicted(monkeypatch):
+    tags = []
+    monkeypatch.setattr(response_cache.backend, "invalidate", lambda batch: tags.append(set(batch)))
+    return tags
+
+
+def test_cache_evicts_on_the_outer_commit_not_on_savepoint_release(app, make_user, evicted):
+    user_id = make_user()
+    with app.app_context():
+        response_cache.invalidate("slug:a")
+        post = Posts(user_id=user_id, title="Hello", content="Some content here.", date="01-01-2026 10:00 AM")
+        assign_unique_slug(post, "Hello")
+        response_cache.invalidate("slug:hello")
+        assert evicted == []
+        db.session.commit()
+        assert evicted == [{"slug:a", "slug:hello"}]
+
+
+def test_cache_keeps_tags_across_a_savepoint_rollback(app, evicted):
+    with app.app_context():
+        response_cache.invalidate("listing")
+        db.session.begin_nested().rollback()
+        db.session.commit()
+        assert evicted == [{"listing"}]
+
+
+def test_cache_drops_tags_on_the_outer_rollback(app, evicted):
+    with app.app_context():
+        Posts.query.count()
+        response_cache.invalidate("listing")
+        db.session.rollback()
+        db.session.commit()
+        assert evicted == []
+
+
+def test_outbox_wakes_on_the_outer_commit(app, make_user, monkeypatch):
+    wakes = []
+    monkeypatch.setattr(outbox, "wake", lambda: wakes.append(True))
+    user_id = make_user()
+    with app.app_context():
+        outbox.queue("Welcome", ["reader@example.test"], "Hello")
+        post = Posts(user_id=user_id, title="Hello", content="Some content here.", date="01-01-2026 10:00 AM")
+        assign_unique_slug(post, "Hello")
+        assert wakes == []
+        db.session.commit()
+        assert wakes == [True]
+
+
+def test_garbage_collection_sweeps_abandoned_temporary_files(app):
+    folder = app.config['UPLOAD_FOLDER']
+    for name, age in (('.upload-old', 7200), ('.upload-new', 0)):
+        with open(os.path.join(folder, name), 'wb') as f:
+            f.write(b"partial")
+        os.utime(os.path.join(folder, name), (time.time() - age, time.time() - age))
+    with app.app_context():
+        assert upload_store.collect_garbage() == 1
+    assert upload_files(app) == ['.upload-new']
@@ -0,0 +1,141 @@
+import math
+import os
+import threading
+import time
+
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_limiter import Limiter, RateLimitExceeded
+from flask_limiter.util import get_remote_address
+
+EXPENSIVE_SCOPE = 'expensive'
+
+
+def client_key():
+    return f"ip:{get_remote_address()}"
+
+
+def account_key():
+    '''The account a request acts on, from this client: the email it names, else the logged-in user, else the client'''
+    data = request.get_json(silent=True) if request.is_json else request.form
+    email = data.get('email') if hasattr(data, 'get') else None
+    if isinstance(email, str) and email.strip():
+        # Paired with the client address: keyed on the email alone, anyone could lock its owner out
+        return f"email:{email.strip().lower()}|{client_key()}"
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        identity = None
+    return f"user:{identity}" if identity else client_key()
+
+
+def _queued_seconds():
+    # X-Request-Start ("t=<seconds|ms|us>") is stamped by the proxy when the request arrived
+    value = request.headers.get('X-Request-Start', '').strip().removeprefix('t=')
+    try:
+        started = float(value)
+    except ValueError:
+        return 0.0
+    while started > 1e11:  # milli- or microseconds
+        started /= 1000
+    return max(0.0, time.time() - started)
+
+
+class Throttle:
+    '''Sliding-window rate limits (Flask-Limiter) on the routes marked expensive() and
+    load shedding in front of them.
+
+    Each expensive route spends its cost from one per-client budget shared by all of them,
+    and is limited per account and client as well. Storage is in memory per process unless
+    RATELIMIT_STORAGE_URI points at a shared backend (e.g. redis://).
+
+    Shedding happens before any of that work: while more than SHED_EXPENSIVE_IN_FLIGHT
+    expensive requests are running, or a request already waited SHED_MAX_QUEUE_WAIT in the
+    proxy queue, new expensive requests get a 503. Everything else is only shed above
+    SHED_MAX_IN_FLIGHT, so cheap (cached) reads keep flowing while logins are throttled.
+    '''
+    def __init__(self, app=None):
+        self.limiter = Limiter(key_func=client_key)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._expensive_in_flight = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATELIMIT_ENABLED', True)
+        app.config.setdefault('RATELIMIT_STRATEGY', 'moving-window')
+        app.config.setdefault('RATELIMIT_STORAGE_URI', 'memory://')
+        app.config.setdefault('RATELIMIT_HEADERS_ENABLED', True)
+        # Cost units per client per window, shared by every expensive route
+        app.config.setdefault('THROTTLE_CLIENT_BUDGET', '60/minute;600/hour')
+        app.config.setdefault('THROTTLE_ACCOUNT_LIMIT', '5/minute;30/hour')
+        app.config.setdefault('SHED_ENABLED', True)
+        app.config.setdefault('SHED_EXPENSIVE_IN_FLIGHT', max(8, 4 * (os.cpu_count() or 2)))
+        app.config.setdefault('SHED_MAX_IN_FLIGHT', 128)
+        app.config.setdefault('SHED_MAX_QUEUE_WAIT', 2.0)
+        app.config.setdefault('SHED_RETRY_AFTER', 1)
+        app.extensions['throttle'] = self
+        self.app = app
+
+        # Shedding runs first so a shed request spends none of its rate budget
+        if app.config['SHED_ENABLED']:
+            app.before_request(self._before_request)
+            app.teardown_request(self._teardown_request)
+        self.limiter.init_app(app)
+        app.register_error_handler(RateLimitExceeded, self._rate_limited)
+
+    def expensive(self, cost):
+        '''Mark a view as expensive: it costs `cost` from the client budget, is limited per account and client and is shed first'''
+        def decorator(view):
+            view.throttle_cost = cost
+            view = self.limiter.limit(lambda: current_app.config['THROTTLE_ACCOUNT_LIMIT'], key_func=account_key)(view)
+            return self.limiter.shared_limit(lambda: current_app.config['THROTTLE_CLIENT_BUDGET'], EXPENSIVE_SCOPE,
+                                             cost=cost)(view)
+        return decorator
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": self._in_flight, "expensive_in_flight": self._expensive_in_flight}
+
+    def _is_expensive(self):
+        view = self.app.view_functions.get(request.endpoint)
+        return getattr(view, 'throttle_cost', None) is not None
+
+    def _before_request(self):
+        config = self.app.config
+        expensive = self._is_expensive()
+        with self._lock:
+            if expensive:
+                overloaded = self._expensive_in_flight >= config['SHED_EXPENSIVE_IN_FLIGHT']
+            else:
+                overloaded = self._in_flight >= config['SHED_MAX_IN_FLIGHT']
+            if not overloaded:
+                self._in_flight += 1
+                self._expensive_in_flight += expensive
+                request.environ['throttle.expensive'] = expensive
+        if not overloaded and expensive and _queued_seconds() > config['SHED_MAX_QUEUE_WAIT']:
+            # Its client has probably given up already; do not spend bcrypt on it
+            overloaded = True
+        if overloaded:
+            response = jsonify({"status": False, "error": "Server is busy, please try again shortly"})
+            response.headers['Retry-After'] = str(config['SHED_RETRY_AFTER'])
+            return response, 503
+
+    def _teardown_request(self, exc):
+        expensive = request.environ.pop('throttle.expensive', None)
+        if expensive is not None:
+            with self._lock:
+                self._in_flight -= 1
+                self._expensive_in_flight -= expensive
+
+    def _rate_limited(self, e):
+        current = self.limiter.current_limit
+        retry_after = max(1, math.ceil(current.reset_at - time.time())) if current else 1
+        response = jsonify({"status": False, "error": f"Too many requests, limit is {e.description}"})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
+
+
+throttle = Throttle()